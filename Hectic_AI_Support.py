@@ -1,11 +1,26 @@
 import os
-import requests
+import sys
+import argparse
+import itertools
 import json
 import time
-import chromadb
-import difflib
+import queue
+import threading
 from datetime import datetime, timezone
-import openai
+import requests
+from halo_client import HaloPSAClient
+from rate_limit import RequestScheduler
+from write_buffer import HaloWriteBuffer
+from reference_data import ReferenceData
+from work_queue import WorkQueue
+from metrics import metrics, timed, METRICS_PORT
+from triage_cache import TriageCache
+from ticket_store import ticket_metadata, RawTicketStore, RAW_TICKET_STORE_ENABLED
+from local_classifier import LocalClassifier, LOCAL_CLASSIFIER_ENABLED
+from incremental_json import IncrementalJSONParser
+from prompt_budget import pack_ticket, count_tokens, describe as describe_prompt_stats
+from similar_tickets import SimilarTickets, format_precedents, PROMPT_PRECEDENTS, PRECEDENT_MIN_SIMILARITY
+from cassette import Cassette, CASSETTE_MODE, CASSETTE_SPEED
 
 # 🔒 Secure API Credentials
 HALO_PSA_CLIENT_ID = os.getenv("HALO_PSA_CLIENT_ID")
@@ -13,214 +28,1051 @@ HALO_PSA_CLIENT_SECRET = os.getenv("HALO_PSA_CLIENT_SECRET")
 OPENAI_API_KEY = os.getenv("OPENAI_API_KEY")
 
 # 🔗 API Endpoints
-HALO_PSA_BASE_URL = "https://opendoormsp.halopsa.com"
+HALO_PSA_BASE_URL = os.getenv("HALO_PSA_BASE_URL", "https://opendoormsp.halopsa.com")
 TOKEN_URL = f"{HALO_PSA_BASE_URL}/auth/token"
 TICKET_URL = f"{HALO_PSA_BASE_URL}/api/tickets"
 ACTION_URL = f"{HALO_PSA_BASE_URL}/api/actions"
 
-# 🔑 Token Storage
-ACCESS_TOKEN = None
-TOKEN_EXPIRATION = 0
+# 📄 Ticket Ingestion Settings
+CHROMA_PATH = os.getenv("CHROMA_PATH", "./chroma_db")  # ChromaDB persistent directory
+NEW_STATUS_ID = 1
+HALO_PAGE_SIZE = int(os.getenv("HALO_PAGE_SIZE", "50"))  # Tickets requested per HaloPSA page
+HALO_ID_CURSOR_PARAM = os.getenv("HALO_ID_CURSOR_PARAM", "")  # Tenant's listing filter for ids above a given one, if any; unset walks page_no
+CHROMA_INGEST_BATCH_SIZE = int(os.getenv("CHROMA_INGEST_BATCH_SIZE", str(HALO_PAGE_SIZE)))  # Tickets per existence check + embedding call
+CHROMA_UPSERT_BATCH_SIZE = int(os.getenv("CHROMA_UPSERT_BATCH_SIZE", "100"))  # Records per ChromaDB upsert
+
+# 🔁 Daemon Settings
+TRIAGE_CURSOR_FILE = os.getenv("TRIAGE_CURSOR_FILE", "./triage_cursor.json")  # Persisted high-water mark
+POLL_INTERVAL = float(os.getenv("POLL_INTERVAL", "30"))  # Seconds between polls while tickets keep arriving
+MAX_POLL_INTERVAL = float(os.getenv("MAX_POLL_INTERVAL", "600"))  # Idle back-off ceiling in seconds
+
+# ⚙️ Triage Pipeline Settings
+LLM_CONCURRENCY = int(os.getenv("LLM_CONCURRENCY", "4"))  # Parallel OpenAI analyses
+HALO_WRITE_CONCURRENCY = int(os.getenv("HALO_WRITE_CONCURRENCY", "2"))  # Parallel HaloPSA ticket updates
+ANALYSIS_QUEUE_SIZE = int(os.getenv("ANALYSIS_QUEUE_SIZE", "100"))  # Tickets buffered ahead of the LLM stage
+
+# 📦 LLM Batching Settings
+LLM_BATCH_SIZE = int(os.getenv("LLM_BATCH_SIZE", "8"))  # Max tickets packed into one OpenAI request
+LLM_BATCH_TOKEN_BUDGET = int(os.getenv("LLM_BATCH_TOKEN_BUDGET", "3000"))  # Max packed ticket tokens per batched request
+LLM_BATCH_TOKENS_PER_TICKET = 350  # Completion tokens reserved per ticket in a batch
+REQUIRED_RECOMMENDATION_KEYS = ("urgency", "impact", "ticket_type", "assign_to", "status_id", "reasoning")
+
+# 🌊 Streaming Settings
+LLM_STREAMING = os.getenv("LLM_STREAMING", "0") == "1"  # Stream completions and write statuses before the reasoning is done
+DECISION_KEYS = ("status_id", "urgency", "requires_human")  # Fields the status change depends on
+
+# 🗂️ Statuses the AI may choose: (HaloPSA name, fallback ID, when to choose it)
+TRIAGE_STATUSES = [
+    ("In Progress", 2, "if work is ongoing."),
+    ("Awaiting Approval", 17, "if waiting for user input."),
+    ("On Hold", 21, "if pending a response from an external party."),
+    ("Escalated", 29, "if urgent and needs immediate attention."),
+    ("Closed", 9, "if the AI has resolved the issue."),
+]
+
+# 🤖 Agent Resolution
+AI_BOT_AGENT_NAME = os.getenv("AI_BOT_AGENT_NAME", "AI Support Bot")  # HaloPSA agent used for "AI bot" assignments
+DEFAULT_AGENT_ID = int(os.getenv("DEFAULT_AGENT_ID", "1"))  # Used when an assignment cannot be resolved
+AGENT_ALIASES = {"ai bot": AI_BOT_AGENT_NAME, "ai": AI_BOT_AGENT_NAME, "bot": AI_BOT_AGENT_NAME}
+
+# 🔌 Shared API Clients
+OPENAI_POOL_SIZE = int(os.getenv("OPENAI_POOL_SIZE", "10"))  # Keep-alive connections to OpenAI
+OPENAI_TIMEOUT = float(os.getenv("OPENAI_TIMEOUT", "60"))  # Seconds per OpenAI request
+
+# 🚦 Rate Limits
+HALO_REQUESTS_PER_SECOND = float(os.getenv("HALO_REQUESTS_PER_SECOND", "5"))
+HALO_BURST = int(os.getenv("HALO_BURST", "10"))
+OPENAI_REQUESTS_PER_SECOND = float(os.getenv("OPENAI_REQUESTS_PER_SECOND", "3"))
+OPENAI_BURST = int(os.getenv("OPENAI_BURST", "6"))
+
+request_scheduler = RequestScheduler()
+request_scheduler.add_upstream("halopsa", HALO_REQUESTS_PER_SECOND, HALO_BURST,
+                               transient_exceptions=(requests.ConnectionError, requests.Timeout))
+request_scheduler.add_upstream("openai", OPENAI_REQUESTS_PER_SECOND, OPENAI_BURST)  # SDK exceptions added by get_openai_client()
+
+halo_client = HaloPSAClient(HALO_PSA_BASE_URL, HALO_PSA_CLIENT_ID, HALO_PSA_CLIENT_SECRET,
+                            scheduler=request_scheduler)
+_openai_client = None
+_openai_client_lock = threading.Lock()
+cassette = None  # Set by use_cassette() to record or replay HaloPSA and OpenAI traffic
+
+# 💰 LLM Usage Tracking
+OPENAI_PROMPT_COST_PER_1K = float(os.getenv("OPENAI_PROMPT_COST_PER_1K", "0.03"))  # USD per 1K prompt tokens
+OPENAI_COMPLETION_COST_PER_1K = float(os.getenv("OPENAI_COMPLETION_COST_PER_1K", "0.06"))  # USD per 1K completion tokens
+llm_stats = {"calls": 0, "tickets": 0, "seconds": 0.0, "prompt_tokens": 0, "completion_tokens": 0, "cost": 0.0}
+_llm_stats_lock = threading.Lock()
+
+# ✅ ChromaDB for ticket storage, opened by init_vector_store() on first use
+chroma_client = None
+ticket_embedder = None
+ticket_collection = None
+_vector_store_lock = threading.Lock()
+raw_ticket_store = None  # Full ticket JSON, compressed, outside ChromaDB; opened by init_local_state()
+
+# ♻️ Reuse AI decisions for near-duplicate tickets
+TRIAGE_CACHE_ENABLED = os.getenv("TRIAGE_CACHE_ENABLED", "1") == "1"
+triage_cache = None
+
+# ⚡ Local first-pass classifier; only low-confidence tickets go to the LLM
+local_classifier = None
+
+# 🔎 Similar past tickets, for agents and (optionally) as precedents in the AI prompt
+similar_tickets = None
+
+# 🗂️ Cached HaloPSA lookup tables
+reference_data = ReferenceData(halo_client)
 
-# ✅ Initialize ChromaDB for ticket storage
-chroma_client = chromadb.PersistentClient(path="./chroma_db")
-ticket_collection = chroma_client.get_or_create_collection("tickets")
+# 💾 Durable per-ticket pipeline progress, opened by init_local_state() on first use
+work_queue = None
+_local_state_lock = threading.Lock()
 
 
 # 🔹 FUNCTION: GET ACCESS TOKEN
+@timed("get_access_token")
 def get_access_token():
     """Retrieve a new HaloPSA API token if expired."""
-    global ACCESS_TOKEN, TOKEN_EXPIRATION
-    if ACCESS_TOKEN and time.time() < TOKEN_EXPIRATION:
-        return ACCESS_TOKEN
-
-    payload = {
-        "grant_type": "client_credentials",
-        "client_id": HALO_PSA_CLIENT_ID,
-        "client_secret": HALO_PSA_CLIENT_SECRET,
-        "scope": "all"
-    }
-    headers = {"Content-Type": "application/x-www-form-urlencoded"}
+    return halo_client.get_access_token()
 
-    response = requests.post(TOKEN_URL, data=payload, headers=headers)
 
-    if response.status_code == 200:
-        token_data = response.json()
-        ACCESS_TOKEN = token_data.get("access_token")
-        expires_in = token_data.get("expires_in", 3600)
-        TOKEN_EXPIRATION = time.time() + expires_in - 60
-        print("✅ Retrieved New Access Token")
-        return ACCESS_TOKEN
-    else:
-        print(f"❌ Failed to retrieve access token: {response.text}")
-        raise Exception("Failed to retrieve access token")
+# 🔹 FUNCTION: GET OPENAI CLIENT
+def get_openai_client():
+    """Return the long-lived OpenAI client, creating it on first use."""
+    global _openai_client
+    with _openai_client_lock:
+        if _openai_client is None:
+            import openai  # Deferred: importing the SDK costs more than a run with nothing to triage
+            import httpx
+            request_scheduler.add_transient_exceptions("openai", (openai.APIConnectionError,))
+            limits = httpx.Limits(max_connections=OPENAI_POOL_SIZE, max_keepalive_connections=OPENAI_POOL_SIZE)
+            if cassette is not None:
+                # An explicit transport also bypasses proxy mounts, which would route around the cassette
+                http_client = openai.DefaultHttpxClient(
+                    transport=cassette.httpx_transport(openai.DefaultHttpxClient, limits=limits))
+            else:
+                http_client = openai.DefaultHttpxClient(limits=limits)
+            api_key = OPENAI_API_KEY or ("cassette-replay" if cassette is not None and cassette.mode == "replay" else None)
+            # Retries are handled by request_scheduler so they share the rate budget.
+            _openai_client = openai.OpenAI(api_key=api_key, timeout=OPENAI_TIMEOUT, max_retries=0,
+                                           http_client=http_client)
+        return _openai_client
 
 
-# 🔹 FUNCTION: FETCH TICKETS
-def fetch_tickets():
-    """Fetch only 'New' tickets from HaloPSA and store them in ChromaDB."""
+# 🔹 FUNCTION: USE CASSETTE
+def use_cassette(new_cassette):
+    """Record all HaloPSA and OpenAI traffic to, or replay it from, a cassette.Cassette.
+
+    Both modes bypass the shared token cache: a recording always contains its (redacted) token
+    exchange, which replay needs, and replay never touches the network or needs credentials.
+    """
+    global cassette, _openai_client
+    cassette = new_cassette
+    halo_client.mount(cassette.requests_adapter(pool_maxsize=halo_client.pool_size, pool_block=True))
+    halo_client.tokens.cache_path = None
+    halo_client.tokens.forget()  # A token fetched before now would also leave the exchange out of a recording
+    with _openai_client_lock:
+        _openai_client = None
+    print(f"📼 {'Recording' if cassette.mode == 'record' else 'Replaying'} HaloPSA and OpenAI traffic "
+          f"{'to' if cassette.mode == 'record' else 'from'} {cassette.path}.")
+
+
+if CASSETTE_MODE:
+    use_cassette(Cassette.from_env())
+
+
+# 🔹 FUNCTION: INIT VECTOR STORE
+def init_vector_store():
+    """Open ChromaDB and the subsystems built on it (triage cache, local classifier, similar tickets) once.
+
+    Called by everything that needs them, so runs with nothing to triage and scripts that only
+    use the HaloPSA client never import chromadb or open the database.
+    """
+    global chroma_client, ticket_embedder, ticket_collection, triage_cache, local_classifier, similar_tickets
+    if chroma_client is not None:
+        return
+    with _vector_store_lock:
+        if chroma_client is not None:
+            return
+        with metrics.timer("chroma_init"):
+            import chromadb
+            from chromadb.utils import embedding_functions
+
+            client = chromadb.PersistentClient(path=CHROMA_PATH)
+            ticket_embedder = embedding_functions.DefaultEmbeddingFunction()
+            ticket_collection = client.get_or_create_collection("tickets", embedding_function=ticket_embedder)
+            triage_cache = TriageCache(client) if TRIAGE_CACHE_ENABLED else None
+            local_classifier = LocalClassifier(ticket_collection) if LOCAL_CLASSIFIER_ENABLED else None
+            similar_tickets = SimilarTickets(ticket_collection, ticket_embedder)
+            chroma_client = client  # Last, so the unlocked check above never sees a half-built store
+
+
+# 🔹 FUNCTION: INIT LOCAL STATE
+def init_local_state():
+    """Open the work queue and the raw ticket store once.
+
+    Like init_vector_store(), so importing this module (as the benchmark, the webhook receiver
+    and the sharded coordinator do) creates no database files of its own.
+    """
+    global work_queue, raw_ticket_store
+    if work_queue is not None:
+        return
+    with _local_state_lock:
+        if work_queue is not None:
+            return
+        raw_ticket_store = RawTicketStore() if RAW_TICKET_STORE_ENABLED else None
+        work_queue = WorkQueue()  # Last, so the unlocked check above never sees half-opened state
+
+
+# 🔹 FUNCTION: CHAT COMPLETION
+def create_chat_completion(**kwargs):
+    """Call the OpenAI chat completions API through the shared rate limiter and retry policy."""
+    client = get_openai_client()
+    return request_scheduler.call("openai", "chat.completions",
+                                  lambda: client.chat.completions.create(**kwargs))
+
+
+# 🔹 FUNCTION: STREAM CHAT COMPLETION
+def stream_chat_completion(parser, **kwargs):
+    """Stream a chat completion into an IncrementalJSONParser and return (usage_chunk, text).
+
+    The rate limit and retries apply to opening the stream. usage_chunk is the final chunk, which
+    carries the token usage, or None if the stream ended without one.
+    """
+    stream = create_chat_completion(stream=True, stream_options={"include_usage": True}, **kwargs)
+    usage_chunk = None
+    for chunk in stream:
+        if chunk.usage:
+            usage_chunk = chunk
+        if chunk.choices and chunk.choices[0].delta.content:
+            parser.feed(chunk.choices[0].delta.content)
+    return usage_chunk, parser.text
+
+
+# 🔹 FUNCTION: ITERATE TICKETS (PAGINATED)
+def _fetch_ticket_page(status_id, page_size, page_no, since=None, after_id=None):
+    """Request one page of tickets, oldest id first. Returns the tickets, or None on failure.
+
+    after_id asks for tickets with a higher id only, through the listing filter named by
+    HALO_ID_CURSOR_PARAM.
+    """
     headers = {"Authorization": f"Bearer {get_access_token()}"}
-    response = requests.get(TICKET_URL, headers=headers)
+    params = {
+        "pageinate": "true",  # HaloPSA's spelling
+        "page_size": page_size,
+        "page_no": page_no,
+        "status_id": status_id,
+        "order": "id",
+        "orderdesc": "false"
+    }
+    if since:
+        params.update({"datesearch": "dateoccurred", "startdate": since})
+    if after_id is not None:
+        params[HALO_ID_CURSOR_PARAM] = after_id
+    with metrics.timer("fetch_tickets"):
+        response = halo_client.get(TICKET_URL, headers=headers, params=params)
 
     if response.status_code != 200:
-        print(f"❌ Failed to fetch tickets: {response.text}")
-        return []
+        print(f"❌ Failed to fetch tickets (page {page_no}): {response.text}")
+        metrics.inc("triage_errors_total", stage="fetch_tickets")
+        return None
 
     try:
-        tickets = response.json().get("tickets", [])
-        new_tickets = [t for t in tickets if t.get("status_id") == 1]
+        page = response.json()
+    except json.JSONDecodeError:
+        print(f"❌ Error decoding tickets (page {page_no}). API response was not JSON.")
+        return None
+    return page.get("tickets", [])
 
-        print(f"\n🎫 Retrieved {len(new_tickets)} 'New' tickets for processing.")
 
-        # Store tickets in ChromaDB
-        for ticket in new_tickets:
-            ticket_id = str(ticket.get("id"))
-            existing = ticket_collection.get(ids=[ticket_id])
+def _is_listed(ticket, status_id, since=None):
+    """The listing filters server-side; re-check in case the tenant ignores them."""
+    if ticket.get("status_id") != status_id:
+        return False
+    return not since or ticket.get("dateoccurred", "") >= since
 
-            if existing["ids"]:
-                print(f"⚠️ Ticket {ticket_id} already exists in ChromaDB. Skipping insert.")
-                continue
 
-            ticket_collection.add(
-                ids=[ticket_id],
-                metadatas=[ticket],
-                documents=[f"Summary: {ticket.get('summary', 'No Summary')}\nDetails: {ticket.get('details', 'No Details')}"]
-            )
+def iter_tickets(status_id=NEW_STATUS_ID, page_size=HALO_PAGE_SIZE, since=None):
+    """Yield tickets with the given status, oldest id first, handing over each HaloPSA page as it arrives.
 
-        return new_tickets
+    When since (an ISO dateoccurred) is given, only tickets that occurred at or after it are requested.
 
+    Pages are walked forward on page_no. A ticket that leaves the status while we page (say, one
+    just triaged) shifts later ones forward, so a walk can miss a few; they are still listed and
+    are picked up by the next run. When HALO_ID_CURSOR_PARAM names a filter the tenant supports
+    for ids above a given one, each request after the first asks for tickets past the last id read
+    instead, which nothing can shift; a tenant that ignores it is walked on page_no after all.
+    The walk ends at a short page, or at a page with no id past the last one read, so a tenant
+    that ignores page_no costs one extra request rather than an endless loop.
+    """
+    use_cursor, last_id, page_no = bool(HALO_ID_CURSOR_PARAM), None, 1
+    while True:
+        tickets = _fetch_ticket_page(status_id, page_size, page_no, since,
+                                     after_id=last_id if use_cursor else None)
+        if tickets is None:
+            return
+        fresh = sorted((ticket for ticket in tickets if last_id is None or ticket.get("id", 0) > last_id),
+                       key=lambda ticket: ticket.get("id", 0))
+        yield from (ticket for ticket in fresh if _is_listed(ticket, status_id, since))
+
+        if len(tickets) < page_size:
+            return
+        if use_cursor and last_id is not None and len(fresh) < len(tickets):
+            use_cursor = False  # The tenant ignored the cursor: walk on by page instead
+        elif not fresh:
+            return  # A full page with nothing new: paging is ignored
+        if not use_cursor:
+            page_no += 1
+        if fresh:
+            last_id = fresh[-1].get("id", 0)
+
+
+# 🔹 FUNCTION: FETCH TICKET
+def fetch_ticket(ticket_id):
+    """Fetch one ticket by id (for webhook deliveries that only carry the id). Returns None on failure."""
+    headers = {"Authorization": f"Bearer {get_access_token()}"}
+    with metrics.timer("fetch_ticket"):
+        response = halo_client.get(f"{TICKET_URL}/{ticket_id}", headers=headers)
+
+    if response.status_code != 200:
+        print(f"❌ Failed to fetch ticket #{ticket_id}: {response.text}")
+        metrics.inc("triage_errors_total", stage="fetch_ticket")
+        return None
+    try:
+        return response.json()
     except json.JSONDecodeError:
-        print("❌ Error decoding tickets. API response was not JSON.")
-        return []
+        print(f"❌ Error decoding ticket #{ticket_id}. API response was not JSON.")
+        return None
 
 
-# 🔹 FUNCTION: AI ANALYSIS 
-def analyze_ticket_with_ai(summary, details):
-    """Analyze ticket details using AI and return structured recommendations, including status selection."""
+# 🔹 FUNCTION: TICKET DOCUMENT
+def ticket_document(ticket):
+    """Build the text that is embedded for a ticket."""
+    return f"Summary: {ticket.get('summary', 'No Summary')}\nDetails: {ticket.get('details', 'No Details')}"
 
-    client = openai.OpenAI(api_key=OPENAI_API_KEY)
 
+# 🔹 FUNCTION: STORE TICKETS (BULK)
+@timed("chroma_store")
+def store_tickets(tickets, batch_size=CHROMA_UPSERT_BATCH_SIZE):
+    """Store tickets in ChromaDB with one existence check, one embedding call and chunked upserts.
 
-   # ✅ Set character limits to prevent exceeding token limits
-    max_summary_length = 1000  # Limit summary to 1000 characters
-    max_details_length = 5000  # Limit details to 5000 characters
+    ChromaDB gets only the compact filter metadata; the full ticket goes to the raw ticket store.
+    Returns a dict with 'inserted' and 'skipped' counts.
+    """
+    candidates = {}
+    for ticket in tickets:
+        candidates.setdefault(str(ticket.get("id")), ticket)
 
-    summary = summary[:max_summary_length] + "..." if len(summary) > max_summary_length else summary
-    details = details[:max_details_length] + "..." if len(details) > max_details_length else details
+    if not candidates:
+        return {"inserted": 0, "skipped": 0}
 
+    init_vector_store()
+    init_local_state()
+    with metrics.timer("chroma_get"):
+        existing = set(ticket_collection.get(ids=list(candidates), include=[])["ids"])
+    missing_ids = [ticket_id for ticket_id in candidates if ticket_id not in existing]
+    skipped = len(tickets) - len(missing_ids)
 
-    prompt = f"""
-    You are an AI support assistant for a Managed Service Provider (MSP). Given the following IT support ticket, determine:
-    - Urgency: Low, Medium, or High
+    if existing:
+        print(f"⚠️ {len(existing)} ticket(s) already exist in ChromaDB. Skipping insert.")
+
+    if missing_ids:
+        documents = [ticket_document(candidates[ticket_id]) for ticket_id in missing_ids]
+        with metrics.timer("embed"):
+            embeddings = ticket_embedder(documents)
+
+        for start in range(0, len(missing_ids), batch_size):
+            end = start + batch_size
+            with metrics.timer("chroma_upsert"):
+                ticket_collection.upsert(
+                    ids=missing_ids[start:end],
+                    embeddings=embeddings[start:end],
+                    metadatas=[ticket_metadata(candidates[ticket_id]) for ticket_id in missing_ids[start:end]],
+                    documents=documents[start:end]
+                )
+        if raw_ticket_store is not None:
+            with metrics.timer("raw_store"):
+                raw_ticket_store.put_many([candidates[ticket_id] for ticket_id in missing_ids])
+
+    metrics.inc("chroma_records_total", len(missing_ids), result="inserted")
+    metrics.inc("chroma_records_total", skipped, result="skipped")
+    return {"inserted": len(missing_ids), "skipped": skipped}
+
+
+# 🔹 FUNCTION: STORE TICKET STATUS
+def store_ticket_status(ticket_id, status_id):
+    """Move a stored ticket's status_id filter field to the status HaloPSA confirmed it was given.
+
+    Only called once the write is confirmed, so a failed or parked write never leaves ChromaDB (and
+    every status_id filter over it) reporting a status the ticket does not have.
+    """
+    init_vector_store()
+    try:
+        ticket_collection.update(ids=[str(ticket_id)], metadatas=[{"status_id": int(status_id)}])
+    except Exception as e:
+        print(f"⚠️ Could not record the new status of Ticket #{ticket_id} in ChromaDB: {e}")
+
+
+# 🔹 FUNCTION: FETCH TICKETS
+def fetch_tickets(ingest_batch_size=CHROMA_INGEST_BATCH_SIZE, since=None, source=None):
+    """Stream 'New' tickets from HaloPSA, storing them in ChromaDB in bulk before yielding them.
+
+    source replaces the HaloPSA listing with any iterable of tickets (a sharded worker's inbox).
+    """
+    totals = {"inserted": 0, "skipped": 0}
+    batch = []
+
+    def flush():
+        counts = store_tickets(batch)
+        totals["inserted"] += counts["inserted"]
+        totals["skipped"] += counts["skipped"]
+        yield from batch
+        batch.clear()
+
+    for ticket in iter_tickets(since=since) if source is None else source:
+        batch.append(ticket)
+        if len(batch) >= ingest_batch_size:
+            yield from flush()
+
+    if batch:
+        yield from flush()
+
+    retrieved = totals["inserted"] + totals["skipped"]
+    print(f"\n🎫 Retrieved {retrieved} 'New' tickets for processing "
+          f"({totals['inserted']} stored in ChromaDB, {totals['skipped']} already present).")
+
+
+# 🔹 FUNCTION: RECORD LLM USAGE
+def record_llm_usage(response, seconds, tickets=1):
+    """Accumulate call count, latency, token usage and estimated cost for an OpenAI response."""
+    usage = getattr(response, "usage", None)
+    prompt_tokens = getattr(usage, "prompt_tokens", 0) or 0
+    completion_tokens = getattr(usage, "completion_tokens", 0) or 0
+
+    with _llm_stats_lock:
+        llm_stats["calls"] += 1
+        llm_stats["tickets"] += tickets
+        llm_stats["seconds"] += seconds
+        llm_stats["prompt_tokens"] += prompt_tokens
+        llm_stats["completion_tokens"] += completion_tokens
+        llm_stats["cost"] += (prompt_tokens * OPENAI_PROMPT_COST_PER_1K
+                              + completion_tokens * OPENAI_COMPLETION_COST_PER_1K) / 1000
+
+    metrics.inc("llm_tokens_total", prompt_tokens, kind="prompt")
+    metrics.inc("llm_tokens_total", completion_tokens, kind="completion")
+    metrics.inc("llm_tickets_total", tickets)
+
+
+# 🔹 FUNCTION: PACK TICKET PROMPT
+def pack_ticket_prompt(summary, details, ticket_id=None):
+    """Clean the ticket text and pack it into the per-ticket token budget, reporting what was removed.
+
+    With PROMPT_PRECEDENTS set and a stored ticket_id, the closest already-triaged tickets are
+    added as "precedents" (counted in "tokens").
+    """
+    packed = pack_ticket(summary, details)
+    packed["precedents"] = ticket_precedents(ticket_id) if ticket_id is not None else ""
+    packed["tokens"] += count_tokens(packed["precedents"])
+    stats = packed["stats"]
+    metrics.inc("prompt_tokens_total", stats["original_tokens"], kind="original")
+    metrics.inc("prompt_tokens_total", stats["tokens"], kind="packed")
+    if stats["truncated"]:
+        metrics.inc("prompt_truncated_total")
+    label = f"Ticket #{ticket_id}" if ticket_id is not None else "Ticket"
+    print(f"✂️ {label} prompt: {describe_prompt_stats(stats)}")
+    return packed
+
+
+# 🔹 FUNCTION: TICKET PRECEDENTS
+def ticket_precedents(ticket_id, count=PROMPT_PRECEDENTS):
+    """Return the prompt block of the most similar already-triaged tickets ("" when disabled or none)."""
+    if count <= 0:
+        return ""
+    init_vector_store()
+    try:
+        matches = similar_tickets.search(ticket_id=ticket_id, top_k=count, resolved_only=True,
+                                         min_similarity=PRECEDENT_MIN_SIMILARITY)
+    except Exception as e:
+        print(f"⚠️ Could not look up similar tickets for Ticket #{ticket_id}: {e}")
+        return ""
+    metrics.inc("prompt_precedents_total", len(matches))
+    return format_precedents(matches)
+
+
+# 🔹 FUNCTION: TRIAGE STATUS IDS
+def triage_status_ids():
+    """Map each triage status name to this tenant's status ID, falling back to the known defaults."""
+    return {name: reference_data.resolve_id("statuses", name, default=fallback_id)
+            for name, fallback_id, _ in TRIAGE_STATUSES}
+
+
+# 🔹 FUNCTION: TRIAGE CRITERIA
+def triage_criteria():
+    """Build the instruction block shared by single and batched prompts, using live status IDs."""
+    status_ids = triage_status_ids()
+    status_lines = "\n".join(f'        - "{name}" (ID: {status_ids[name]}) {when}' for name, _, when in TRIAGE_STATUSES)
+    return f"""- Urgency: Low, Medium, or High
     - Impact: No impact, Moderate, or High impact
     - Suggested Ticket Type: Incident, Service Request, or Other
     - Assignment: Should it be assigned to an AI bot or a human?
     - Ideal ticket status based on context:
-        - "In Progress" (ID: 2) if work is ongoing.
-        - "Awaiting Approval" (ID: 17) if waiting for user input.
-        - "On Hold" (ID: 21) if pending a response from an external party.
-        - "Escalated" (ID: 29) if urgent and needs immediate attention.
-        - "Closed" (ID: 9) if the AI has resolved the issue.
+{status_lines}"""
+
+
+# 🔹 FUNCTION: VALIDATE AI RECOMMENDATION
+def is_valid_recommendation(recommendation):
+    """Check that an AI recommendation has every key the write stage needs and a known status."""
+    if not isinstance(recommendation, dict):
+        return False
+    if any(key not in recommendation for key in REQUIRED_RECOMMENDATION_KEYS):
+        return False
+    return is_known_status(recommendation["status_id"])
+
+
+def is_known_status(status_id):
+    """True if status_id is one of the statuses the AI may choose."""
+    try:
+        return int(status_id) in set(triage_status_ids().values())
+    except (TypeError, ValueError):
+        return False
+
+
+# 🔹 FUNCTION: VALIDATE DECISION
+def is_valid_decision(record):
+    """Check that a (possibly still streaming) recommendation has every decision field and a known status."""
+    return all(key in record for key in DECISION_KEYS) and is_known_status(record["status_id"])
+
+
+# 🔹 FUNCTION: DECISION LISTENER
+def decision_listener(on_decision, started, key_field=None):
+    """Return an IncrementalJSONParser on_field callback that hands each record to on_decision(record)
+    once, as soon as its decision fields (and key_field, if given) have arrived and are valid."""
+    handed_off = set()
+
+    def on_field(index, key, value, record):
+        if index in handed_off or (key_field and key_field not in record) or not is_valid_decision(record):
+            return
+        handed_off.add(index)
+        metrics.observe("triage_stage_seconds", time.perf_counter() - started, stage="llm_time_to_decision")
+        on_decision(dict(record))
+
+    return on_field
+
+
+# 🔹 FUNCTION: AI ANALYSIS 
+@timed("analyze_ticket_with_ai")
+def analyze_ticket_with_ai(summary, details, on_decision=None, packed=None):
+    """Analyze ticket details using AI and return structured recommendations, including status selection.
+
+    Returns None when the call fails or the reply does not pass is_valid_recommendation(), the same
+    check batch elements go through, so nothing unvalidated reaches the writer, cache or classifier.
+
+    packed is the ticket's pack_ticket_prompt() result, if the caller already has it.
+    In streaming mode, on_decision(decision) is called as soon as the decision fields are complete,
+    before the reasoning has finished.
+    """
+
+    packed = packed or pack_ticket_prompt(summary, details)
+    summary, details = packed["summary"], packed["details"]
+    precedents = ""
+    if packed["precedents"]:
+        precedents = ("\n    Similar past tickets and how they were triaged (for reference only; judge this ticket on its own details):\n"
+                      + packed["precedents"] + "\n")
+
+    prompt = f"""
+    You are an AI support assistant for a Managed Service Provider (MSP). Given the following IT support ticket, determine:
+    {triage_criteria()}
     
     Ticket Summary: {summary}
     Ticket Details: {details}
-
-    Provide the output in JSON format with keys: urgency, impact, ticket_type, assign_to, status_id, requires_human, reasoning.
+    {precedents}
+    Provide the output in JSON format with keys in this order: status_id, urgency, requires_human, impact, ticket_type, assign_to, reasoning.
     """
+    request = dict(
+        model="gpt-4",
+        messages=[{"role": "system", "content": "You are a helpful AI support assistant."},
+                  {"role": "user", "content": prompt}],
+        max_tokens=500,
+        temperature=0.5
+    )
 
     try:
-        response = client.chat.completions.create(
+        started = time.perf_counter()
+        parser = None
+        if on_decision is not None and LLM_STREAMING:
+            parser = IncrementalJSONParser(on_field=decision_listener(on_decision, started))
+            response, ai_output = stream_chat_completion(parser, **request)
+        else:
+            response = create_chat_completion(**request)
+            ai_output = response.choices[0].message.content
+        record_llm_usage(response, time.perf_counter() - started)
+
+        if parser is not None:
+            # The record the decision was handed off from; the raw text may carry a ```json fence
+            if not parser.records:
+                raise ValueError(f"streamed reply has no complete JSON object: {ai_output.strip()[:200]}")
+            structured_output = parser.records[0]
+        else:
+            structured_output = json.loads(ai_output.strip())
+
+        if not is_valid_recommendation(structured_output):
+            print(f"❌ AI Analysis Error: reply is missing required keys or has an unknown status: {ai_output.strip()[:200]}")
+            metrics.inc("triage_errors_total", stage="analyze_ticket_with_ai")
+            return None
+
+        return structured_output
+
+    except Exception as e:
+        print(f"❌ AI Analysis Error: {e}")
+        metrics.inc("triage_errors_total", stage="analyze_ticket_with_ai")
+        return None
+
+
+# 🔹 FUNCTION: PLAN LLM BATCHES
+def plan_llm_batches(tickets, packed, max_batch=LLM_BATCH_SIZE, token_budget=LLM_BATCH_TOKEN_BUDGET):
+    """Group tickets so each batch stays within both the ticket count and the packed-token budget.
+
+    packed maps each ticket ID to its pack_ticket_prompt() result.
+    """
+    batches = []
+    batch, batch_tokens = [], 0
+
+    for ticket in tickets:
+        ticket_tokens = packed[ticket["id"]]["tokens"]
+
+        if batch and (len(batch) >= max_batch or batch_tokens + ticket_tokens > token_budget):
+            batches.append(batch)
+            batch, batch_tokens = [], 0
+
+        batch.append(ticket)
+        batch_tokens += ticket_tokens
+
+    if batch:
+        batches.append(batch)
+    return batches
+
+
+# 🔹 FUNCTION: AI ANALYSIS (BATCH)
+@timed("analyze_tickets_with_ai")
+def analyze_tickets_with_ai(tickets, on_decision=None):
+    """Analyze several tickets per OpenAI request and return {ticket_id: recommendation}.
+
+    Elements that are missing or fail validation are retried with single-ticket calls.
+    In streaming mode, on_decision(ticket_id, decision) is called at most once per ticket, as soon
+    as that ticket's decision fields are complete.
+    """
+    recommendations = {}
+    decided = set()
+
+    def single_listener(ticket_id):
+        if on_decision is None or ticket_id in decided:
+            return None
+
+        def hand_off(decision):
+            decided.add(ticket_id)
+            on_decision(ticket_id, decision)
+        return hand_off
+
+    packed = {ticket["id"]: pack_ticket_prompt(ticket.get("summary", "No Summary"), ticket.get("details", "No Details"),
+                                               ticket_id=ticket["id"])
+              for ticket in tickets}
+
+    for batch in plan_llm_batches(tickets, packed):
+        if len(batch) == 1:
+            ticket = batch[0]
+            recommendations[ticket["id"]] = analyze_ticket_with_ai(ticket.get("summary", "No Summary"),
+                                                                   ticket.get("details", "No Details"),
+                                                                   on_decision=single_listener(ticket["id"]),
+                                                                   packed=packed[ticket["id"]])
+            continue
+
+        ticket_blocks = []
+        for ticket in batch:
+            summary, details = packed[ticket["id"]]["summary"], packed[ticket["id"]]["details"]
+            block = f"Ticket ID: {ticket['id']}\nTicket Summary: {summary}\nTicket Details: {details}"
+            if packed[ticket["id"]]["precedents"]:
+                block += f"\nSimilar Past Tickets (for reference only):\n{packed[ticket['id']]['precedents']}"
+            ticket_blocks.append(block)
+        tickets_text = "\n---\n".join(ticket_blocks)
+
+        prompt = f"""
+    You are an AI support assistant for a Managed Service Provider (MSP). For EACH of the following IT support tickets, determine:
+    {triage_criteria()}
+
+    {tickets_text}
+
+    Provide the output as a JSON array with one object per ticket, each with keys in this order: ticket_id, status_id, urgency, requires_human, impact, ticket_type, assign_to, reasoning.
+    """
+        request = dict(
             model="gpt-4",
             messages=[{"role": "system", "content": "You are a helpful AI support assistant."},
                       {"role": "user", "content": prompt}],
-            max_tokens=500,
+            max_tokens=LLM_BATCH_TOKENS_PER_TICKET * len(batch),
             temperature=0.5
         )
+        batch_ids = {str(ticket["id"]): ticket["id"] for ticket in batch}
 
-        ai_output = response.choices[0].message.content.strip()
-        structured_output = json.loads(ai_output)
+        def batch_hand_off(decision):
+            ticket_id = batch_ids.get(str(decision["ticket_id"]))
+            if ticket_id is not None and ticket_id not in decided:
+                decided.add(ticket_id)
+                on_decision(ticket_id, decision)
 
-        return structured_output
+        parsed = {}
+        try:
+            started = time.perf_counter()
+            parser = None
+            if on_decision is not None and LLM_STREAMING:
+                parser = IncrementalJSONParser(on_field=decision_listener(batch_hand_off, started, key_field="ticket_id"))
+                response, _ = stream_chat_completion(parser, **request)
+            else:
+                response = create_chat_completion(**request)
+            record_llm_usage(response, time.perf_counter() - started, tickets=len(batch))
 
-    except Exception as e:
-        print(f"❌ AI Analysis Error: {e}")
-        return None
+            if parser is not None:
+                elements = parser.records  # The records decisions were handed off from, whatever surrounds them
+                if len(elements) == 1 and isinstance(elements[0].get("tickets"), list):
+                    elements = elements[0]["tickets"]
+            else:
+                elements = json.loads(response.choices[0].message.content.strip())
+                if isinstance(elements, dict):
+                    elements = elements.get("tickets", [elements])
 
+            for element in elements:
+                if is_valid_recommendation(element):
+                    parsed[str(element.get("ticket_id"))] = element
 
+        except Exception as e:
+            print(f"❌ Batch AI Analysis Error ({len(batch)} tickets): {e}")
+            metrics.inc("triage_errors_total", stage="analyze_tickets_with_ai")
 
+        for ticket in batch:
+            recommendation = parsed.get(str(ticket["id"]))
+            if recommendation is None:
+                print(f"⚠️ No valid batch result for Ticket #{ticket['id']}. Falling back to a single-ticket call.")
+                recommendation = analyze_ticket_with_ai(ticket.get("summary", "No Summary"),
+                                                        ticket.get("details", "No Details"),
+                                                        on_decision=single_listener(ticket["id"]),
+                                                        packed=packed[ticket["id"]])
+            recommendations[ticket["id"]] = recommendation
+
+    return recommendations
 
-# 🔹 FUNCTION: PROCESS TICKETS
-def process_tickets(tickets):
-    """Process and update tickets with AI-generated reasoning."""
-    if not tickets:
-        print("✅ No new tickets to process.")
-        return
+
+
+
+# 🔹 FUNCTION: TICKET EMBEDDING
+def ticket_embedding(ticket):
+    """Return the ticket's stored embedding, computing it only if ChromaDB does not have it."""
+    init_vector_store()
+    stored = ticket_collection.get(ids=[str(ticket["id"])], include=["embeddings"])
+    if stored["ids"] and stored["embeddings"] is not None and len(stored["embeddings"]):
+        return stored["embeddings"][0]
+    return ticket_embedder([ticket_document(ticket)])[0]
+
+
+# 🔹 FUNCTION: TRIAGE TICKETS
+def triage_tickets(tickets, on_decision=None):
+    """Return {ticket_id: recommendation} from the cheapest tier that can decide each ticket.
+
+    Tiers in order: a cached decision for a near-duplicate, the local classifier, then batched
+    LLM calls. LLM decisions become training labels for the local classifier.
+    on_decision is passed to analyze_tickets_with_ai for early status handoff in streaming mode.
+    """
+    init_vector_store()
+    recommendations = {}
+    misses = []
+    labels = []  # (ticket_id, recommendation, embedding, source) for the local classifier
 
     for ticket in tickets:
-        ticket_id = ticket["id"]
-        summary = ticket.get("summary", "No Summary")
-        details = ticket.get("details", "No Details")
+        if triage_cache is None and local_classifier is None:
+            misses.append((ticket, None, None, None))
+            continue
+
+        document = ticket_document(ticket)
+        embedding = ticket_embedding(ticket)
+        cached = triage_cache.lookup(document, embedding) if triage_cache is not None else None
+        if cached:
+            print(f"♻️ Reusing cached triage decision for Ticket #{ticket['id']}")
+            metrics.inc("triage_tier_total", tier="cache")
+            recommendations[ticket["id"]] = cached
+            continue
+
+        prediction = None
+        if local_classifier is not None:
+            with metrics.timer("local_classifier"):
+                local_recommendation, prediction = local_classifier.classify(ticket["id"], embedding)
+            if local_recommendation:
+                print(f"⚡ Triaged Ticket #{ticket['id']} with the local classifier")
+                metrics.inc("triage_tier_total", tier="local")
+                labels.append((ticket["id"], local_recommendation, None, "local"))
+                recommendations[ticket["id"]] = local_recommendation
+                continue
+
+        misses.append((ticket, document, embedding, prediction))
+
+    if misses:
+        fresh = analyze_tickets_with_ai([ticket for ticket, _, _, _ in misses], on_decision=on_decision)
+        for ticket, document, embedding, prediction in misses:
+            ai_recommendation = fresh.get(ticket["id"])
+            metrics.inc("triage_tier_total", tier="llm")
+            if ai_recommendation and triage_cache is not None:
+                triage_cache.store(ticket["id"], document, embedding, ai_recommendation)
+            if ai_recommendation and local_classifier is not None:
+                local_classifier.compare(prediction, ai_recommendation)
+                labels.append((ticket["id"], ai_recommendation, embedding, "ai"))
+            recommendations[ticket["id"]] = ai_recommendation
+
+    if local_classifier is not None:
+        local_classifier.label_many(labels)
+    return recommendations
+
+
+# 🔹 PIPELINE WORKERS
+_STOP = object()  # Sentinel telling a stage worker to exit
 
-        print(f"\n📌 Processing Ticket #{ticket_id}")
 
-        ai_recommendation = analyze_ticket_with_ai(summary, details)
-        if not ai_recommendation:
+def _next_analysis_batch(analysis_queue, max_batch=LLM_BATCH_SIZE):
+    """Block for one ticket, then take whatever else is already queued, up to max_batch.
+
+    Returns (batch, stop) where stop is True once the stop sentinel was drained.
+    """
+    first = analysis_queue.get()
+    if first is _STOP:
+        return [], True
+
+    batch = [first]
+    while len(batch) < max_batch:
+        try:
+            ticket = analysis_queue.get_nowait()
+        except queue.Empty:
+            break
+        if ticket is _STOP:
+            return batch, True
+        batch.append(ticket)
+    return batch, False
+
+
+def _analysis_worker(analysis_queue, write_queue, stats, stats_lock, release):
+    """LLM stage: analyze queued tickets in batches and hand recommendations to the write stage.
+
+    release(ticket_id) takes a ticket whose analysis failed out of flight, so it can be retried.
+
+    Write-queue items are (action, ticket_id, recommendation, status_done). In streaming mode a
+    ticket's decision is sent as a "status" item while the reasoning is still generating, and
+    followed by a "note" item (or "abandon" if the analysis then fails); otherwise one "write" item.
+    """
+    stop = False
+    while not stop:
+        batch, stop = _next_analysis_batch(analysis_queue)
+        if not batch:
             continue
 
-        status_id = ai_recommendation.get("status_id", 2)  # Default to "In Progress"
-        update_ticket(ticket_id, ai_recommendation["urgency"], ai_recommendation["impact"],
-                      ai_recommendation["ticket_type"], ai_recommendation["assign_to"],
-                      ai_recommendation["reasoning"], status_id)
+        for ticket in batch:
+            print(f"\n📌 Processing Ticket #{ticket['id']}")
 
+        decided = {}
 
+        def hand_off_decision(ticket_id, decision):
+            decided[ticket_id] = decision["status_id"]
+            write_queue.put(("status", ticket_id, decision, False))
 
-# 🔹 FUNCTION: Update Ticket Status
-def update_ticket_status(ticket_id, new_status_id):
-    """Update the status of a HaloPSA ticket using POST."""
-    headers = {
-        "Authorization": f"Bearer {get_access_token()}",
-        "Content-Type": "application/json"
-    }
-    payload = [
-        {
-            "id": ticket_id,
-            "status_id": new_status_id
-        }
-    ]
-
-    print(f"📤 Moving Ticket #{ticket_id} to 'In Progress' using POST.")
-
-    response = requests.post(  # ✅ Changed from PUT to POST
-        "https://opendoormsp.halopsa.com/api/tickets",  # ✅ Correct endpoint
-        json=payload,
-        headers=headers
-    )
+        try:
+            recommendations = triage_tickets(batch, on_decision=hand_off_decision if LLM_STREAMING else None)
+        except Exception as e:
+            print(f"❌ Analysis failed for Ticket(s) {', '.join(str(t['id']) for t in batch)}: {e}")
+            recommendations = {}
 
-    if response.status_code in [200, 201]:
-        print(f"✅ Ticket #{ticket_id} successfully updated to status ID {new_status_id}.")
-        return True
+        for ticket in batch:
+            ai_recommendation = recommendations.get(ticket["id"])
+            if ai_recommendation and not is_valid_recommendation(ai_recommendation):
+                print(f"❌ Recommendation for Ticket #{ticket['id']} cannot be written; not checkpointing it.")
+                ai_recommendation = None  # Never checkpoint a recommendation that every resume would fail on
+            with stats_lock:
+                stats["analyzed" if ai_recommendation else "analysis_failed"] += 1
+                if not ai_recommendation:
+                    stats["failed_ids"].append(ticket["id"])
+            if ai_recommendation and ticket["id"] in decided:
+                # Keep the status that was already written, even if a fallback call chose another
+                ai_recommendation = dict(ai_recommendation, status_id=decided[ticket["id"]])
+                work_queue.mark_analyzed(ticket["id"], ai_recommendation)
+                write_queue.put(("note", ticket["id"], ai_recommendation, False))
+            elif ai_recommendation:
+                work_queue.mark_analyzed(ticket["id"], ai_recommendation)
+                write_queue.put(("write", ticket["id"], ai_recommendation, False))
+            else:
+                work_queue.mark_failed(ticket["id"], "AI analysis failed")
+                if ticket["id"] in decided:
+                    write_queue.put(("abandon", ticket["id"], None, False))  # Released once the buffer drops it
+                else:
+                    release(ticket["id"])
+
+
+def _write_worker(write_queue, write_buffer, record_write):
+    """HaloPSA stage: turn AI recommendations into buffered status changes and notes.
+
+    A ticket whose items cannot be built is reported through record_write(ticket_id, False, error),
+    so it is counted as failed and retried (or parked) by the work queue.
+    """
+    while True:
+        item = write_queue.get()
+        if item is _STOP:
+            return
+
+        action, ticket_id, ai_recommendation, status_done = item
+        try:
+            if action == "abandon":
+                write_buffer.abandon(ticket_id)
+                continue
+            if action == "note":
+                write_buffer.add_note(ticket_id, build_note_payload(ticket_id, ai_recommendation["assign_to"],
+                                                                    ai_recommendation["reasoning"]))
+                continue
+
+            status_id = ai_recommendation.get("status_id", 2)  # Default to "In Progress"
+            print(f"📤 AI has determined the best status for Ticket #{ticket_id}: {status_id}")
+            note_item = None  # A "status" item's note follows once the reasoning has streamed in
+            if action == "write":
+                note_item = build_note_payload(ticket_id, ai_recommendation["assign_to"], ai_recommendation["reasoning"])
+            write_buffer.add(ticket_id, build_status_payload(ticket_id, status_id), note_item, status_done=status_done)
+        except Exception as e:
+            print(f"❌ Update failed for Ticket #{ticket_id}: {e}")
+            metrics.inc("triage_errors_total", stage="write_worker")
+            if action == "note":
+                write_buffer.abandon(ticket_id)  # Its status is already buffered; the buffer reports the failure
+            else:
+                record_write(ticket_id, False, f"Write stage error: {e}")
+
+
+# 🔹 FUNCTION: PROCESS TICKETS
+def process_tickets(tickets, llm_concurrency=LLM_CONCURRENCY, write_concurrency=HALO_WRITE_CONCURRENCY,
+                    on_finished=None):
+    """Process and update tickets with AI-generated reasoning.
+
+    Tickets flow through two stages with their own worker pools: the LLM stage
+    (llm_concurrency threads) and the HaloPSA write stage (write_concurrency threads).
+    The write queue is unbounded so slow HaloPSA writes never stall analysis. The write
+    stage buffers status changes and notes and sends them as array POSTs.
+    Accepts any iterable, so tickets streamed from fetch_tickets() are triaged as they arrive.
+    A ticket repeated by the iterable is skipped only while it is in flight; once it has finished
+    or failed it is handed to the work queue again, so a long-lived pipeline (the webhook
+    receiver's) can retry failures and does not remember every ticket it has ever seen.
+    on_finished(ticket_id), if given, is called each time a ticket leaves flight that way.
+    Every ticket is checkpointed in work_queue after each stage; tickets it already analyzed
+    skip the LLM, and finished tickets are skipped entirely. Each resume counts toward the work
+    queue's attempt limit. A stored recommendation that does not validate, or a streamed ticket
+    whose status was written before its analysis finished, is analyzed again.
+    Returns a dict of per-stage counts plus the ids of tickets that failed either stage.
+    """
+    init_local_state()
+    analysis_queue = queue.Queue(maxsize=ANALYSIS_QUEUE_SIZE)
+    write_queue = queue.Queue()
+    stats = {"received": 0, "resumed": 0, "already_done": 0, "analyzed": 0, "analysis_failed": 0,
+             "updated": 0, "update_failed": 0, "failed_ids": []}
+    stats_lock = threading.Lock()
+
+    seen = set()  # Tickets in flight; guarded by stats_lock
+
+    def release(ticket_id):
+        with stats_lock:
+            seen.discard(ticket_id)
+        if on_finished is not None:
+            on_finished(ticket_id)
+
+    def record_write(ticket_id, updated, error="HaloPSA write failed"):
+        metrics.inc("tickets_total", result="updated" if updated else "update_failed")
+        if updated:
+            work_queue.mark_note_written(ticket_id)
+        else:
+            work_queue.mark_failed(ticket_id, error)
+        with stats_lock:
+            stats["updated" if updated else "update_failed"] += 1
+            if not updated:
+                stats["failed_ids"].append(ticket_id)
+        release(ticket_id)
+
+    def record_status(ticket_id, status_item):
+        work_queue.mark_status_written(ticket_id)
+        store_ticket_status(ticket_id, status_item["status_id"])
+
+    write_buffer = HaloWriteBuffer(write_status_batch, write_note_batch, record_write,
+                                   on_status_written=record_status)
+
+    analysts = [threading.Thread(target=_analysis_worker, args=(analysis_queue, write_queue, stats, stats_lock, release),
+                                 name=f"triage-llm-{i}", daemon=True)
+                for i in range(max(1, llm_concurrency))]
+    writers = [threading.Thread(target=_write_worker, args=(write_queue, write_buffer, record_write),
+                                name=f"triage-write-{i}", daemon=True)
+               for i in range(max(1, write_concurrency))]
+    for worker in analysts + writers:
+        worker.start()
+
+    try:
+        for ticket in tickets:
+            with stats_lock:
+                if ticket["id"] in seen:
+                    continue
+                seen.add(ticket["id"])
+                stats["received"] += 1
+
+            state, ai_recommendation = work_queue.enqueue(ticket)
+            parked = state != "note_written" and work_queue.is_parked(ticket["id"])
+            if parked:
+                print(f"⏸️ Ticket #{ticket['id']} failed {work_queue.max_attempts} times. Leaving it for a human.")
+            if state == "note_written" or parked:
+                with stats_lock:
+                    stats["already_done"] += 1
+                release(ticket["id"])
+            elif state in ("analyzed", "status_written") and is_valid_recommendation(ai_recommendation):
+                print(f"\n⏩ Resuming Ticket #{ticket['id']} after stage '{state}'")
+                work_queue.mark_resumed(ticket["id"])
+                with stats_lock:  # Analysis threads update the same counts
+                    stats["resumed"] += 1
+                    stats["analyzed"] += 1
+                write_queue.put(("write", ticket["id"], ai_recommendation, state == "status_written"))
+            else:
+                analysis_queue.put(ticket)
+    finally:
+        for _ in analysts:
+            analysis_queue.put(_STOP)
+        for worker in analysts:
+            worker.join()
+        for _ in writers:
+            write_queue.put(_STOP)
+        for worker in writers:
+            worker.join()
+        write_buffer.close()
+
+    if not stats["received"]:
+        print("✅ No new tickets to process.")
     else:
-        print(f"❌ Failed to update ticket #{ticket_id}. Status Code: {response.status_code}, Response: {response.text}")
-        return False
+        print(f"\n📊 Triage summary: {stats['received']} received ({stats['resumed']} resumed, "
+              f"{stats['already_done']} already done), {stats['analyzed']} analyzed "
+              f"({stats['analysis_failed']} failed), {stats['updated']} updated ({stats['update_failed']} failed).")
 
+    return stats
 
-### ✅ 2️⃣ Function to Add AI Note ###
-def add_ticket_note(ticket_id, assign_to, ai_notes):
-    """Add an AI-generated private note to a HaloPSA ticket."""
-    headers = {
-        "Authorization": f"Bearer {get_access_token()}",
-        "Content-Type": "application/json"
+
+# 🔹 FUNCTION: BUILD STATUS PAYLOAD
+def build_status_payload(ticket_id, new_status_id):
+    """Build the /api/tickets item that moves a ticket to a new status."""
+    return {
+        "id": ticket_id,
+        "status_id": new_status_id
     }
+
+
+# 🔹 FUNCTION: BUILD NOTE PAYLOAD
+def build_note_payload(ticket_id, assign_to, ai_notes):
+    """Build the /api/actions item for an AI-generated private note."""
     timestamp = datetime.now(timezone.utc).isoformat()
 
-    # Ensure assigned agent ID is an integer
-    try:
-        assign_to = int(assign_to)
-    except ValueError:
-        print(f"⚠️ Invalid agent ID provided: {assign_to}. Defaulting to AI bot agent ID (1).")
-        assign_to = 1  # Set to default AI agent ID (update with the correct ID)
+    # Resolve the assignment (an agent ID or a name like "AI bot") to a valid agent ID
+    agent_id = reference_data.resolve_id("agents", assign_to, aliases=AGENT_ALIASES)
+    if agent_id is None:
+        print(f"⚠️ Unknown agent provided: {assign_to}. Defaulting to agent ID {DEFAULT_AGENT_ID}.")
+        agent_id = DEFAULT_AGENT_ID
+    assign_to = agent_id
 
-    action_payload = [{
+    return {
         "ticket_id": ticket_id,
         "outcome": "Private Note",
         "who": "AI Support Bot",
@@ -233,37 +1085,227 @@ def add_ticket_note(ticket_id, assign_to, ai_notes):
         "actiondatecreated": timestamp,
         "actioncompletiondate": timestamp,
         "actionarrivaldate": timestamp
-    }]
+    }
 
-    print(f"📤 Adding AI Note to Ticket #{ticket_id}")
 
-    action_response = requests.post(
-        ACTION_URL,  # ✅ Correct API for adding notes
-        json=action_payload,
-        headers=headers
-    )
+# 🔹 FUNCTION: CONFIRMED IDS
+def confirmed_ticket_ids(response, items, key, stage):
+    """Map an array POST response back to the ticket ids (items[key]) it confirmed.
 
-    if action_response.status_code in [200, 201]:
-        print(f"✅ AI Note Added to Ticket #{ticket_id}")
-    else:
-        print(f"❌ Failed to Add AI Note. Status Code: {action_response.status_code}, Response: {action_response.text}")
+    A 2xx response that does not echo the records is taken as confirming every item.
+    """
+    if response.status_code not in [200, 201]:
+        print(f"❌ Batch write failed. Status Code: {response.status_code}, Response: {response.text}")
+        metrics.inc("triage_errors_total", stage=stage)
+        return set()
 
-### ✅ 3️⃣ Function to Process Ticket Updates ###
+    requested = {item[key] for item in items}
+    try:
+        body = response.json()
+    except ValueError:
+        return requested
 
-def update_ticket(ticket_id, urgency, impact, ticket_type, assign_to, ai_notes, status_id):
-    """Update a ticket: Move to the AI-selected status and add an AI-generated note."""
+    records = body if isinstance(body, list) else [body]
+    echoed = {record.get(key) for record in records if isinstance(record, dict)} - {None}
+    return requested & echoed if echoed else requested
 
-    print(f"📤 AI has determined the best status for Ticket #{ticket_id}: {status_id}")
 
-    # Step 1: Move Ticket to the AI-Recommended Status
-    if update_ticket_status(ticket_id, status_id):
-        # Step 2: Add AI-generated note only if the status update was successful
-        add_ticket_note(ticket_id, assign_to, ai_notes)
+# 🔹 FUNCTION: WRITE STATUS BATCH
+@timed("write_status_batch")
+def write_status_batch(items):
+    """POST many status changes as one array and return the confirmed ticket ids."""
+    headers = {
+        "Authorization": f"Bearer {get_access_token()}",
+        "Content-Type": "application/json"
+    }
+    print(f"📤 Updating status on {len(items)} ticket(s) in one request.")
+    response = halo_client.post(TICKET_URL, json=items, headers=headers, idempotent=True)
+    confirmed = confirmed_ticket_ids(response, items, "id", "write_status_batch")
+    print(f"✅ {len(confirmed)}/{len(items)} status update(s) confirmed.")
+    return confirmed
 
 
+# 🔹 FUNCTION: WRITE NOTE BATCH
+@timed("write_note_batch")
+def write_note_batch(items):
+    """POST many AI notes as one array and return the confirmed ticket ids."""
+    headers = {
+        "Authorization": f"Bearer {get_access_token()}",
+        "Content-Type": "application/json"
+    }
+    print(f"📤 Adding AI Notes to {len(items)} ticket(s) in one request.")
+    response = halo_client.post(ACTION_URL, json=items, headers=headers)
+    confirmed = confirmed_ticket_ids(response, items, "ticket_id", "write_note_batch")
+    print(f"✅ {len(confirmed)}/{len(items)} AI Note(s) confirmed.")
+    return confirmed
+
+
+# 🔹 FUNCTION: RESUMABLE TICKETS
+def resumable_tickets():
+    """Yield tickets a previous run analyzed but did not finish writing.
+
+    Their status may already have left 'New', so fetch_tickets() would never return them again.
+    """
+    init_local_state()
+    for ticket, _, _ in work_queue.resumable():
+        yield ticket
+
+
+# 🔹 FUNCTION: HAS PENDING WORK
+def has_pending_work(since=None):
+    """Cheap pre-check: is there an unfinished ticket from an earlier run, or any 'New' ticket in HaloPSA?
+
+    Needs only the work queue and the first HaloPSA page, so an idle run can stop before
+    ChromaDB or the OpenAI SDK are loaded.
+    """
+    if next(resumable_tickets(), None) is not None:
+        return True
+    tickets = _fetch_ticket_page(NEW_STATUS_ID, HALO_PAGE_SIZE, 1, since)
+    return tickets is not None and any(_is_listed(ticket, NEW_STATUS_ID, since) for ticket in tickets)
+
+
+# 🔹 FUNCTION: LOAD CURSOR
+def load_cursor(path=TRIAGE_CURSOR_FILE):
+    """Load the persisted high-water mark, or an empty cursor on first run."""
+    try:
+        with open(path) as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return {}
+    except json.JSONDecodeError:
+        print(f"⚠️ Cursor file {path} is corrupt. Starting from a full scan.")
+        return {}
+
+
+# 🔹 FUNCTION: SAVE CURSOR
+def save_cursor(cursor, path=TRIAGE_CURSOR_FILE):
+    """Atomically replace the cursor file so a crash never leaves a half-written cursor."""
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, "w") as f:
+        json.dump(cursor, f)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp_path, path)
+
+
+# 🔹 FUNCTION: RUN TRIAGE CYCLE
+def run_triage_cycle(cursor):
+    """Triage tickets that occurred since the cursor and return (tickets_received, new_cursor).
+
+    The cursor advances to the newest ticket seen, or holds at the oldest failed ticket so it is
+    picked up again next cycle. Triaged tickets leave 'New', so re-reading from there is cheap.
+    """
+    if not has_pending_work(since=cursor.get("dateoccurred")):
+        return 0, cursor
+    occurred = {}
+
+    def remember(tickets):
+        for ticket in tickets:
+            occurred[ticket["id"]] = ticket.get("dateoccurred", "")
+            yield ticket
+
+    stats = process_tickets(itertools.chain(resumable_tickets(),
+                                            remember(fetch_tickets(since=cursor.get("dateoccurred")))))
+    if not occurred:
+        return 0, cursor
+
+    failed = [occurred[ticket_id] for ticket_id in stats["failed_ids"] if occurred.get(ticket_id)]
+    return len(occurred), {"dateoccurred": min(failed) if failed else max(occurred.values())}
+
+
+# 🔹 FUNCTION: RUN DAEMON
+def run_daemon(poll_interval=POLL_INTERVAL, max_poll_interval=MAX_POLL_INTERVAL):
+    """Poll for new tickets forever, persisting the cursor after each cycle and backing off while idle."""
+    cursor = load_cursor()
+    interval = poll_interval
+    print(f"🔁 Triage daemon started (cursor: {cursor.get('dateoccurred', 'full scan')}).")
+
+    while True:
+        try:
+            received, new_cursor = run_triage_cycle(cursor)
+            if new_cursor != cursor:
+                save_cursor(new_cursor)
+                cursor = new_cursor
+        except Exception as e:
+            print(f"❌ Triage cycle failed: {e}")
+            received = 0
+
+        interval = poll_interval if received else min(interval * 2, max_poll_interval)
+        print(f"💤 Next poll in {interval:.0f}s.")
+        time.sleep(interval)
+
+
+# 🔹 FUNCTION: PRINT RUN REPORT
+def print_run_report():
+    """Print connection reuse, rate-limit counters, cache savings and stage timings, and write the JSON metrics summary."""
+    stats = halo_client.connection_stats()
+    print(f"🔌 HaloPSA connections: {stats['requests']} requests over {stats['connections_opened']} "
+          f"connection(s), {stats['connections_reused']} reused.")
+    for endpoint, counts in request_scheduler.stats().items():
+        print(f"🚦 {endpoint}: {counts['requests']} requests, {counts['throttled']} throttled, "
+              f"{counts['retries']} retries, {counts['failures']} failures, {counts['wait_seconds']:.1f}s rate-limited.")
+    if triage_cache is not None:
+        cache_stats = triage_cache.stats(llm_stats["tickets"], llm_stats["seconds"], llm_stats["cost"])
+        print(f"♻️ Triage cache: {cache_stats['hits']}/{cache_stats['lookups']} hits "
+              f"({cache_stats['hit_rate']:.0%}), saved ~${cache_stats['cost_saved']:.2f} "
+              f"and ~{cache_stats['seconds_saved']:.1f}s of LLM time.")
+    if local_classifier is not None:
+        local_stats = local_classifier.stats()
+        agreement = ", ".join(f"{field} {share:.0%}" for field, share in local_stats["agreement"].items()) or "n/a"
+        print(f"⚡ Local classifier: {local_stats['local']}/{local_stats['predictions']} triaged locally "
+              f"({local_stats['escalation_rate']:.0%} escalated, {local_stats['shadowed']} shadowed), "
+              f"{local_stats['mean_seconds'] * 1000:.1f}ms per ticket; agreement with the LLM over "
+              f"{local_stats['compared']} ticket(s): {agreement}.")
+    prompt_tokens = metrics.summary()["counters"].get("prompt_tokens_total", {})
+    if prompt_tokens:
+        original, packed = prompt_tokens.get("kind=original", 0), prompt_tokens.get("kind=packed", 0)
+        print(f"✂️ Ticket prompts: {original} -> {packed} tokens "
+              f"({1 - packed / original if original else 0:.0%} removed by cleaning and budgeting).")
+    if work_queue is not None:
+        print(f"💾 Work queue: {work_queue.stats()}")
+    if cassette is not None:
+        print(f"📼 Cassette {cassette.path}: {cassette.stats()}")
+
+    metrics.write_summary()
+    for stage, timing in sorted(metrics.summary()["stages"].items(), key=lambda item: -item[1]["total_seconds"]):
+        print(f"⏱️ {stage}: {timing['calls']} calls, {timing['total_seconds']:.2f}s total, "
+              f"p50 {timing['p50_seconds'] * 1000:.0f}ms, p95 {timing['p95_seconds'] * 1000:.0f}ms")
+
 
 # 🔹 MAIN EXECUTION
 if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="AI ticket triage for HaloPSA.")
+    parser.add_argument("--daemon", action="store_true",
+                        help="poll continuously from the persisted cursor instead of running one full scan")
+    parser.add_argument("--metrics-port", type=int, default=METRICS_PORT,
+                        help="serve Prometheus metrics on this local port (0 disables)")
+    parser.add_argument("--stream", action="store_true", default=LLM_STREAMING,
+                        help="stream AI analyses and update each ticket's status before its reasoning is complete")
+    parser.add_argument("--record", metavar="CASSETTE", help="record all HaloPSA and OpenAI traffic to this file")
+    parser.add_argument("--replay", metavar="CASSETTE", help="serve HaloPSA and OpenAI responses from this recording")
+    parser.add_argument("--replay-speed", type=float, default=CASSETTE_SPEED,
+                        help="divide recorded latencies by this (0 replays instantly)")
+    args = parser.parse_args()
+    LLM_STREAMING = args.stream
+    if args.record or args.replay:
+        use_cassette(Cassette(args.record or args.replay, "record" if args.record else "replay", args.replay_speed))
+
+    if args.metrics_port:
+        metrics.serve(args.metrics_port)
+
     print("\n🚀 Starting AI Ticket Triage and Analysis\n")
-    process_tickets(fetch_tickets())
+    if args.daemon:
+        try:
+            run_daemon()
+        except KeyboardInterrupt:
+            print_run_report()
+            sys.exit(0)
+
+    if not has_pending_work():
+        print("✅ No 'New' or unfinished tickets. Nothing to triage.")
+        metrics.write_summary()
+        sys.exit(0)
+
+    process_tickets(itertools.chain(resumable_tickets(), fetch_tickets()))
+    print_run_report()
     print("🚀 AI Triage workflow complete. Exiting.")
@@ -0,0 +1,294 @@
+import os
+import sys
+import json
+import time
+import zlib
+import math
+import random
+import argparse
+import tempfile
+import importlib
+import contextlib
+import multiprocessing
+import requests
+import mock_servers
+from generate_test_tickets import TICKET_TITLES, TICKET_DETAILS
+
+try:
+    import resource
+except ImportError:  # Windows: peak RSS is not reported
+    resource = None
+
+# ⚙️ Benchmark Settings
+BENCHMARK_TICKETS = 10000  # Synthetic tickets seeded into the mock tenant
+BENCHMARK_CLIENTS = 50  # Distinct client_id values spread across the tickets
+BENCHMARK_MAX_REGRESSION = 0.10  # Allowed throughput drop / latency rise versus a baseline before failing
+HASH_EMBEDDING_DIMENSIONS = 384  # Same width as the default ChromaDB embedding model
+
+# Rate limits used unless already set in the environment, so the benchmark measures our code rather than the limiter
+BENCHMARK_ENVIRONMENT = {
+    "HALO_REQUESTS_PER_SECOND": "10000", "HALO_BURST": "1000",
+    "OPENAI_REQUESTS_PER_SECOND": "10000", "OPENAI_BURST": "1000",
+    "TRIAGE_CACHE_ENABLED": "0", "WRITE_FLUSH_SECONDS": "0.2",
+}
+
+SITES = ["Head Office", "Warehouse", "Branch 1", "Branch 2", "Remote"]
+PRIORITIES = {1: ("Critical", 1.0), 2: ("High", 2.0), 3: ("Medium", 4.0), 4: ("Low", 8.0)}
+
+
+# 🔹 FUNCTION: SYNTHETIC TICKETS
+def synthetic_tickets(count, seed=0, clients=BENCHMARK_CLIENTS):
+    """Build count 'New' tickets from the test-ticket vocabularies, shaped like HaloPSA records
+    (including the nested priority object and display fields a real tenant returns)."""
+    rng = random.Random(seed)
+    started = time.time() - count
+    tickets = []
+    for ticket_id in range(1, count + 1):
+        site = rng.choice(SITES)
+        priority_id = rng.choice([1, 2, 3, 3, 4, 4])
+        priority_name, fix_hours = PRIORITIES[priority_id]
+        client_id = rng.randint(1, clients)
+        tickets.append({
+            "id": ticket_id,
+            "summary": f"TEST - {rng.choice(TICKET_TITLES)}",
+            "details": f"{rng.choice(TICKET_DETAILS)} Reported from {site}, asset TAG-{rng.randint(10000, 99999)}.",
+            "status_id": 1,
+            "client_id": client_id,
+            "client_name": f"Client {client_id}",
+            "site_id": SITES.index(site) + 1,
+            "site_name": site,
+            "priority_id": priority_id,
+            "priority": {"priorityid": priority_id, "slaid": 1, "name": priority_name, "fixtime": fix_hours,
+                         "fixunits": "H", "responsetime": fix_hours / 2, "responseunits": "H", "colour": "#68bc00"},
+            "sla_id": 1,
+            "sla_name": "Request SLA",
+            "user_name": "General User",
+            "team": "Tier 1",
+            "category_1": "Infrastructure>Server",
+            "workflow_name": " Incident Management + Triage",
+            "dateoccurred": time.strftime("%Y-%m-%dT%H:%M:%S", time.gmtime(started + ticket_id)),
+        })
+    return tickets
+
+
+class HashingEmbedder:
+    """Deterministic bag-of-words embedding so the benchmark runs offline without the ONNX model."""
+
+    def __init__(self, dimensions=HASH_EMBEDDING_DIMENSIONS):
+        self.dimensions = dimensions
+
+    def __call__(self, input):
+        embeddings = []
+        for document in input:
+            vector = [0.0] * self.dimensions
+            for word in document.lower().split():
+                vector[zlib.crc32(word.encode()) % self.dimensions] += 1.0
+            norm = math.sqrt(sum(value * value for value in vector)) or 1.0
+            embeddings.append([value / norm for value in vector])
+        return embeddings
+
+
+def use_hash_embedder(triage):
+    """Swap the triage module's embedder for HashingEmbedder (also run inside sharded workers)."""
+    triage.init_vector_store()
+    triage.ticket_embedder = triage.similar_tickets.embedder = HashingEmbedder()
+
+
+def percentile(values, q):
+    """Nearest-rank percentile of values (0 when empty)."""
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, max(0, math.ceil(q * len(ordered)) - 1))]
+
+
+# 🔹 FUNCTION: RUN MOCK SERVERS
+def _run_mock_servers(ticket_count, seed, halo_faults, llm_faults, seconds_per_token, ports):
+    """Child process: seed the mock tenant and serve both stand-ins until terminated."""
+    halo = mock_servers.MockHaloPSA(synthetic_tickets(ticket_count, seed), halo_faults)
+    halo_server = mock_servers.serve(halo.handler(), 0)
+    openai_server = mock_servers.serve(mock_servers.MockOpenAI(llm_faults, seconds_per_token).handler(), 0)
+    ports.put((halo_server.server_port, openai_server.server_port))
+    while True:
+        time.sleep(3600)
+
+
+def start_mock_servers(ticket_count, seed, halo_faults, llm_faults, seconds_per_token=0.0):
+    """Run the stand-ins in their own process so their memory and CPU stay out of the measurement."""
+    ports = multiprocessing.Queue()
+    process = multiprocessing.Process(target=_run_mock_servers, name="mock-servers", daemon=True,
+                                      args=(ticket_count, seed, halo_faults, llm_faults, seconds_per_token, ports))
+    process.start()
+    halo_port, openai_port = ports.get(timeout=120)
+    return process, halo_port, openai_port
+
+
+def peak_rss_mb():
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return round(peak / (1024 * 1024 if sys.platform == "darwin" else 1024), 1)  # Bytes on macOS, KiB on Linux
+
+
+# 🔹 FUNCTION: RUN BENCHMARK
+def run_benchmark(args):
+    """Seed the mock tenant, run fetch -> analyze -> update end to end and return the measurements."""
+    mock_process, halo_port, openai_port = start_mock_servers(
+        args.tickets, args.seed, mock_servers.faults_from_args(args, "halo"), mock_servers.faults_from_args(args, "llm"),
+        args.llm_seconds_per_token)
+    halo_url = f"http://{mock_servers.MOCK_HOST}:{halo_port}"
+
+    for name, value in BENCHMARK_ENVIRONMENT.items():
+        os.environ.setdefault(name, value)
+    os.environ.update({
+        "HALO_PSA_BASE_URL": halo_url, "HALO_PSA_CLIENT_ID": "benchmark", "HALO_PSA_CLIENT_SECRET": "benchmark",
+        "OPENAI_BASE_URL": f"http://{mock_servers.MOCK_HOST}:{openai_port}/v1", "OPENAI_API_KEY": "benchmark",
+        "HALO_TOKEN_CACHE_FILE": "", "LLM_CONCURRENCY": str(args.llm_concurrency),
+        "HALO_WRITE_CONCURRENCY": str(args.write_concurrency), "HALO_PAGE_SIZE": str(args.page_size),
+    })
+    if args.triage_cache:
+        os.environ["TRIAGE_CACHE_ENABLED"] = "1"
+    if args.streaming:
+        os.environ["LLM_STREAMING"] = "1"
+
+    # Every local file the triage script writes (chroma_db, work queue, cursor, metrics) lands in a scratch dir
+    workdir = tempfile.mkdtemp(prefix="triage-benchmark-")
+    os.chdir(workdir)
+
+    rss_before = peak_rss_mb()
+    import_started = time.perf_counter()
+    triage = importlib.import_module("Hectic_AI_Support")
+    import_seconds = time.perf_counter() - import_started
+    # halo_client was imported (via generate_test_tickets) before HALO_TOKEN_CACHE_FILE was cleared above,
+    # so keep this process's tokens in memory explicitly; spawned shard workers read the cleared variable.
+    triage.halo_client.tokens.cache_path = None
+    setup = use_hash_embedder if args.embedder == "hash" else None
+    if setup:
+        setup(triage)
+
+    output = sys.stdout if args.verbose else open(os.devnull, "w")
+    started = time.perf_counter()
+    with contextlib.redirect_stdout(output):
+        if args.workers > 1:
+            import sharded_triage
+            stats = sharded_triage.run_sharded(args.workers, os.path.join(workdir, "shards"),
+                                               quiet=not args.verbose, setup=setup)
+            stage_metrics, local_stats = stats["metrics"], None  # Classifier state lives in each worker
+        else:
+            stats = triage.process_tickets(triage.fetch_tickets())
+            stage_metrics = triage.metrics
+            local_stats = triage.local_classifier.stats() if triage.local_classifier is not None else None
+    wall_seconds = time.perf_counter() - started
+
+    timings = requests.get(f"{halo_url}/_mock/stats", timeout=30).json()
+    llm_requests = requests.get(f"http://{mock_servers.MOCK_HOST}:{openai_port}/_mock/stats", timeout=30).json()
+    mock_process.terminate()
+
+    to_note = timings["seconds_to_note"]
+    to_status = timings["seconds_to_status"]
+    return {
+        "tickets": args.tickets,
+        "completed": timings["note_written"],
+        "failed": stats["analysis_failed"] + stats["update_failed"],
+        "wall_seconds": round(wall_seconds, 3),
+        "import_seconds": round(import_seconds, 3),
+        "tickets_per_second": round(timings["note_written"] / wall_seconds, 2) if wall_seconds else 0.0,
+        "latency_p50_seconds": round(percentile(to_note, 0.50), 3),
+        "latency_p99_seconds": round(percentile(to_note, 0.99), 3),
+        "status_latency_p50_seconds": round(percentile(to_status, 0.50), 3),
+        "status_latency_p99_seconds": round(percentile(to_status, 0.99), 3),
+        "peak_rss_mb": peak_rss_mb(),
+        "rss_before_import_mb": rss_before,
+        "halo_requests": timings["requests"],
+        "llm_requests": sum(llm_requests["requests"].values()),
+        "injected_faults": {"halopsa": timings["faults"], "openai": llm_requests["faults"]},
+        "local_classifier": local_stats,
+        "stages": stage_metrics.summary()["stages"],
+        "settings": {"workers": args.workers, "llm_concurrency": args.llm_concurrency, "write_concurrency": args.write_concurrency,
+                     "page_size": args.page_size, "embedder": args.embedder, "triage_cache": args.triage_cache,
+                     "streaming": args.streaming, "halo_latency": args.halo_latency, "llm_latency": args.llm_latency,
+                     "llm_seconds_per_token": args.llm_seconds_per_token,
+                     "halo_error_rate": args.halo_error_rate, "llm_error_rate": args.llm_error_rate,
+                     "halo_throttle_rate": args.halo_throttle_rate, "llm_throttle_rate": args.llm_throttle_rate},
+    }
+
+
+# 🔹 FUNCTION: COMPARE WITH BASELINE
+def compare_with_baseline(result, baseline, max_regression=BENCHMARK_MAX_REGRESSION):
+    """Print the change against a saved result and return the list of regressions beyond max_regression."""
+    regressions = []
+    checks = [("tickets_per_second", True), ("latency_p50_seconds", False), ("latency_p99_seconds", False),
+              ("status_latency_p50_seconds", False), ("peak_rss_mb", False)]
+    for key, higher_is_better in checks:
+        old, new = baseline.get(key), result.get(key)
+        if not old or new is None:
+            continue
+        change = (new - old) / old
+        worse = -change if higher_is_better else change
+        marker = "❌" if worse > max_regression else "✅"
+        print(f"{marker} {key}: {old} -> {new} ({change:+.1%})")
+        if worse > max_regression:
+            regressions.append(key)
+    return regressions
+
+
+def print_report(result):
+    print(f"\n🏁 {result['completed']}/{result['tickets']} tickets triaged in {result['wall_seconds']:.1f}s "
+          f"({result['tickets_per_second']:.1f} tickets/s, {result['failed']} failed)")
+    print(f"⏱️ Fetch -> note latency: p50 {result['latency_p50_seconds']:.2f}s, p99 {result['latency_p99_seconds']:.2f}s "
+          f"(status: p50 {result['status_latency_p50_seconds']:.2f}s, p99 {result['status_latency_p99_seconds']:.2f}s)")
+    if result["peak_rss_mb"] is not None:
+        print(f"🧠 Peak RSS {result['peak_rss_mb']} MB ({result['rss_before_import_mb']} MB before importing the "
+              f"triage script, import took {result['import_seconds']:.2f}s)")
+    print(f"🌐 {sum(result['halo_requests'].values())} HaloPSA requests, {result['llm_requests']} OpenAI requests, "
+          f"injected faults: {result['injected_faults']}")
+    if result.get("local_classifier"):
+        local = result["local_classifier"]
+        agreement = ", ".join(f"{field} {share:.0%}" for field, share in local["agreement"].items()) or "n/a"
+        print(f"⚡ Local classifier: {local['local']}/{local['predictions']} local ({local['escalation_rate']:.0%} "
+              f"escalated), {local['mean_seconds'] * 1000:.2f}ms each; LLM agreement over {local['compared']}: {agreement}")
+    for stage, timing in sorted(result["stages"].items(), key=lambda item: -item[1]["total_seconds"]):
+        print(f"   {stage}: {timing['calls']} calls, {timing['total_seconds']:.2f}s total, "
+              f"p50 {timing['p50_seconds'] * 1000:.0f}ms, p99 {timing['p99_seconds'] * 1000:.0f}ms")
+
+
+# 🔹 MAIN EXECUTION
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Offline end-to-end triage benchmark against local HaloPSA/OpenAI stand-ins.")
+    parser.add_argument("--tickets", type=int, default=BENCHMARK_TICKETS, help="synthetic tickets to seed")
+    parser.add_argument("--seed", type=int, default=0, help="random seed for the synthetic tickets")
+    parser.add_argument("--workers", type=int, default=1, help="triage worker processes sharded by client_id")
+    parser.add_argument("--llm-concurrency", type=int, default=4)
+    parser.add_argument("--write-concurrency", type=int, default=2)
+    parser.add_argument("--page-size", type=int, default=50)
+    parser.add_argument("--embedder", choices=["hash", "default"], default="hash",
+                        help="'hash' stays offline; 'default' includes the ONNX embedding model")
+    parser.add_argument("--triage-cache", action="store_true", help="enable near-duplicate decision reuse")
+    parser.add_argument("--streaming", action="store_true", help="stream completions and write statuses early")
+    mock_servers.add_fault_arguments(parser, "halo")
+    mock_servers.add_fault_arguments(parser, "llm")
+    parser.add_argument("--llm-seconds-per-token", type=float, default=0.0, help="simulated generation time per token")
+    parser.add_argument("--output", help="write the result as JSON to this file")
+    parser.add_argument("--baseline", help="compare against a previous --output file and exit 1 on regression")
+    parser.add_argument("--max-regression", type=float, default=BENCHMARK_MAX_REGRESSION)
+    parser.add_argument("--verbose", action="store_true", help="show the triage script's per-ticket output")
+    args = parser.parse_args()
+
+    output_path = os.path.abspath(args.output) if args.output else None
+    baseline_path = os.path.abspath(args.baseline) if args.baseline else None
+
+    print(f"🚀 Benchmarking triage on {args.tickets} synthetic tickets...")
+    result = run_benchmark(args)
+    print_report(result)
+
+    if output_path:
+        with open(output_path, "w") as f:
+            json.dump(result, f, indent=2)
+        print(f"💾 Result written to {output_path}")
+
+    if baseline_path:
+        with open(baseline_path) as f:
+            regressions = compare_with_baseline(result, json.load(f), args.max_regression)
+        if regressions:
+            print(f"❌ Regression in: {', '.join(regressions)}")
+            sys.exit(1)
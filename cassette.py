@@ -0,0 +1,435 @@
+import os
+import re
+import sys
+import gzip
+import json
+import time
+import atexit
+import hashlib
+import argparse
+import threading
+from collections import OrderedDict
+from urllib.parse import urlsplit
+import requests
+from requests.adapters import HTTPAdapter
+
+# ⚙️ Cassette Settings
+CASSETTE_MODE = os.getenv("CASSETTE_MODE", "")  # "record", "replay" or empty for live traffic
+CASSETTE_FILE = os.getenv("CASSETTE_FILE", "./triage_cassette.jsonl.gz")  # Gzipped JSON lines, one per exchange
+CASSETTE_SPEED = float(os.getenv("CASSETTE_SPEED", "1"))  # Replay latency divisor: 1 = as recorded, 10 = 10x faster, 0 = instant
+
+KEPT_RESPONSE_HEADERS = ("content-type", "retry-after", "etag")  # Everything else (cookies, request ids) is dropped
+REDACTED_TOKEN = "cassette-token"  # Stands in for recorded access tokens
+TIMESTAMP_PATTERN = re.compile(r"^\d{4}-\d{2}-\d{2}T\d{2}:\d{2}:\d{2}[\d.:+\-Z]*$")  # Request-time stamps, ignored when matching
+
+# One ticket in a single or batched triage prompt (see analyze_ticket_with_ai / analyze_tickets_with_ai)
+PROMPT_TICKET_PATTERN = re.compile(
+    r"(?:Ticket ID: (\S+)\n\s*)?Ticket Summary: (.*?)\n\s*Ticket Details: (.*?)"
+    r"(?=\n\s*(?:Similar [Pp]ast [Tt]ickets|---\n|Provide the output)|\Z)", re.S)
+
+
+def _path(url):
+    """Path and query of a URL, so a cassette replays against any base URL."""
+    parts = urlsplit(str(url))
+    return f"{parts.path}?{parts.query}" if parts.query else parts.path
+
+
+def _canonical(value):
+    """JSON value with dict keys and list items in a stable order and timestamps blanked, so neither
+    batch order nor the time of the request changes the key."""
+    if isinstance(value, str) and TIMESTAMP_PATTERN.match(value):
+        return "<timestamp>"
+    if isinstance(value, dict):
+        return {key: _canonical(item) for key, item in sorted(value.items())}
+    if isinstance(value, list):
+        return sorted((_canonical(item) for item in value), key=lambda item: json.dumps(item, sort_keys=True))
+    return value
+
+
+def _hash(value):
+    if not isinstance(value, bytes):
+        value = json.dumps(_canonical(value), sort_keys=True).encode() if not isinstance(value, str) else value.encode()
+    return hashlib.sha1(value).hexdigest()[:16]
+
+
+def _json(body):
+    try:
+        return json.loads(body) if body else None
+    except ValueError:
+        return None
+
+
+def _body_hash(path, body):
+    """Short hash of a request body. Token requests hash to nothing: their body is the client secret."""
+    if path.startswith("/auth/token") or not body:
+        return ""
+    value = _json(body)
+    return _hash(body if value is None else value)
+
+
+def _redact(path, content):
+    """Replace the access token in a recorded token response."""
+    if not path.startswith("/auth/token"):
+        return content
+    token = _json(content)
+    if isinstance(token, dict) and "access_token" in token:
+        token["access_token"] = REDACTED_TOKEN
+        content = json.dumps(token).encode()
+    return content
+
+
+# 🔹 FUNCTION: PER-ITEM ANSWERS
+def _prompt_tickets(request):
+    """[(ticket id or None, ticket key)] for each ticket in an OpenAI triage request."""
+    prompts = [message.get("content") or "" for message in request.get("messages", []) if message.get("role") == "user"]
+    return [(ticket_id, _hash(f"{summary.strip()}\n{details.strip()}"))
+            for ticket_id, summary, details in PROMPT_TICKET_PATTERN.findall(prompts[-1] if prompts else "")]
+
+
+def _completion(content):
+    """(message text, usage) of a recorded chat completion, streamed (SSE) or not."""
+    text = content.decode("utf-8", "replace") if isinstance(content, bytes) else content
+    if not text.lstrip().startswith("data:"):
+        completion = _json(text) or {}
+        choices = completion.get("choices") or [{}]
+        return (choices[0].get("message") or {}).get("content") or "", completion.get("usage")
+    pieces, usage = [], None
+    for line in text.splitlines():
+        chunk = _json(line[5:].strip()) if line.startswith("data:") and "[DONE]" not in line else None
+        if not chunk:
+            continue
+        usage = chunk.get("usage") or usage
+        for choice in chunk.get("choices") or []:
+            pieces.append((choice.get("delta") or {}).get("content") or "")
+    return "".join(pieces), usage
+
+
+def _answers(upstream, request, content):
+    """{item key: answer} for each ticket a request covered, so differently batched requests can be answered.
+
+    OpenAI triage answers are keyed by the ticket's prompt text (with their share of the token usage);
+    HaloPSA array POSTs are keyed by each posted item and answered with the record echoed for it.
+    """
+    if upstream == "openai" and isinstance(request, dict):
+        tickets = _prompt_tickets(request)
+        text, usage = _completion(content)
+        result = _json(text.strip())
+        if isinstance(result, dict) and "tickets" in result:
+            result = result["tickets"]
+        if isinstance(result, dict) and len(tickets) == 1 and tickets[0][0] == "":
+            elements = {"": result}
+        elif isinstance(result, list):
+            elements = {str(element.get("ticket_id")): element for element in result if isinstance(element, dict)}
+        else:
+            return {}
+        share = {name: (usage or {}).get(name, 0) / max(1, len(tickets)) for name in ("prompt_tokens", "completion_tokens")}
+        return {key: {"answer": {field: value for field, value in elements[ticket_id].items() if field != "ticket_id"},
+                      "usage": share}
+                for ticket_id, key in tickets if ticket_id in elements}
+
+    if upstream == "halopsa" and isinstance(request, list):
+        response = _json(content)
+        response = [response] if isinstance(response, dict) else response
+        if isinstance(response, list) and len(response) == len(request):
+            return {_hash(item): {"answer": echoed} for item, echoed in zip(request, response)}
+    return {}
+
+
+class Cassette:
+    """On-disk log of HaloPSA and OpenAI exchanges, recorded from live traffic and served back offline.
+
+    Each exchange is one gzipped JSON line: upstream, method, path, a hash of the request body, the
+    response status, a few headers and body, the per-ticket answers it contained, when it started
+    and how long it took. Request headers are never written and access tokens are redacted; ticket
+    contents are not, so the file is created private.
+
+    On replay a request gets the next unused exchange with the same method, path and body hash,
+    after sleeping the recorded latency divided by speed; a GET asked more often than recorded gets
+    the last answer again. The pipeline batches by timing, so an LLM or write batch may group the
+    same tickets differently than when recorded: such a request is answered from the recorded
+    per-ticket answers, taking its latency from the next unused exchange for that endpoint
+    ("assembled"). Items never recorded (say, a ticket the triage cache answered during
+    recording) are left out of the response, as a partial upstream answer would be. A request
+    with no recorded item gets that next exchange as is ("mismatched"), and otherwise a 599.
+    """
+
+    def __init__(self, path=CASSETTE_FILE, mode=CASSETTE_MODE, speed=CASSETTE_SPEED):
+        if mode not in ("record", "replay"):
+            raise ValueError(f"Cassette mode must be 'record' or 'replay', not {mode!r}")
+        self.path = path
+        self.mode = mode
+        self.speed = speed
+        self.started = time.time()
+        self._lock = threading.Lock()
+        self._stats = {"recorded": 0, "replayed": 0, "assembled": 0, "mismatched": 0, "missing": 0}
+        self._file = None
+        self._entries = []
+        self._by_key = {}
+        self._by_endpoint = {}
+        self._answers = {}
+        self._used = set()
+        self._cursors = {}
+
+        if mode == "record":
+            os.close(os.open(path, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600))  # Holds real ticket contents
+            self._file = gzip.open(path, "wt")
+            atexit.register(self.close)
+            return
+
+        self._entries = load(path)
+        for index, entry in enumerate(self._entries):
+            self._by_key.setdefault(self._key(entry), []).append(index)
+            self._by_endpoint.setdefault(self._endpoint(entry), []).append(index)
+            for item_key, answer in entry.get("answers", {}).items():
+                self._answers.setdefault((entry["upstream"], item_key), []).append(answer)
+
+    @classmethod
+    def from_env(cls):
+        """The cassette configured by CASSETTE_MODE / CASSETTE_FILE, or None for live traffic."""
+        return cls(CASSETTE_FILE, CASSETTE_MODE, CASSETTE_SPEED) if CASSETTE_MODE else None
+
+    @staticmethod
+    def _key(entry):
+        return entry["upstream"], entry["method"], entry["path"], entry["body"]
+
+    @staticmethod
+    def _endpoint(entry):
+        return entry["upstream"], entry["method"], entry["path"].split("?", 1)[0]
+
+    # 🔹 FUNCTION: RECORD
+    def record(self, upstream, method, url, body, status, headers, content, started, seconds):
+        path = _path(url)
+        entry = {
+            "upstream": upstream, "method": method, "path": path, "body": _body_hash(path, body),
+            "status": status, "at": round(started - self.started, 4), "seconds": round(seconds, 4),
+            "headers": {name: headers[name] for name in KEPT_RESPONSE_HEADERS if name in headers},
+            "content": _redact(path, content).decode("utf-8", "replace"),
+        }
+        if method == "POST" and 200 <= status < 300:
+            entry["answers"] = _answers(upstream, _json(body), content)
+        with self._lock:
+            if self._file is None:  # Closed at exit while a daemon thread was mid-request
+                return
+            self._file.write(json.dumps(entry, separators=(",", ":")) + "\n")
+            self._file.flush()  # A crashed run still leaves every exchange before the crash
+            self._stats["recorded"] += 1
+
+    # 🔹 FUNCTION: REPLAY
+    def replay(self, upstream, method, url, body):
+        """Return the recorded (or assembled) exchange for this request after its latency, or None."""
+        path = _path(url)
+        request = {"upstream": upstream, "method": method, "path": path, "body": _body_hash(path, body)}
+        with self._lock:
+            exact = self._by_key.get(self._key(request), [])
+            entry = self._take(self._key(request), exact)
+            if entry is None and method == "GET" and exact:
+                entry = self._entries[exact[-1]]  # Re-reads (a repeated page walk) get the last answer again
+            elif entry is None:
+                endpoint = self._endpoint(request)
+                template = self._take(endpoint, self._by_endpoint.get(endpoint, []))
+                entry = self._assemble(upstream, _json(body), template)
+                if entry is not None:
+                    self._stats["assembled"] += 1
+                else:
+                    entry = template
+                    self._stats["mismatched"] += entry is not None
+            self._stats["replayed" if entry is not None else "missing"] += 1
+        if entry is not None and self.speed > 0:
+            time.sleep(entry["seconds"] / self.speed)
+        return entry
+
+    def _take(self, name, indexes):
+        """Claim the first unused exchange in indexes. Caller holds self._lock."""
+        position = self._cursors.get(name, 0)
+        while position < len(indexes) and indexes[position] in self._used:
+            position += 1
+        self._cursors[name] = position
+        if position == len(indexes):
+            return None
+        self._used.add(indexes[position])
+        return self._entries[indexes[position]]
+
+    def _claim_answers(self, upstream, item_keys):
+        """Take one recorded answer per item (reusing the last when an item is asked again), None for
+        items never recorded, or None overall when no item was recorded."""
+        pools = [self._answers.get((upstream, item_key)) for item_key in item_keys]
+        if not any(pools):
+            return None
+        return [(pool.pop(0) if len(pool) > 1 else pool[0]) if pool else None for pool in pools]
+
+    def _assemble(self, upstream, request, template):
+        """Build a response for a differently batched request from recorded per-item answers. Caller holds self._lock."""
+        seconds = template["seconds"] if template else 0.0
+        if upstream == "halopsa" and isinstance(request, list):
+            answers = self._claim_answers(upstream, [_hash(item) for item in request])
+            if answers is None:
+                return None
+            echoed = [answer["answer"] for answer in answers if answer is not None]
+            return {"status": 201, "headers": {"content-type": "application/json"}, "seconds": seconds,
+                    "content": json.dumps(echoed if len(echoed) > 1 else echoed[0])}
+
+        if upstream == "openai" and isinstance(request, dict):
+            tickets = _prompt_tickets(request)
+            answers = self._claim_answers(upstream, [key for _, key in tickets])
+            if answers is None:
+                return None
+            if len(tickets) == 1 and tickets[0][0] == "":
+                text = json.dumps(answers[0]["answer"])
+            else:
+                text = json.dumps([{"ticket_id": int(ticket_id) if ticket_id.isdigit() else ticket_id, **answer["answer"]}
+                                   for (ticket_id, _), answer in zip(tickets, answers) if answer is not None])
+            usage = {name: round(sum(answer["usage"][name] for answer in answers if answer is not None))
+                     for name in ("prompt_tokens", "completion_tokens")}
+            usage["total_tokens"] = usage["prompt_tokens"] + usage["completion_tokens"]
+            return {"status": 200, "seconds": seconds, **_completion_response(request, text, usage)}
+        return None
+
+    # 🔹 FUNCTION: TRANSPORTS
+    def requests_adapter(self, **kwargs):
+        """A requests adapter that records or replays through this cassette (for HaloPSAClient.session)."""
+        return CassetteAdapter(self, **kwargs)
+
+    def httpx_transport(self, client_class, **kwargs):
+        """An httpx transport for client_class (the OpenAI SDK's http client) that records or replays through this cassette.
+
+        Live traffic goes through HTTPTransport(**kwargs) from the httpx package client_class is built on.
+        """
+        package = next(module for module in (sys.modules[cls.__module__.split(".", 1)[0]] for cls in client_class.__mro__)
+                       if hasattr(module, "HTTPTransport"))
+        return CassetteTransport(self, package.HTTPTransport(**kwargs))
+
+    def stats(self):
+        with self._lock:
+            return dict(self._stats)
+
+    def close(self):
+        with self._lock:
+            if self._file is not None:
+                self._file.close()
+                self._file = None
+
+
+def _completion_response(request, text, usage):
+    """Headers and body of a chat completion carrying text, as SSE when the request streamed."""
+    created = int(time.time())
+    base = {"id": f"chatcmpl-cassette-{created}", "created": created, "model": request.get("model", "")}
+    if not request.get("stream"):
+        body = {**base, "object": "chat.completion", "usage": usage, "choices": [
+            {"index": 0, "finish_reason": "stop", "message": {"role": "assistant", "content": text}}]}
+        return {"headers": {"content-type": "application/json"}, "content": json.dumps(body)}
+    chunks = [
+        {**base, "object": "chat.completion.chunk", "choices": [
+            {"index": 0, "finish_reason": None, "delta": {"role": "assistant", "content": text}}]},
+        {**base, "object": "chat.completion.chunk", "choices": [{"index": 0, "finish_reason": "stop", "delta": {}}]},
+        {**base, "object": "chat.completion.chunk", "choices": [], "usage": usage},
+    ]
+    content = "".join(f"data: {json.dumps(chunk)}\n\n" for chunk in chunks) + "data: [DONE]\n\n"
+    return {"headers": {"content-type": "text/event-stream"}, "content": content}
+
+
+class CassetteAdapter(HTTPAdapter):
+    """requests adapter for the HaloPSA session. Replay never opens a connection."""
+
+    def __init__(self, cassette, upstream="halopsa", **kwargs):
+        self.cassette = cassette
+        self.upstream = upstream
+        super().__init__(**kwargs)
+
+    def send(self, request, **kwargs):
+        if self.cassette.mode == "replay":
+            entry = self.cassette.replay(self.upstream, request.method, request.url, request.body)
+            response = requests.Response()
+            response.status_code = entry["status"] if entry else 599
+            response.headers.update(entry["headers"] if entry else {"content-type": "application/json"})
+            response._content = (entry["content"] if entry else '{"error": "not in cassette"}').encode()
+            response.url, response.request, response.encoding = request.url, request, "utf-8"
+            return response
+
+        started = time.time()
+        response = super().send(request, **kwargs)
+        self.cassette.record(self.upstream, request.method, request.url, request.body, response.status_code,
+                             {name.lower(): value for name, value in response.headers.items()},
+                             response.content, started, time.time() - started)
+        return response
+
+
+def _httpx_module(request):
+    """The httpx-compatible package the request came from (the OpenAI SDK may bundle its own fork)."""
+    return sys.modules[type(request).__module__.split(".", 1)[0]]
+
+
+class CassetteTransport:
+    """httpx transport for the OpenAI client. Streamed responses are recorded whole and replayed whole."""
+
+    def __init__(self, cassette, transport, upstream="openai"):
+        self.cassette = cassette
+        self.transport = transport
+        self.upstream = upstream
+
+    def handle_request(self, request):
+        if self.cassette.mode == "replay":
+            entry = self.cassette.replay(self.upstream, request.method, request.url, request.read())
+            response_type = _httpx_module(request).Response
+            if entry is None:
+                return response_type(599, json={"error": "not in cassette"}, request=request)
+            return response_type(entry["status"], headers=entry["headers"], content=entry["content"].encode(),
+                                 request=request)
+
+        started = time.time()
+        response = self.transport.handle_request(request)
+        content = response.read()
+        self.cassette.record(self.upstream, request.method, request.url, request.read(), response.status_code,
+                             {name.lower(): value for name, value in response.headers.items()},
+                             content, started, time.time() - started)
+        headers = [(name, value) for name, value in response.headers.items()
+                   if name.lower() not in ("content-encoding", "content-length", "transfer-encoding")]
+        return type(response)(response.status_code, headers=headers, content=content, request=request)
+
+    def close(self):
+        self.transport.close()
+
+
+# 🔹 FUNCTION: LOAD
+def load(path):
+    """Read every exchange in a cassette, tolerating a tail cut off by a crash mid-recording."""
+    entries = []
+    try:
+        with gzip.open(path, "rt") as f:
+            for line in f:
+                entries.append(json.loads(line))
+    except (EOFError, json.JSONDecodeError):
+        print(f"⚠️ Cassette {path} ends mid-record; using the {len(entries)} complete exchange(s).")
+    return entries
+
+
+# 🔹 FUNCTION: SUMMARIZE
+def summarize(entries):
+    """Per-endpoint call counts, statuses and recorded latency, slowest total first."""
+    endpoints = OrderedDict()
+    for entry in entries:
+        summary = endpoints.setdefault(f"{entry['upstream']} {entry['method']} {entry['path'].split('?', 1)[0]}",
+                                       {"calls": 0, "statuses": {}, "latencies": []})
+        summary["calls"] += 1
+        summary["statuses"][entry["status"]] = summary["statuses"].get(entry["status"], 0) + 1
+        summary["latencies"].append(entry["seconds"])
+    return sorted(endpoints.items(), key=lambda item: -sum(item[1]["latencies"]))
+
+
+# 🔹 MAIN EXECUTION
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Summarize a recorded HaloPSA/OpenAI cassette.")
+    parser.add_argument("path", nargs="?", default=CASSETTE_FILE)
+    args = parser.parse_args()
+
+    entries = load(args.path)
+    if not entries:
+        print(f"❌ No exchanges in {args.path}.")
+        sys.exit(1)
+    span = max(entry["at"] + entry["seconds"] for entry in entries)
+    print(f"📼 {args.path}: {len(entries)} exchange(s) over {span:.1f}s of recorded traffic.")
+    for endpoint, summary in summarize(entries):
+        latencies = sorted(summary["latencies"])
+        statuses = ", ".join(f"{status}: {count}" for status, count in sorted(summary["statuses"].items()))
+        print(f"⏱️ {endpoint}: {summary['calls']} calls, {sum(latencies):.2f}s total, "
+              f"p50 {latencies[len(latencies) // 2] * 1000:.0f}ms, "
+              f"p95 {latencies[min(len(latencies) - 1, int(0.95 * len(latencies)))] * 1000:.0f}ms ({statuses})")
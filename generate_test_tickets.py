@@ -1,17 +1,24 @@
-import requests
-import random
+import os
+import sys
+import json
 import time
-
-# Configuration - Replace with actual credentials
-HALO_PSA_CLIENT_ID = "f1d979f7-22d8-4c25-81a4-256b95709ee6"
-HALO_PSA_CLIENT_SECRET = "8bc61385-6990-46c4-8ffe-ff5f75ecd0f8-75b7d638-c689-4708-b986-f2f7ef6ad268"
-HALO_PSA_BASE_URL = "https://opendoormsp.halopsa.com"
-TOKEN_URL = f"{HALO_PSA_BASE_URL}/auth/token"
-CREATE_TICKET_URL = f"{HALO_PSA_BASE_URL}/api/tickets"
-
-# Store the access token globally
-ACCESS_TOKEN = None
-TOKEN_EXPIRATION = 0
+import random
+import argparse
+import threading
+import contextlib
+from halo_client import HaloPSAClient
+from rate_limit import TokenBucket
+
+# Configuration - set these in the environment (or point --base-url at mock_servers.py)
+HALO_PSA_CLIENT_ID = os.getenv("HALO_PSA_CLIENT_ID")
+HALO_PSA_CLIENT_SECRET = os.getenv("HALO_PSA_CLIENT_SECRET")
+HALO_PSA_BASE_URL = os.getenv("HALO_PSA_BASE_URL", "https://opendoormsp.halopsa.com")
+
+# ⚙️ Load Settings
+LOAD_TICKETS = int(os.getenv("LOAD_TICKETS", "100"))  # Tickets to create per run
+LOAD_RATE = float(os.getenv("LOAD_RATE", "5"))  # Target tickets per second (0 = as fast as possible)
+LOAD_CONCURRENCY = int(os.getenv("LOAD_CONCURRENCY", "4"))  # Create requests in flight at once
+LOAD_BATCH_SIZE = int(os.getenv("LOAD_BATCH_SIZE", "10"))  # Tickets per array POST
 
 # Sample test data for random ticket generation
 TICKET_TITLES = [
@@ -36,80 +43,184 @@ TICKET_DETAILS = [
 
 # These IDs should match what was used in the successful test
 DEFAULT_USER_ID = 125
-DEFAULT_CATEGORY_ID = 137
-DEFAULT_IMPACT = 2
-DEFAULT_URGENCY = 3
-
-def get_access_token():
-    """Retrieve and refresh the HaloPSA API token."""
-    global ACCESS_TOKEN, TOKEN_EXPIRATION
-
-    if ACCESS_TOKEN and time.time() < TOKEN_EXPIRATION:
-        return ACCESS_TOKEN
-
-    payload = {
-        "grant_type": "client_credentials",
-        "client_id": HALO_PSA_CLIENT_ID,
-        "client_secret": HALO_PSA_CLIENT_SECRET,
-        "scope": "all"
-    }
-    headers = {"Content-Type": "application/x-www-form-urlencoded"}
-
-    response = requests.post(TOKEN_URL, data=payload, headers=headers)
-
-    if response.status_code == 200:
-        token_data = response.json()
-        ACCESS_TOKEN = token_data.get("access_token")
-        expires_in = token_data.get("expires_in", 3600)
-        TOKEN_EXPIRATION = time.time() + expires_in - 60
-        print("✅ Retrieved New Access Token")
-        return ACCESS_TOKEN
-    else:
-        print(f"❌ Failed to retrieve access token: {response.text}")
-        raise Exception("Failed to retrieve access token")
-
-def create_test_ticket():
-    """Creates a single test ticket in HaloPSA with the correct format."""
-    access_token = get_access_token()
-    headers = {
-        "Authorization": f"Bearer {access_token}",
-        "Content-Type": "application/json"
-    }
-
-    ticket_payload = [{
-        "summary": f"TEST - {random.choice(TICKET_TITLES)}",
-        "details": random.choice(TICKET_DETAILS),
-        "user_id": DEFAULT_USER_ID,
-        "categoryid_1": DEFAULT_CATEGORY_ID,
-        "impact": DEFAULT_IMPACT,
-        "urgency": DEFAULT_URGENCY
-    }]
-
-    response = requests.post(CREATE_TICKET_URL, json=ticket_payload, headers=headers)
-
-    # Debugging response content
-    print(f"🔍 API Response ({response.status_code}): {response.text}")
-
-    if response.status_code in [200, 201]:
-        ticket_data = response.json()
-
-        # Ensure response is a list and contains at least one item
-        if isinstance(ticket_data, list) and len(ticket_data) > 0 and "id" in ticket_data[0]:
-            print(f"✅ Successfully created test ticket: {ticket_data[0]['id']} - {ticket_payload[0]['summary']}")
-        else:
-            print(f"⚠️ Ticket creation response format unexpected: {ticket_data}")
-    else:
-        print(f"❌ Failed to create test ticket: {response.status_code} - {response.text}")
-
-def main():
-    num_tickets = int(input("Enter the number of test tickets to create: "))
-    print(f"🚀 Creating {num_tickets} test tickets in HaloPSA...")
-
-    for _ in range(num_tickets):
-        create_test_ticket()
-        time.sleep(1)  # Slight delay to avoid rate-limiting
-
-    print("✅ Test ticket generation complete.")
 
+# Relative weights used to randomize each ticket (override with --categories / --impacts / --urgencies)
+CATEGORY_WEIGHTS = {137: 5, 155: 3, 162: 2}  # categoryid_1
+IMPACT_WEIGHTS = {1: 1, 2: 3, 3: 6}  # 1 = High, 2 = Medium, 3 = Low
+URGENCY_WEIGHTS = {1: 1, 2: 3, 3: 6}  # 1 = High, 2 = Medium, 3 = Low
+
+# Fields HaloPSA assigns itself; dropped from replayed tickets so they are created fresh
+REPLAY_SKIP_FIELDS = {"id", "status_id", "dateoccurred", "last_update", "datecreated"}
+
+
+# 🔹 FUNCTION: PARSE WEIGHTS
+def parse_weights(text):
+    """Parse "137:5,155:3" (or "137,155" for equal weights) into {137: 5.0, 155: 3.0}."""
+    weights = {}
+    for part in text.split(","):
+        value, _, weight = part.strip().partition(":")
+        weights[int(value)] = float(weight or 1)
+    return weights
+
+
+def weighted_choice(rng, weights):
+    return rng.choices(list(weights), weights=list(weights.values()))[0]
+
+
+# 🔹 FUNCTION: RANDOM TICKETS
+def random_tickets(count, seed=None, categories=CATEGORY_WEIGHTS, impacts=IMPACT_WEIGHTS, urgencies=URGENCY_WEIGHTS):
+    """Yield count create payloads with category, impact and urgency drawn from the given weights."""
+    rng = random.Random(seed)
+    for _ in range(count):
+        yield {
+            "summary": f"TEST - {rng.choice(TICKET_TITLES)}",
+            "details": rng.choice(TICKET_DETAILS),
+            "user_id": DEFAULT_USER_ID,
+            "categoryid_1": weighted_choice(rng, categories),
+            "impact": weighted_choice(rng, impacts),
+            "urgency": weighted_choice(rng, urgencies)
+        }
+
+
+# 🔹 FUNCTION: REPLAY TICKETS
+def load_corpus(path):
+    """Read recorded tickets from a JSON list, a {"tickets": [...]} page, or JSON lines."""
+    with open(path) as f:
+        text = f.read()
+    try:
+        corpus = json.loads(text)
+    except json.JSONDecodeError:
+        corpus = [json.loads(line) for line in text.splitlines() if line.strip()]
+    if isinstance(corpus, dict):
+        corpus = corpus.get("tickets", [])
+    return [ticket for ticket in corpus if isinstance(ticket, dict)]
+
+
+def replay_tickets(corpus, count):
+    """Yield count create payloads from recorded tickets, cycling through the corpus in order."""
+    for index in range(count):
+        ticket = corpus[index % len(corpus)]
+        yield {field: value for field, value in ticket.items() if field not in REPLAY_SKIP_FIELDS}
+
+
+# 🔹 FUNCTION: GENERATE LOAD
+def generate_load(client, payloads, rate=LOAD_RATE, concurrency=LOAD_CONCURRENCY, batch_size=LOAD_BATCH_SIZE):
+    """Create tickets with array POSTs from concurrent workers, paced to rate tickets per second.
+
+    Creation is not idempotent, so failed requests are counted rather than retried.
+    Returns the counts, per-request latencies and an error breakdown keyed by status code or exception.
+    """
+    create_url = f"{client.base_url}/api/tickets"
+    bucket = TokenBucket(rate / batch_size, 1) if rate > 0 else None  # One token per array POST
+    payloads = iter(payloads)
+    payload_lock = threading.Lock()
+    results = {"requested": 0, "created": 0, "requests": 0, "latencies": [], "errors": {}, "ticket_ids": []}
+    results_lock = threading.Lock()
+
+    def next_batch():
+        with payload_lock:
+            return [payload for _, payload in zip(range(batch_size), payloads)]
+
+    def record(batch, created, seconds, error=None):
+        with results_lock:
+            results["requests"] += 1
+            results["requested"] += len(batch)
+            results["created"] += len(created)
+            results["ticket_ids"].extend(ticket.get("id") for ticket in created)
+            results["latencies"].append(seconds)
+            if error:
+                results["errors"][error] = results["errors"].get(error, 0) + len(batch) - len(created)
+
+    def worker():
+        while True:
+            batch = next_batch()
+            if not batch:
+                return
+            if bucket is not None:
+                bucket.acquire()
+            headers = {"Authorization": f"Bearer {client.get_access_token()}", "Content-Type": "application/json"}
+            started = time.perf_counter()
+            try:
+                response = client.post(create_url, json=batch, headers=headers)
+            except Exception as e:
+                record(batch, [], time.perf_counter() - started, type(e).__name__)
+                continue
+            seconds = time.perf_counter() - started
+            if response.status_code not in (200, 201):
+                record(batch, [], seconds, f"HTTP {response.status_code}")
+                continue
+            try:
+                created = response.json()
+            except ValueError:
+                record(batch, [], seconds, "invalid JSON")
+                continue
+            created = created if isinstance(created, list) else [created]
+            created = [ticket for ticket in created if isinstance(ticket, dict) and "id" in ticket]
+            record(batch, created, seconds, "missing from response" if len(created) < len(batch) else None)
+
+    started = time.perf_counter()
+    threads = [threading.Thread(target=worker, name=f"load-{index + 1}", daemon=True) for index in range(concurrency)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    results["seconds"] = time.perf_counter() - started
+    return results
+
+
+# 🔹 FUNCTION: PRINT LOAD REPORT
+def print_load_report(results, rate):
+    seconds = results["seconds"] or 1e-9
+    latencies = sorted(results["latencies"])
+
+    def percentile(q):
+        return latencies[min(len(latencies) - 1, int(q * len(latencies)))] * 1000 if latencies else 0.0
+
+    target = f"target {rate:.1f}/s" if rate > 0 else "unthrottled"
+    print(f"✅ Created {results['created']}/{results['requested']} ticket(s) in {results['requests']} request(s) "
+          f"over {results['seconds']:.1f}s: {results['created'] / seconds:.1f} tickets/s ({target}).")
+    print(f"⏱️ Create requests: p50 {percentile(0.5):.0f}ms, p95 {percentile(0.95):.0f}ms, max {percentile(1.0):.0f}ms")
+    for error, count in sorted(results["errors"].items(), key=lambda item: -item[1]):
+        print(f"❌ {error}: {count} ticket(s)")
+
+
+# 🔹 MAIN EXECUTION
 if __name__ == "__main__":
-    main()
+    parser = argparse.ArgumentParser(description="Create test tickets in HaloPSA (or a local stand-in) at a controlled rate.")
+    parser.add_argument("count", type=int, nargs="?", default=None,
+                        help=f"tickets to create (default {LOAD_TICKETS}, or the corpus size with --replay)")
+    parser.add_argument("--rate", type=float, default=LOAD_RATE, help="target tickets per second (0 = unthrottled)")
+    parser.add_argument("--concurrency", type=int, default=LOAD_CONCURRENCY, help="create requests in flight at once")
+    parser.add_argument("--batch-size", type=int, default=LOAD_BATCH_SIZE, help="tickets per array POST")
+    parser.add_argument("--replay", help="recorded tickets to re-create (JSON list, ticket page or JSON lines)")
+    parser.add_argument("--categories", type=parse_weights, default=CATEGORY_WEIGHTS, help='weights, e.g. "137:5,155:3"')
+    parser.add_argument("--impacts", type=parse_weights, default=IMPACT_WEIGHTS, help='weights, e.g. "1:1,2:3,3:6"')
+    parser.add_argument("--urgencies", type=parse_weights, default=URGENCY_WEIGHTS, help='weights, e.g. "1:1,2:3,3:6"')
+    parser.add_argument("--seed", type=int, help="seed for reproducible ticket content")
+    parser.add_argument("--base-url", default=HALO_PSA_BASE_URL, help="HaloPSA tenant or stand-in server URL")
+    parser.add_argument("--json", action="store_true", help="print the results as JSON instead of a report")
+    args = parser.parse_args()
+
+    if args.replay:
+        corpus = load_corpus(args.replay)
+        count = args.count or len(corpus)
+        payloads = replay_tickets(corpus, count)
+    else:
+        count = args.count or LOAD_TICKETS
+        payloads = random_tickets(count, args.seed, args.categories, args.impacts, args.urgencies)
+
+    client = HaloPSAClient(args.base_url, HALO_PSA_CLIENT_ID or "", HALO_PSA_CLIENT_SECRET or "", pool_size=args.concurrency)
+    if not args.json:
+        print(f"🚀 Creating {count} test tickets at {args.base_url} ({args.concurrency} concurrent, "
+              f"{args.batch_size} per request)...")
+    with contextlib.redirect_stdout(sys.stderr if args.json else sys.stdout):  # Keep --json output parseable
+        try:
+            client.get_access_token()  # Authenticate once before the workers start
+        except Exception as e:
+            print(f"❌ Could not authenticate with {args.base_url}: {e}")
+            sys.exit(1)
+        results = generate_load(client, payloads, args.rate, args.concurrency, args.batch_size)
+    if args.json:
+        print(json.dumps({key: value for key, value in results.items() if key != "latencies"}, indent=2))
+    else:
+        print_load_report(results, args.rate)
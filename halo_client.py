@@ -0,0 +1,249 @@
+import os
+import json
+import time
+import threading
+import requests
+from contextlib import contextmanager
+from urllib.parse import urlparse
+from requests.adapters import HTTPAdapter
+
+try:
+    import fcntl
+except ImportError:  # Windows: single-flight still holds within a process
+    fcntl = None
+
+# ⚙️ Connection Pool Settings
+HALO_POOL_SIZE = int(os.getenv("HALO_POOL_SIZE", "10"))  # Keep-alive connections per host
+HALO_CONNECT_TIMEOUT = float(os.getenv("HALO_CONNECT_TIMEOUT", "5"))  # Seconds to establish a connection
+HALO_READ_TIMEOUT = float(os.getenv("HALO_READ_TIMEOUT", "30"))  # Seconds to wait for a response
+
+# 🔑 Token Cache Settings
+HALO_TOKEN_CACHE_FILE = os.getenv("HALO_TOKEN_CACHE_FILE",
+                                  os.path.join(os.path.expanduser("~"), ".halo_token_cache.json"))
+TOKEN_SAFETY_MARGIN = 60  # Treat tokens as expired this many seconds early
+TOKEN_REFRESH_AHEAD = float(os.getenv("TOKEN_REFRESH_AHEAD", "300"))  # Start a background refresh this long before that
+TOKEN_REFRESH_AHEAD_FRACTION = float(os.getenv("TOKEN_REFRESH_AHEAD_FRACTION", "0.5"))  # ...but within this share of its lifetime
+
+
+class TokenProvider:
+    """Single-flight HaloPSA token cache shared by threads, processes and short-lived scripts.
+
+    Only one thread per process, and one process per cache file, fetches a token at a time;
+    everyone else waits and reuses the result. Tokens are persisted to cache_path (keyed by
+    tenant and client id) so a fresh process reuses a valid token instead of re-authenticating.
+    Once a token is within refresh_ahead seconds (at most TOKEN_REFRESH_AHEAD_FRACTION of its
+    lifetime) of its safety margin, callers keep getting it while a background thread fetches the next one.
+    """
+
+    def __init__(self, fetch_token, cache_key, cache_path=HALO_TOKEN_CACHE_FILE, refresh_ahead=TOKEN_REFRESH_AHEAD):
+        self.fetch_token = fetch_token
+        self.cache_key = cache_key
+        self.cache_path = cache_path
+        self.refresh_ahead = refresh_ahead
+
+        self._token = None
+        self._usable_until = 0
+        self._refresh_at = 0
+        self._lock = threading.Lock()  # Held for the whole fetch
+        self._refreshing = False
+        self._refreshing_lock = threading.Lock()  # Guards _refreshing only, so callers never wait on a fetch
+
+    # 🔹 FUNCTION: GET TOKEN
+    def get_token(self):
+        """Return a valid access token, fetching or reusing a cached one as needed."""
+        now = time.time()
+        token, usable_until, refresh_at = self._token, self._usable_until, self._refresh_at
+        if token and now < usable_until:
+            if now >= refresh_at:
+                self._refresh_in_background()
+            return token
+
+        with self._lock:
+            if not (self._token and time.time() < self._usable_until):
+                self._refresh_locked(proactive=False)
+            return self._token
+
+    def forget(self):
+        """Drop the token held in memory, so the next get_token() reads the cache file or fetches one."""
+        with self._lock:
+            self._token, self._usable_until, self._refresh_at = None, 0, 0
+
+    def _refresh_in_background(self):
+        with self._refreshing_lock:
+            if self._refreshing:
+                return
+            self._refreshing = True
+        threading.Thread(target=self._background_refresh, name="halo-token-refresh", daemon=True).start()
+
+    def _background_refresh(self):
+        try:
+            with self._lock:
+                if time.time() >= self._refresh_at:
+                    self._refresh_locked(proactive=True)
+        except Exception as e:
+            print(f"⚠️ Background token refresh failed, will retry on next use: {e}")
+        finally:
+            with self._refreshing_lock:
+                self._refreshing = False
+
+    def _refresh_window(self, lifetime):
+        """Seconds before usable_until to refresh a token usable for lifetime seconds."""
+        return min(self.refresh_ahead, max(lifetime, 0) * TOKEN_REFRESH_AHEAD_FRACTION)
+
+    def _refresh_locked(self, proactive):
+        """Adopt a fresher token from the cache file or fetch a new one. Caller holds self._lock."""
+        with self._file_lock():
+            cached = self._read_cache().get(self.cache_key)
+            if cached:
+                usable_until = cached["usable_until"]
+                refresh_at = cached.get("refresh_at", usable_until - self._refresh_window(usable_until - time.time()))
+                if time.time() < (refresh_at if proactive else usable_until):
+                    self._token, self._usable_until, self._refresh_at = cached["access_token"], usable_until, refresh_at
+                    return
+
+            access_token, expires_in = self.fetch_token()
+            lifetime = expires_in - TOKEN_SAFETY_MARGIN
+            self._token = access_token
+            self._usable_until = time.time() + lifetime
+            self._refresh_at = self._usable_until - self._refresh_window(lifetime)
+            self._write_cache()
+
+    @contextmanager
+    def _file_lock(self):
+        if fcntl is None or not self.cache_path:
+            yield
+            return
+        with open(f"{self.cache_path}.lock", "a") as lock_file:
+            fcntl.flock(lock_file, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+    def _read_cache(self):
+        if not self.cache_path:
+            return {}
+        try:
+            with open(self.cache_path) as f:
+                return json.load(f)
+        except (FileNotFoundError, json.JSONDecodeError):
+            return {}
+
+    def _write_cache(self):
+        if not self.cache_path:
+            return
+        cache = self._read_cache()
+        cache[self.cache_key] = {"access_token": self._token, "usable_until": self._usable_until,
+                                 "refresh_at": self._refresh_at}
+
+        tmp_path = f"{self.cache_path}.tmp"
+        fd = os.open(tmp_path, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600)  # The token is a credential
+        with os.fdopen(fd, "w") as f:
+            json.dump(cache, f)
+        os.replace(tmp_path, self.cache_path)
+
+
+class HaloPSAClient:
+    """HaloPSA API client that owns one keep-alive connection pool and the access token.
+
+    When a rate_limit.RequestScheduler is given, every request goes through its "halopsa" upstream.
+    Tokens come from a TokenProvider persisted at token_cache_path (None keeps them in memory only).
+    """
+
+    def __init__(self, base_url, client_id, client_secret, pool_size=HALO_POOL_SIZE,
+                 connect_timeout=HALO_CONNECT_TIMEOUT, read_timeout=HALO_READ_TIMEOUT, scheduler=None,
+                 token_cache_path=HALO_TOKEN_CACHE_FILE):
+        self.base_url = base_url.rstrip("/")
+        self.token_url = f"{self.base_url}/auth/token"
+        self.client_id = client_id
+        self.client_secret = client_secret
+        self.timeout = (connect_timeout, read_timeout)
+        self.scheduler = scheduler
+        self.pool_size = pool_size
+
+        self.session = requests.Session()
+        self._adapter = HTTPAdapter(pool_connections=1, pool_maxsize=pool_size, pool_block=True)
+        self.session.mount("https://", self._adapter)
+        self.session.mount("http://", self._adapter)
+
+        self.tokens = TokenProvider(self._fetch_token, f"{self.base_url}|{client_id}", cache_path=token_cache_path)
+        self._request_count = 0
+        self._stats_lock = threading.Lock()
+
+    # 🔹 FUNCTION: GET ACCESS TOKEN
+    def get_access_token(self):
+        """Return a valid HaloPSA API token, shared with other threads, processes and scripts."""
+        return self.tokens.get_token()
+
+    def _fetch_token(self):
+        """Request a new token from HaloPSA and return (access_token, expires_in)."""
+        payload = {
+            "grant_type": "client_credentials",
+            "client_id": self.client_id,
+            "client_secret": self.client_secret,
+            "scope": "all"
+        }
+        headers = {"Content-Type": "application/x-www-form-urlencoded"}
+
+        response = self.post(self.token_url, data=payload, headers=headers, idempotent=True)
+
+        if response.status_code == 200:
+            token_data = response.json()
+            print("✅ Retrieved New Access Token")
+            return token_data.get("access_token"), token_data.get("expires_in", 3600)
+        else:
+            print(f"❌ Failed to retrieve access token: {response.text}")
+            raise Exception("Failed to retrieve access token")
+
+    # 🔹 FUNCTION: SEND REQUEST
+    def request(self, method, url, idempotent=None, **kwargs):
+        """Send a request over the pooled session, applying the default timeouts.
+
+        idempotent defaults to True for GET; pass it explicitly for POSTs that are safe to repeat.
+        """
+        kwargs.setdefault("timeout", self.timeout)
+        if idempotent is None:
+            idempotent = method.upper() == "GET"
+
+        def send():
+            with self._stats_lock:
+                self._request_count += 1
+            return self.session.request(method, url, **kwargs)
+
+        if self.scheduler is None:
+            return send()
+        return self.scheduler.call("halopsa", f"{method.upper()} {urlparse(url).path}", send, idempotent=idempotent)
+
+    def mount(self, adapter):
+        """Send every request through adapter instead (e.g. a cassette.CassetteAdapter)."""
+        self._adapter = adapter
+        self.session.mount("https://", adapter)
+        self.session.mount("http://", adapter)
+
+    def get(self, url, **kwargs):
+        return self.request("GET", url, **kwargs)
+
+    def post(self, url, **kwargs):
+        return self.request("POST", url, **kwargs)
+
+    # 🔹 FUNCTION: CONNECTION STATS
+    def connection_stats(self):
+        """Return how many requests were sent and how many needed a new connection."""
+        pools = self._adapter.poolmanager.pools
+        connections = 0
+        for key in pools.keys():
+            pool = pools.get(key)
+            if pool is not None:
+                connections += pool.num_connections
+
+        with self._stats_lock:
+            requests_sent = self._request_count
+
+        return {
+            "requests": requests_sent,
+            "connections_opened": connections,
+            "connections_reused": max(0, requests_sent - connections)
+        }
+
+    def close(self):
+        self.session.close()
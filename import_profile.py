@@ -0,0 +1,73 @@
+import os
+import sys
+import json
+import time
+import argparse
+import subprocess
+
+# ⚙️ Import Profile Settings
+IMPORT_PROFILE_TOP = int(os.getenv("IMPORT_PROFILE_TOP", "12"))  # Packages listed per module
+DEFERRED_MODULES = ("chromadb", "openai", "numpy")  # Loaded by the triage script only when there is work
+
+
+# 🔹 FUNCTION: PARSE IMPORTTIME
+def parse_importtime(output):
+    """Sum `python -X importtime` self times (microseconds) per top-level package."""
+    packages = {}
+    for line in output.splitlines():
+        if not line.startswith("import time:") or "[us]" in line:
+            continue
+        self_us, _, name = line[len("import time:"):].split("|", 2)
+        package = name.strip().split(".", 1)[0]
+        packages[package] = packages.get(package, 0) + int(self_us)
+    return packages
+
+
+# 🔹 FUNCTION: PROFILE IMPORT
+def profile_import(module):
+    """Import module in a fresh interpreter and return its wall time and per-package import cost."""
+    started = time.perf_counter()
+    completed = subprocess.run([sys.executable, "-X", "importtime", "-c", f"import {module}"],
+                               stdout=subprocess.DEVNULL, stderr=subprocess.PIPE, text=True)
+    seconds = time.perf_counter() - started
+    if completed.returncode != 0:
+        raise RuntimeError(f"import {module} failed: {completed.stderr.strip().splitlines()[-1]}")
+    packages = parse_importtime(completed.stderr)
+    return {
+        "module": module,
+        "wall_seconds": round(seconds, 3),  # Includes interpreter start-up
+        "import_seconds": round(sum(packages.values()) / 1e6, 3),
+        "packages": {package: round(us / 1e6, 4) for package, us in sorted(packages.items(), key=lambda item: -item[1])},
+    }
+
+
+def print_profile(profile, top=IMPORT_PROFILE_TOP):
+    print(f"📦 import {profile['module']}: {profile['import_seconds']:.2f}s importing, "
+          f"{profile['wall_seconds']:.2f}s wall including interpreter start-up.")
+    for package, seconds in list(profile["packages"].items())[:top]:
+        print(f"⏱️ {package}: {seconds * 1000:.0f}ms")
+    loaded = [name for name in DEFERRED_MODULES if name in profile["packages"]]
+    if loaded and profile["module"] not in DEFERRED_MODULES:
+        print(f"⚠️ Imported eagerly: {', '.join(loaded)}.")
+
+
+# 🔹 MAIN EXECUTION
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Report where start-up time goes when importing the triage modules.")
+    parser.add_argument("modules", nargs="*", default=["Hectic_AI_Support", *DEFERRED_MODULES],
+                        help="modules to import, each in a fresh interpreter")
+    parser.add_argument("--top", type=int, default=IMPORT_PROFILE_TOP, help="packages listed per module")
+    parser.add_argument("--json", action="store_true", help="print the profiles as JSON instead of a report")
+    args = parser.parse_args()
+
+    profiles = []
+    for module in args.modules:
+        try:
+            profiles.append(profile_import(module))
+        except RuntimeError as e:
+            print(f"❌ {e}", file=sys.stderr)
+            sys.exit(1)
+        if not args.json:
+            print_profile(profiles[-1], args.top)
+    if args.json:
+        print(json.dumps(profiles, indent=2))
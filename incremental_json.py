@@ -0,0 +1,111 @@
+import json
+
+
+class IncrementalJSONParser:
+    """Parse a JSON document that arrives in chunks, reporting each record's fields as soon as they complete.
+
+    A record is the root object, or each object in a root array (the batched prompt's reply).
+    on_field(index, key, value, record) fires as each top-level field of record number index is
+    complete, and on_record(index, record) when the record closes. Anything before the first
+    '{' or '[' (such as a ```json fence) is ignored. Fields whose text is not valid JSON are skipped.
+    """
+
+    def __init__(self, on_field=None, on_record=None):
+        self.on_field = on_field
+        self.on_record = on_record
+        self.text = ""
+        self.records = []
+        self.done = False
+
+        self._pos = 0
+        self._depth = 0
+        self._record_depth = None  # 1 when the root is an object, 2 when it is an array of objects
+        self._in_string = False
+        self._escape = False
+        self._record = None
+        self._phase = None  # "key", "colon", "value" or "next" while inside a record
+        self._key_start = None
+        self._key = None
+        self._value_start = None
+
+    def feed(self, chunk):
+        """Consume the next piece of text."""
+        self.text += chunk
+        text = self.text
+        while self._pos < len(text) and not self.done:
+            self._step(text[self._pos])
+            self._pos += 1
+
+    def _at_record_level(self):
+        return self._record is not None and self._depth == self._record_depth
+
+    def _step(self, char):
+        if self._in_string:
+            if self._escape:
+                self._escape = False
+            elif char == "\\":
+                self._escape = True
+            elif char == '"':
+                self._in_string = False
+                if self._at_record_level() and self._phase == "key":
+                    self._key = json.loads(self.text[self._key_start:self._pos + 1])
+                    self._phase = "colon"
+            return
+
+        if self._record_depth is None and char not in "{[":
+            return  # Preamble before the root value
+
+        if self._at_record_level():
+            if self._phase == "key" and char == '"':
+                self._key_start = self._pos
+            elif self._phase == "colon" and char == ":":
+                self._phase = "value"
+                return
+            elif self._phase == "value" and self._value_start is None and not char.isspace():
+                self._value_start = self._pos
+            if char == ",":
+                self._finish_value()
+                self._phase = "key"
+                return
+            if char == "}":
+                self._finish_value()
+                self._close_record()
+                self._depth -= 1
+                return
+
+        if char == '"':
+            self._in_string = True
+        elif char in "{[":
+            self._depth += 1
+            if self._record_depth is None:
+                self._record_depth = 1 if char == "{" else 2
+            if char == "{" and self._depth == self._record_depth and self._record is None:
+                self._record = {}
+                self._phase = "key"
+        elif char in "}]":
+            self._depth -= 1
+            if self._depth == 0:
+                self.done = True
+
+    def _finish_value(self):
+        if self._value_start is None or self._key is None:
+            self._value_start = None
+            return
+        try:
+            value = json.loads(self.text[self._value_start:self._pos])
+        except ValueError:
+            value = None
+        else:
+            self._record[self._key] = value
+            if self.on_field:
+                self.on_field(len(self.records), self._key, value, self._record)
+        self._key, self._value_start = None, None
+
+    def _close_record(self):
+        record, self._record = self._record, None
+        self._phase = None
+        self.records.append(record)
+        if self.on_record:
+            self.on_record(len(self.records) - 1, record)
+        if self._record_depth == 1:
+            self.done = True
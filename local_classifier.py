@@ -0,0 +1,274 @@
+import os
+import json
+import time
+import argparse
+import threading
+from collections import Counter, defaultdict
+
+# ⚙️ Local Classifier Settings
+LOCAL_CLASSIFIER_ENABLED = os.getenv("LOCAL_CLASSIFIER_ENABLED", "1") == "1"
+LOCAL_CLASSIFIER_NEIGHBOURS = int(os.getenv("LOCAL_CLASSIFIER_NEIGHBOURS", "15"))  # Labelled neighbours that vote
+LOCAL_CLASSIFIER_MIN_SIMILARITY = float(os.getenv("LOCAL_CLASSIFIER_MIN_SIMILARITY", "0.75"))  # Ignore less similar neighbours
+LOCAL_CLASSIFIER_MIN_VOTERS = int(os.getenv("LOCAL_CLASSIFIER_MIN_VOTERS", "5"))  # Escalate when fewer neighbours qualify
+LOCAL_CLASSIFIER_MIN_CONFIDENCE = float(os.getenv("LOCAL_CLASSIFIER_MIN_CONFIDENCE", "0.8"))  # Weighted vote share needed on every field
+LOCAL_CLASSIFIER_SHADOW_RATE = float(os.getenv("LOCAL_CLASSIFIER_SHADOW_RATE", "0.05"))  # Confident tickets still sent to GPT to measure agreement
+
+# Decision fields the classifier predicts, stored on each labelled ticket as "triage_<field>" metadata
+CLASSIFIED_FIELDS = ("ticket_type", "urgency", "impact", "status_id", "assign_to", "requires_human")
+TRAINING_SOURCES = ("ai", "agent")  # Label sources the classifier learns from; its own decisions are never trusted
+TRIAGE_REASONING_CHARS = 500  # Reasoning kept with each label, shown as the past resolution of similar tickets
+
+
+class LocalClassifier:
+    """Fast first-pass triage by weighted k-nearest-neighbour vote over previously triaged tickets.
+
+    Labels live on the tickets' own records in the ChromaDB tickets collection ("triage_*" metadata),
+    so the training set is the embeddings already stored plus every AI (or agent) decision recorded
+    with label(). The labelled embeddings are loaded once into an in-memory matrix and new labels are
+    appended as they arrive, so a prediction is one matrix-vector product on the CPU.
+
+    A ticket is classified locally only if enough similar neighbours agree on every field; otherwise
+    classify() returns None and the caller escalates it to the LLM. A sample of confident tickets is
+    escalated anyway (shadow_rate) so agreement with the LLM stays measured.
+    """
+
+    def __init__(self, collection, neighbours=LOCAL_CLASSIFIER_NEIGHBOURS,
+                 min_similarity=LOCAL_CLASSIFIER_MIN_SIMILARITY, min_voters=LOCAL_CLASSIFIER_MIN_VOTERS,
+                 min_confidence=LOCAL_CLASSIFIER_MIN_CONFIDENCE, shadow_rate=LOCAL_CLASSIFIER_SHADOW_RATE):
+        self.collection = collection
+        self.neighbours = neighbours
+        self.min_similarity = min_similarity
+        self.min_voters = min_voters
+        self.min_confidence = min_confidence
+        self.shadow_rate = shadow_rate
+
+        self._matrix = None  # Unit-length embeddings of labelled tickets, grown by doubling
+        self._size = 0
+        self._ids = []
+        self._labels = []
+        self._row_of = {}  # ticket_id -> row, so relabelling replaces rather than duplicates
+
+        self._lock = threading.Lock()
+        self._stats = {"predictions": 0, "local": 0, "escalated": 0, "shadowed": 0, "seconds": 0.0,
+                       "compared": defaultdict(int), "agreed": defaultdict(lambda: defaultdict(int))}
+        self._shadow_budget = 0.0
+
+    # 🔹 FUNCTION: LOAD LABELS
+    def _load(self):
+        """Load every labelled ticket from ChromaDB into memory once. Caller holds self._lock."""
+        if self._matrix is not None:
+            return
+        import numpy as np  # Imported on first use, so importing this module for its settings stays cheap
+        self._matrix = np.zeros((0, 0), dtype=np.float32)
+        labelled = self.collection.get(where={"triage_source": {"$in": list(TRAINING_SOURCES)}},
+                                       include=["embeddings", "metadatas"])
+        for ticket_id, embedding, metadata in zip(labelled["ids"], labelled["embeddings"], labelled["metadatas"]):
+            labels = {field: metadata[f"triage_{field}"] for field in CLASSIFIED_FIELDS if f"triage_{field}" in metadata}
+            self._add(ticket_id, embedding, labels)
+
+    def _add(self, ticket_id, embedding, labels):
+        """Append (or replace) one labelled embedding. Caller holds self._lock."""
+        import numpy as np
+        vector = np.asarray(embedding, dtype=np.float32)
+        vector = vector / (np.linalg.norm(vector) or 1.0)
+
+        row = self._row_of.get(ticket_id)
+        if row is None:
+            if self._size == len(self._matrix):
+                grown = np.zeros((max(64, 2 * self._size), len(vector)), dtype=np.float32)
+                if self._size:
+                    grown[:self._size] = self._matrix[:self._size]
+                self._matrix = grown  # Readers keep their view of the old array
+            row, self._size = self._size, self._size + 1
+            self._row_of[ticket_id] = row
+            self._ids.append(ticket_id)
+            self._labels.append(labels)
+        else:
+            self._labels[row] = labels
+        self._matrix[row] = vector
+
+    # 🔹 FUNCTION: PREDICT
+    def predict(self, embedding, exclude_id=None):
+        """Vote on every field from the nearest labelled tickets.
+
+        Returns (prediction, confidence, neighbour_ids). confidence is the lowest per-field weighted
+        vote share, or 0.0 when fewer than min_voters similar labelled neighbours exist.
+        """
+        with self._lock:
+            self._load()
+            matrix, size, ids, labels = self._matrix[:self._size], self._size, self._ids, self._labels
+        if size == 0:
+            return None, 0.0, []
+
+        import numpy as np
+        query = np.asarray(embedding, dtype=np.float32)
+        similarities = matrix @ (query / (np.linalg.norm(query) or 1.0))
+        count = min(size, self.neighbours + 1)
+        nearest = np.argpartition(-similarities, count - 1)[:count]
+        nearest = nearest[np.argsort(-similarities[nearest])]
+
+        votes = defaultdict(Counter)
+        voters = []
+        for row in nearest:
+            similarity = float(similarities[row])
+            if ids[row] == str(exclude_id) or similarity < self.min_similarity:
+                continue
+            voters.append(ids[row])
+            for field, label in labels[row].items():
+                votes[field][label] += similarity
+            if len(voters) >= self.neighbours:
+                break
+
+        if len(voters) < self.min_voters or len(votes) < len(CLASSIFIED_FIELDS):
+            return None, 0.0, voters
+
+        prediction, confidence = {}, 1.0
+        for field in CLASSIFIED_FIELDS:
+            label, weight = votes[field].most_common(1)[0]
+            prediction[field] = json.loads(label)
+            confidence = min(confidence, weight / sum(votes[field].values()))
+        return prediction, confidence, voters
+
+    # 🔹 FUNCTION: CLASSIFY
+    def classify(self, ticket_id, embedding):
+        """Return (recommendation, prediction).
+
+        recommendation is a full triage recommendation when the local vote is confident, or None to
+        escalate. prediction is only set for a confident ticket picked for shadowing: pass it to
+        compare() with the LLM's answer so agreement reflects the tickets the classifier would decide.
+        """
+        started = time.perf_counter()
+        try:
+            prediction, confidence, voters = self.predict(embedding, exclude_id=ticket_id)
+        except Exception as e:
+            print(f"⚠️ Local classifier unavailable, escalating Ticket #{ticket_id}: {e}")
+            prediction, confidence, voters = None, 0.0, []
+        elapsed = time.perf_counter() - started
+
+        confident = prediction is not None and confidence >= self.min_confidence
+        with self._lock:
+            self._stats["predictions"] += 1
+            self._stats["seconds"] += elapsed
+            shadow = False
+            if confident and self.shadow_rate:
+                self._shadow_budget += self.shadow_rate
+                shadow = self._shadow_budget >= 1
+                self._shadow_budget -= shadow
+            self._stats["shadowed"] += shadow
+            self._stats["local" if confident and not shadow else "escalated"] += 1
+
+        if not confident:
+            return None, None
+        if shadow:
+            return None, prediction
+
+        recommendation = dict(prediction)
+        recommendation["reasoning"] = (
+            f"Local classifier: {prediction['ticket_type']}, {prediction['urgency']} urgency, {prediction['impact']}, "
+            f"based on {len(voters)} similar past tickets (#{', #'.join(voters[:3])}); confidence {confidence:.2f}.")
+        recommendation["triaged_by"] = "local"
+        return recommendation, prediction
+
+    # 🔹 FUNCTION: COMPARE WITH LLM
+    def compare(self, prediction, recommendation):
+        """Record per-field agreement between a local prediction and the LLM's recommendation."""
+        if not prediction or not recommendation:
+            return
+        with self._lock:
+            for field in CLASSIFIED_FIELDS:
+                if field in recommendation:
+                    self._stats["compared"][field] += 1
+                    agreed = str(prediction[field]).lower() == str(recommendation[field]).lower()
+                    self._stats["agreed"][field][agreed] += 1
+
+    # 🔹 FUNCTION: LABEL
+    def label(self, ticket_id, recommendation, embedding=None, source="ai"):
+        """Store a decision on the ticket's record so later tickets can learn from it.
+
+        Use source="agent" for decisions made or corrected by a human; "local" decisions are stored
+        for reference but never used as training labels. Pass the embedding to start using the label
+        in this process straight away.
+        """
+        self.label_many([(ticket_id, recommendation, embedding, source)])
+
+    def label_many(self, items):
+        """label() for many (ticket_id, recommendation, embedding, source) tuples in one ChromaDB update."""
+        if not items:
+            return
+        ids, metadatas, learned = [], [], []
+        for ticket_id, recommendation, embedding, source in items:
+            labels = {field: json.dumps(recommendation[field]) for field in CLASSIFIED_FIELDS if field in recommendation}
+            metadata = {f"triage_{field}": label for field, label in labels.items()}
+            metadata.update({"triage_source": source, "triaged_at": time.time(),
+                             "triage_reasoning": str(recommendation.get("reasoning", ""))[:TRIAGE_REASONING_CHARS]})
+            ids.append(str(ticket_id))
+            metadatas.append(metadata)
+            if source in TRAINING_SOURCES and embedding is not None:
+                learned.append((str(ticket_id), embedding, labels))
+
+        try:
+            self.collection.update(ids=ids, metadatas=metadatas)
+        except Exception as e:
+            print(f"⚠️ Could not record triage decisions for Ticket(s) {', '.join(ids)}: {e}")
+
+        with self._lock:
+            self._load()
+            for ticket_id, embedding, labels in learned:
+                self._add(ticket_id, embedding, labels)
+
+    # 🔹 FUNCTION: STATS
+    def stats(self):
+        """Report escalation rate, mean local latency and agreement with the LLM per field."""
+        with self._lock:
+            stats = {key: self._stats[key] for key in ("predictions", "local", "escalated", "shadowed", "seconds")}
+            stats["labelled"] = self._size
+            agreement = {field: self._stats["agreed"][field][True] / compared
+                         for field, compared in self._stats["compared"].items() if compared}
+            compared = max(self._stats["compared"].values(), default=0)
+
+        stats["escalation_rate"] = stats["escalated"] / stats["predictions"] if stats["predictions"] else 0.0
+        stats["mean_seconds"] = stats["seconds"] / stats["predictions"] if stats["predictions"] else 0.0
+        stats["agreement"] = agreement
+        stats["compared"] = compared
+        return stats
+
+    # 🔹 FUNCTION: EVALUATE
+    def evaluate(self, limit=1000, thresholds=(0.5, 0.6, 0.7, 0.8, 0.9, 1.0)):
+        """Leave-one-out evaluation over labelled tickets: local rate and accuracy at each confidence threshold."""
+        with self._lock:
+            self._load()
+            rows = list(zip(self._ids, self._matrix[:self._size], self._labels))[:limit]
+
+        outcomes = []
+        for ticket_id, embedding, labels in rows:
+            prediction, confidence, _ = self.predict(embedding, exclude_id=ticket_id)
+            if prediction is None:
+                outcomes.append((0.0, False))
+                continue
+            correct = all(json.loads(labels.get(field, "null")) == prediction[field] for field in CLASSIFIED_FIELDS)
+            outcomes.append((confidence, correct))
+
+        report = []
+        for threshold in thresholds:
+            local = [correct for confidence, correct in outcomes if confidence >= threshold]
+            report.append({"threshold": threshold,
+                           "local_rate": len(local) / len(outcomes) if outcomes else 0.0,
+                           "accuracy": sum(local) / len(local) if local else 0.0})
+        return len(outcomes), report
+
+
+# 🔹 MAIN EXECUTION
+if __name__ == "__main__":
+    import chromadb
+
+    parser = argparse.ArgumentParser(description="Leave-one-out evaluation of the local triage classifier.")
+    parser.add_argument("--chroma-path", default="./chroma_db")
+    parser.add_argument("--limit", type=int, default=1000, help="labelled tickets to evaluate")
+    args = parser.parse_args()
+
+    collection = chromadb.PersistentClient(path=args.chroma_path).get_or_create_collection("tickets")
+    evaluated, report = LocalClassifier(collection).evaluate(args.limit)
+    print(f"🧪 Evaluated {evaluated} labelled tickets")
+    for row in report:
+        print(f"   confidence >= {row['threshold']:.2f}: {row['local_rate']:.0%} triaged locally, "
+              f"{row['accuracy']:.0%} matching the recorded decision")
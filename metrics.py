@@ -0,0 +1,206 @@
+import os
+import json
+import time
+import bisect
+import threading
+import functools
+from contextlib import contextmanager
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+
+# ⚙️ Metrics Settings
+METRICS_PORT = int(os.getenv("METRICS_PORT", "0"))  # Port for the Prometheus endpoint (0 = disabled)
+METRICS_SUMMARY_FILE = os.getenv("METRICS_SUMMARY_FILE", "./triage_metrics.json")  # End-of-run JSON summary
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60)  # Seconds
+
+
+class Histogram:
+    """Cumulative-bucket latency histogram in the Prometheus style."""
+
+    def __init__(self, buckets=LATENCY_BUCKETS):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)  # Last slot is +Inf
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value):
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.sum += value
+        self.count += 1
+
+    def quantile(self, q):
+        """Estimate a quantile by linear interpolation inside the bucket that holds it."""
+        if not self.count:
+            return 0.0
+        rank = q * self.count
+        seen = 0
+        for i, bucket_count in enumerate(self.counts):
+            if seen + bucket_count >= rank and bucket_count:
+                lower = self.buckets[i - 1] if i else 0.0
+                upper = self.buckets[i] if i < len(self.buckets) else self.buckets[-1]
+                return lower + (upper - lower) * (rank - seen) / bucket_count
+            seen += bucket_count
+        return self.buckets[-1]
+
+
+def _label_key(labels):
+    return tuple(sorted(labels.items()))
+
+
+def _format_labels(label_key, extra=()):
+    pairs = list(label_key) + list(extra)
+    if not pairs:
+        return ""
+    return "{" + ",".join(f'{name}="{value}"' for name, value in pairs) + "}"
+
+
+class MetricsRegistry:
+    """Thread-safe counters and latency histograms, exposed as Prometheus text or a JSON summary."""
+
+    def __init__(self):
+        self._counters = {}
+        self._histograms = {}
+        self._lock = threading.Lock()
+        self.started = time.time()
+
+    def inc(self, name, amount=1, **labels):
+        with self._lock:
+            series = self._counters.setdefault(name, {})
+            key = _label_key(labels)
+            series[key] = series.get(key, 0) + amount
+
+    def observe(self, name, value, **labels):
+        with self._lock:
+            series = self._histograms.setdefault(name, {})
+            key = _label_key(labels)
+            if key not in series:
+                series[key] = Histogram()
+            series[key].observe(value)
+
+    @contextmanager
+    def timer(self, stage):
+        """Record the block's latency for a pipeline stage, counting calls and exceptions."""
+        started = time.perf_counter()
+        try:
+            yield
+        except Exception:
+            self.inc("triage_errors_total", stage=stage)
+            raise
+        finally:
+            self.observe("triage_stage_seconds", time.perf_counter() - started, stage=stage)
+            self.inc("triage_calls_total", stage=stage)
+
+    # 🔹 FUNCTION: SNAPSHOT
+    def snapshot(self):
+        """Return the raw counter and histogram state as plain data, e.g. to send to another process."""
+        with self._lock:
+            return {
+                "counters": {name: dict(series) for name, series in self._counters.items()},
+                "histograms": {name: {key: (list(h.counts), h.sum, h.count) for key, h in series.items()}
+                               for name, series in self._histograms.items()},
+            }
+
+    def load(self, snapshots):
+        """Replace this registry's contents with the sum of several snapshots (one per process)."""
+        counters, histograms = {}, {}
+        for snapshot in snapshots:
+            for name, series in snapshot["counters"].items():
+                merged = counters.setdefault(name, {})
+                for key, value in series.items():
+                    merged[key] = merged.get(key, 0) + value
+            for name, series in snapshot["histograms"].items():
+                merged = histograms.setdefault(name, {})
+                for key, (counts, total, count) in series.items():
+                    histogram = merged.setdefault(key, Histogram())
+                    histogram.counts = [a + b for a, b in zip(histogram.counts, counts)]
+                    histogram.sum += total
+                    histogram.count += count
+        with self._lock:
+            self._counters, self._histograms = counters, histograms
+
+    # 🔹 FUNCTION: PROMETHEUS TEXT
+    def prometheus_text(self):
+        """Render every metric in the Prometheus text exposition format."""
+        lines = []
+        with self._lock:
+            for name, series in sorted(self._counters.items()):
+                lines.append(f"# TYPE {name} counter")
+                for key, value in sorted(series.items()):
+                    lines.append(f"{name}{_format_labels(key)} {value}")
+
+            for name, series in sorted(self._histograms.items()):
+                lines.append(f"# TYPE {name} histogram")
+                for key, histogram in sorted(series.items()):
+                    cumulative = 0
+                    for bound, bucket_count in zip(list(histogram.buckets) + ["+Inf"], histogram.counts):
+                        cumulative += bucket_count
+                        lines.append(f"{name}_bucket{_format_labels(key, [('le', bound)])} {cumulative}")
+                    lines.append(f"{name}_sum{_format_labels(key)} {histogram.sum}")
+                    lines.append(f"{name}_count{_format_labels(key)} {histogram.count}")
+        return "\n".join(lines) + "\n"
+
+    # 🔹 FUNCTION: JSON SUMMARY
+    def summary(self):
+        """Return per-stage latency percentiles and every counter as plain JSON-friendly data."""
+        with self._lock:
+            stages = {}
+            for key, histogram in self._histograms.get("triage_stage_seconds", {}).items():
+                stage = dict(key)["stage"]
+                stages[stage] = {
+                    "calls": histogram.count,
+                    "total_seconds": round(histogram.sum, 4),
+                    "mean_seconds": round(histogram.sum / histogram.count, 4) if histogram.count else 0.0,
+                    "p50_seconds": round(histogram.quantile(0.5), 4),
+                    "p95_seconds": round(histogram.quantile(0.95), 4),
+                    "p99_seconds": round(histogram.quantile(0.99), 4),
+                }
+            counters = {name: {",".join(f"{k}={v}" for k, v in key) or "total": value for key, value in series.items()}
+                        for name, series in self._counters.items()}
+
+        return {"wall_seconds": round(time.time() - self.started, 3), "stages": stages, "counters": counters}
+
+    def write_summary(self, path=METRICS_SUMMARY_FILE):
+        with open(path, "w") as f:
+            json.dump(self.summary(), f, indent=2)
+
+    # 🔹 FUNCTION: SERVE
+    def serve(self, port=METRICS_PORT, host="127.0.0.1"):
+        """Expose /metrics (Prometheus) and /summary (JSON) on a background thread."""
+        registry = self
+
+        class MetricsHandler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                if self.path == "/metrics":
+                    body, content_type = registry.prometheus_text().encode(), "text/plain; version=0.0.4"
+                elif self.path == "/summary":
+                    body, content_type = json.dumps(registry.summary()).encode(), "application/json"
+                else:
+                    self.send_error(404)
+                    return
+                self.send_response(200)
+                self.send_header("Content-Type", content_type)
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, *args):
+                pass
+
+        server = ThreadingHTTPServer((host, port), MetricsHandler)
+        threading.Thread(target=server.serve_forever, name="metrics-http", daemon=True).start()
+        print(f"📈 Metrics available at http://{host}:{server.server_port}/metrics")
+        return server
+
+
+# Shared registry for the whole process
+metrics = MetricsRegistry()
+
+
+def timed(stage):
+    """Decorator recording a function's latency, calls and exceptions under the given stage name."""
+    def decorator(func):
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            with metrics.timer(stage):
+                return func(*args, **kwargs)
+        return wrapper
+    return decorator
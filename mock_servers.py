@@ -0,0 +1,436 @@
+import re
+import json
+import time
+import random
+import argparse
+import threading
+import urllib.request
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+from urllib.parse import urlparse, parse_qs
+
+# ⚙️ Mock Server Defaults
+MOCK_HOST = "127.0.0.1"
+MOCK_HALO_PORT = 8765  # HaloPSA stand-in (/auth/token, /api/tickets, /api/actions, /api/status, ...)
+MOCK_OPENAI_PORT = 8766  # OpenAI stand-in (/v1/chat/completions)
+MOCK_TOKEN_LIFETIME = 3600  # Seconds, as returned in expires_in
+MOCK_STREAM_CHUNK_CHARS = 16  # Characters per streamed delta (roughly four tokens)
+
+# Lookup tables served by the HaloPSA stand-in (names match the triage statuses and agent aliases)
+MOCK_STATUSES = [{"id": 1, "name": "New"}, {"id": 2, "name": "In Progress"}, {"id": 9, "name": "Closed"},
+                 {"id": 17, "name": "Awaiting Approval"}, {"id": 21, "name": "On Hold"}, {"id": 29, "name": "Escalated"}]
+MOCK_PRIORITIES = [{"id": "p1", "priorityid": 1, "name": "Critical"}, {"id": "p2", "priorityid": 2, "name": "High"},
+                   {"id": "p3", "priorityid": 3, "name": "Medium"}, {"id": "p4", "priorityid": 4, "name": "Low"}]
+MOCK_SLAS = [{"id": 1, "name": "Standard"}]
+MOCK_AGENTS = [{"id": 1, "name": "Admin"}, {"id": 42, "name": "AI Support Bot"}]
+
+# Keyword -> (urgency, impact, ticket_type, status) used to make stand-in triage decisions look plausible
+MOCK_TRIAGE_RULES = [
+    ("security", ("High", "High impact", "Incident", 29)),
+    ("vpn", ("High", "Moderate", "Incident", 2)),
+    ("install", ("Low", "No impact", "Service Request", 17)),
+    ("printer", ("Medium", "Moderate", "Incident", 2)),
+    ("email", ("Medium", "Moderate", "Incident", 21)),
+]
+MOCK_DEFAULT_DECISION = ("Medium", "Moderate", "Incident", 2)
+
+
+class Faults:
+    """Latency and failure injection for one stand-in server.
+
+    latency is the mean added delay in seconds (uniformly jittered by +/- jitter), error_rate the
+    fraction of requests answered with a 500, and throttle_rate the fraction answered with a 429
+    carrying Retry-After: retry_after.
+    """
+
+    def __init__(self, latency=0.0, jitter=0.0, error_rate=0.0, throttle_rate=0.0, retry_after=0.1):
+        self.latency = latency
+        self.jitter = jitter
+        self.error_rate = error_rate
+        self.throttle_rate = throttle_rate
+        self.retry_after = retry_after
+
+    def delay(self):
+        if self.latency or self.jitter:
+            time.sleep(max(0.0, self.latency + random.uniform(-self.jitter, self.jitter)))
+
+    def injected_status(self):
+        """Return 429 or 500 when a fault should be injected for this request, else None."""
+        roll = random.random()
+        if roll < self.throttle_rate:
+            return 429
+        if roll < self.throttle_rate + self.error_rate:
+            return 500
+        return None
+
+
+class _JSONHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"  # Keep-alive, like the real APIs
+
+    def log_message(self, *args):
+        pass
+
+    def _send(self, code, body, headers=None):
+        data = json.dumps(body).encode()
+        self.send_response(code)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(data)
+
+    def _body(self):
+        length = int(self.headers.get("Content-Length") or 0)
+        return self.rfile.read(length) if length else b""
+
+    def _fault(self, faults, stats):
+        """Apply latency and, if one is injected, send the error response. Returns True if a fault was sent."""
+        faults.delay()
+        status = faults.injected_status()
+        if status is None:
+            return False
+        with stats["lock"]:
+            stats["faults"][str(status)] = stats["faults"].get(str(status), 0) + 1
+        headers = {"Retry-After": str(faults.retry_after)} if status == 429 else None
+        self._send(status, {"error": "injected fault"}, headers)
+        return True
+
+
+# 🔹 HALOPSA STAND-IN
+class MockHaloPSA:
+    """In-memory HaloPSA tenant: tickets, lookup tables, array POSTs and per-ticket timings.
+
+    Records when each ticket is first served by GET /api/tickets and when its status and note are
+    written, so a benchmark can compute end-to-end latency without instrumenting the client.
+    With a webhook_url, each created ticket is also POSTed there (as HaloPSA's ticket-created webhook
+    would) and its clock starts at creation. webhook_drop_rate skips some deliveries, to exercise the
+    receiver's reconciliation poll, and webhook_redeliver_rate sends some twice.
+    """
+
+    def __init__(self, tickets=(), faults=None, webhook_url=None, webhook_secret=None,
+                 webhook_drop_rate=0.0, webhook_redeliver_rate=0.0):
+        self.faults = faults or Faults()
+        self.webhook_url = webhook_url
+        self.webhook_secret = webhook_secret
+        self.webhook_drop_rate = webhook_drop_rate
+        self.webhook_redeliver_rate = webhook_redeliver_rate
+        self.tickets = {ticket["id"]: dict(ticket) for ticket in tickets}
+        self.next_id = max(self.tickets, default=0) + 1
+        self.first_served = {}
+        self.status_written = {}
+        self.note_written = {}
+        self.notes = {}
+        self.stats = {"lock": threading.Lock(), "requests": {}, "faults": {}, "webhooks": {}}
+
+    def add_tickets(self, tickets):
+        """Create tickets (HaloPSA array-create semantics) and return the created records."""
+        created = []
+        with self.stats["lock"]:
+            for ticket in tickets:
+                record = dict(ticket)
+                record.setdefault("status_id", 1)
+                record.setdefault("dateoccurred", time.strftime("%Y-%m-%dT%H:%M:%S", time.gmtime()))
+                record.setdefault("last_update", record["dateoccurred"])
+                record["id"] = self.next_id
+                self.next_id += 1
+                self.tickets[record["id"]] = record
+                created.append(record)
+                if self.webhook_url:
+                    self.first_served[record["id"]] = time.time()
+        if self.webhook_url and created:
+            threading.Thread(target=self.send_webhooks, args=([dict(record) for record in created],),
+                             daemon=True).start()
+        return created
+
+    # 🔹 FUNCTION: SEND WEBHOOKS
+    def send_webhooks(self, tickets):
+        """Deliver one ticket-created event per ticket, dropping or redelivering a configured fraction."""
+        for ticket in tickets:
+            roll = random.random()
+            if roll < self.webhook_drop_rate:
+                outcome, deliveries = "dropped", 0
+            else:
+                outcome, deliveries = "delivered", 2 if roll < self.webhook_drop_rate + self.webhook_redeliver_rate else 1
+            body = json.dumps({"event": "ticket_created", "ticket": ticket}).encode()
+            for _ in range(deliveries):
+                request = urllib.request.Request(self.webhook_url, data=body, headers={
+                    "Content-Type": "application/json", "X-Webhook-Secret": self.webhook_secret or ""})
+                try:
+                    urllib.request.urlopen(request, timeout=10).close()
+                except OSError:
+                    outcome = "failed"
+            with self.stats["lock"]:
+                self.stats["webhooks"][outcome] = self.stats["webhooks"].get(outcome, 0) + 1
+
+    # 🔹 FUNCTION: LIST TICKETS
+    def list_tickets(self, params):
+        with self.stats["lock"]:
+            tickets = list(self.tickets.values())
+        if "status_id" in params:
+            tickets = [t for t in tickets if t.get("status_id") == int(params["status_id"])]
+        if params.get("startdate"):
+            tickets = [t for t in tickets if t.get("dateoccurred", "") >= params["startdate"]]
+
+        page = tickets
+        if params.get("pageinate") == "true":
+            page_size, page_no = int(params.get("page_size", 50)), int(params.get("page_no", 1))
+            page = tickets[(page_no - 1) * page_size:page_no * page_size]
+
+        now = time.time()
+        with self.stats["lock"]:
+            for ticket in page:
+                self.first_served.setdefault(ticket["id"], now)
+        return {"record_count": len(tickets), "tickets": page}
+
+    # 🔹 FUNCTION: WRITE TICKETS
+    def write_tickets(self, items):
+        """Apply status updates (items with an id) and create new tickets (items without one)."""
+        updates = [item for item in items if item.get("id")]
+        results = self.add_tickets([item for item in items if not item.get("id")])
+        now = time.time()
+        with self.stats["lock"]:
+            for item in updates:
+                ticket = self.tickets.get(item["id"])
+                if ticket is None:
+                    continue
+                ticket.update(item)
+                ticket["last_update"] = time.strftime("%Y-%m-%dT%H:%M:%S", time.gmtime(now))
+                self.status_written.setdefault(item["id"], now)
+                results.append({"id": item["id"], "status_id": ticket.get("status_id")})
+        return results
+
+    def write_actions(self, items):
+        now = time.time()
+        results = []
+        with self.stats["lock"]:
+            for item in items:
+                ticket_id = item.get("ticket_id")
+                if ticket_id not in self.tickets:
+                    continue
+                self.notes.setdefault(ticket_id, []).append(item.get("note", ""))
+                self.note_written.setdefault(ticket_id, now)
+                results.append({"ticket_id": ticket_id, "id": len(self.notes[ticket_id])})
+        return results
+
+    # 🔹 FUNCTION: TIMINGS
+    def timings(self):
+        """Return per-ticket seconds from first fetch to status write and to note write."""
+        with self.stats["lock"]:
+            to_status = [self.status_written[i] - self.first_served[i]
+                         for i in self.status_written if i in self.first_served]
+            to_note = [self.note_written[i] - self.first_served[i]
+                       for i in self.note_written if i in self.first_served]
+            return {
+                "tickets": len(self.tickets),
+                "served": len(self.first_served),
+                "status_written": len(self.status_written),
+                "note_written": len(self.note_written),
+                "first_served_at": min(self.first_served.values(), default=None),
+                "last_note_at": max(self.note_written.values(), default=None),
+                "seconds_to_status": to_status,
+                "seconds_to_note": to_note,
+                "requests": dict(self.stats["requests"]),
+                "faults": dict(self.stats["faults"]),
+                "webhooks": dict(self.stats["webhooks"]),
+            }
+
+    def handler(self):
+        tenant = self
+
+        class HaloHandler(_JSONHandler):
+            def _count(self, method, path):
+                with tenant.stats["lock"]:
+                    key = f"{method} {path}"
+                    tenant.stats["requests"][key] = tenant.stats["requests"].get(key, 0) + 1
+
+            def do_GET(self):
+                url = urlparse(self.path)
+                params = {name: values[0] for name, values in parse_qs(url.query).items()}
+                if url.path == "/_mock/stats":
+                    return self._send(200, tenant.timings())
+
+                self._count("GET", url.path)
+                if self._fault(tenant.faults, tenant.stats):
+                    return
+                if url.path == "/api/tickets":
+                    return self._send(200, tenant.list_tickets(params))
+                if url.path.startswith("/api/tickets/"):
+                    ticket = tenant.tickets.get(int(url.path.rsplit("/", 1)[1]))
+                    return self._send(200, ticket) if ticket else self._send(404, {"error": "not found"})
+                tables = {"/api/status": MOCK_STATUSES, "/api/priority": MOCK_PRIORITIES,
+                          "/api/sla": MOCK_SLAS, "/api/agent": MOCK_AGENTS}
+                if url.path in tables:
+                    return self._send(200, tables[url.path], {"ETag": f'"{url.path}-v1"'})
+                self._send(404, {"error": "not found"})
+
+            def do_POST(self):
+                path = urlparse(self.path).path
+                body = self._body()
+                self._count("POST", path)
+                if path == "/auth/token":
+                    return self._send(200, {"access_token": f"mock-{time.time_ns()}", "token_type": "Bearer",
+                                            "expires_in": MOCK_TOKEN_LIFETIME})
+                if self._fault(tenant.faults, tenant.stats):
+                    return
+
+                items = json.loads(body or b"[]")
+                items = items if isinstance(items, list) else [items]
+                if path == "/api/tickets":
+                    results = tenant.write_tickets(items)
+                elif path == "/api/actions":
+                    results = tenant.write_actions(items)
+                else:
+                    return self._send(404, {"error": "not found"})
+                self._send(201, results if len(items) != 1 else (results[0] if results else {}))
+
+        return HaloHandler
+
+
+# 🔹 OPENAI STAND-IN
+def mock_decision(text):
+    """Pick a deterministic triage decision from keywords in the ticket text."""
+    lowered = text.lower()
+    urgency, impact, ticket_type, status_id = next(
+        (decision for keyword, decision in MOCK_TRIAGE_RULES if keyword in lowered), MOCK_DEFAULT_DECISION)
+    reasoning = (f"Mock triage: classified as {ticket_type} with {urgency.lower()} urgency and {impact.lower()} "
+                 f"based on the ticket text. ") * 4  # Long enough that the reasoning dominates generation time
+    return {"status_id": status_id, "urgency": urgency, "requires_human": urgency == "High", "impact": impact,
+            "ticket_type": ticket_type, "assign_to": "AI bot", "reasoning": reasoning.strip()}
+
+
+class MockOpenAI:
+    """Chat completions stand-in that answers single and batched triage prompts with plausible JSON.
+
+    seconds_per_token simulates generation time: a plain request waits for the whole completion,
+    a stream=True request receives it as server-sent events paced at that rate.
+    """
+
+    def __init__(self, faults=None, seconds_per_token=0.0):
+        self.faults = faults or Faults()
+        self.seconds_per_token = seconds_per_token
+        self.stats = {"lock": threading.Lock(), "requests": {}, "faults": {}, "tickets": 0}
+
+    def complete(self, request):
+        prompt = request["messages"][-1]["content"]
+        batch = re.findall(r"Ticket ID: (\d+)\n(.*?)(?=\n---|\n\s*Provide the output|\Z)", prompt, re.S)
+
+        if batch:
+            content = json.dumps([{"ticket_id": int(ticket_id), **mock_decision(text)} for ticket_id, text in batch])
+        else:
+            ticket_text = prompt.split("Ticket Summary:", 1)[-1]
+            content = json.dumps(mock_decision(ticket_text))
+
+        with self.stats["lock"]:
+            self.stats["tickets"] += max(1, len(batch))
+        prompt_tokens = len(prompt) // 4
+        completion_tokens = len(content) // 4
+        return {
+            "id": f"chatcmpl-mock-{time.time_ns()}", "object": "chat.completion", "created": int(time.time()),
+            "model": request.get("model", "gpt-4"),
+            "choices": [{"index": 0, "finish_reason": "stop", "message": {"role": "assistant", "content": content}}],
+            "usage": {"prompt_tokens": prompt_tokens, "completion_tokens": completion_tokens,
+                      "total_tokens": prompt_tokens + completion_tokens},
+        }
+
+    def handler(self):
+        model = self
+
+        class OpenAIHandler(_JSONHandler):
+            def do_GET(self):
+                if urlparse(self.path).path == "/_mock/stats":
+                    with model.stats["lock"]:
+                        return self._send(200, {key: value for key, value in model.stats.items() if key != "lock"})
+                self._send(404, {"error": "not found"})
+
+            def do_POST(self):
+                path = urlparse(self.path).path
+                request = json.loads(self._body() or b"{}")
+                with model.stats["lock"]:
+                    model.stats["requests"][path] = model.stats["requests"].get(path, 0) + 1
+                if self._fault(model.faults, model.stats):
+                    return
+                if not path.endswith("/chat/completions"):
+                    return self._send(404, {"error": "not found"})
+
+                completion = model.complete(request)
+                if not request.get("stream"):
+                    time.sleep(completion["usage"]["completion_tokens"] * model.seconds_per_token)
+                    return self._send(200, completion)
+                self._stream(completion, request.get("stream_options", {}).get("include_usage"))
+
+            def _stream(self, completion, include_usage):
+                """Send the completion as chat.completion.chunk server-sent events."""
+                self.send_response(200)
+                self.send_header("Content-Type", "text/event-stream")
+                self.send_header("Connection", "close")
+                self.end_headers()
+                self.close_connection = True
+
+                content = completion["choices"][0]["message"]["content"]
+                base = {key: completion[key] for key in ("id", "created", "model")}
+                base["object"] = "chat.completion.chunk"
+                for start in range(0, len(content), MOCK_STREAM_CHUNK_CHARS):
+                    time.sleep(MOCK_STREAM_CHUNK_CHARS / 4 * model.seconds_per_token)
+                    delta = {"content": content[start:start + MOCK_STREAM_CHUNK_CHARS]}
+                    self._event(dict(base, choices=[{"index": 0, "delta": delta, "finish_reason": None}]))
+                self._event(dict(base, choices=[{"index": 0, "delta": {}, "finish_reason": "stop"}]))
+                if include_usage:
+                    self._event(dict(base, choices=[], usage=completion["usage"]))
+                self.wfile.write(b"data: [DONE]\n\n")
+                self.wfile.flush()
+
+            def _event(self, body):
+                self.wfile.write(f"data: {json.dumps(body)}\n\n".encode())
+                self.wfile.flush()
+
+        return OpenAIHandler
+
+
+# 🔹 FUNCTION: SERVE
+def serve(handler, port, host=MOCK_HOST):
+    """Start a threaded HTTP server for handler on a background thread and return it (port 0 picks a free one)."""
+    server = ThreadingHTTPServer((host, port), handler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, name=f"mock-{server.server_port}", daemon=True).start()
+    return server
+
+
+def add_fault_arguments(parser, prefix):
+    parser.add_argument(f"--{prefix}-latency", type=float, default=0.0, help="mean added latency in seconds")
+    parser.add_argument(f"--{prefix}-jitter", type=float, default=0.0, help="+/- latency jitter in seconds")
+    parser.add_argument(f"--{prefix}-error-rate", type=float, default=0.0, help="fraction of requests answered 500")
+    parser.add_argument(f"--{prefix}-throttle-rate", type=float, default=0.0, help="fraction of requests answered 429")
+
+
+def faults_from_args(args, prefix):
+    prefix = prefix.replace("-", "_")
+    return Faults(latency=getattr(args, f"{prefix}_latency"), jitter=getattr(args, f"{prefix}_jitter"),
+                  error_rate=getattr(args, f"{prefix}_error_rate"), throttle_rate=getattr(args, f"{prefix}_throttle_rate"))
+
+
+# 🔹 MAIN EXECUTION
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Local stand-ins for the HaloPSA and OpenAI APIs.")
+    parser.add_argument("--halo-port", type=int, default=MOCK_HALO_PORT)
+    parser.add_argument("--openai-port", type=int, default=MOCK_OPENAI_PORT)
+    add_fault_arguments(parser, "halo")
+    add_fault_arguments(parser, "llm")
+    parser.add_argument("--llm-seconds-per-token", type=float, default=0.0, help="simulated generation time per token")
+    parser.add_argument("--webhook-url", help="POST a ticket-created event here for every ticket created")
+    parser.add_argument("--webhook-secret", help="shared secret sent with each webhook delivery")
+    parser.add_argument("--webhook-drop-rate", type=float, default=0.0, help="fraction of webhook events never delivered")
+    parser.add_argument("--webhook-redeliver-rate", type=float, default=0.0, help="fraction of webhook events delivered twice")
+    args = parser.parse_args()
+
+    tenant = MockHaloPSA(faults=faults_from_args(args, "halo"), webhook_url=args.webhook_url,
+                         webhook_secret=args.webhook_secret, webhook_drop_rate=args.webhook_drop_rate,
+                         webhook_redeliver_rate=args.webhook_redeliver_rate)
+    halo_server = serve(tenant.handler(), args.halo_port)
+    openai_server = serve(MockOpenAI(faults_from_args(args, "llm"), args.llm_seconds_per_token).handler(),
+                          args.openai_port)
+    print(f"🧪 Mock HaloPSA at http://{MOCK_HOST}:{halo_server.server_port}")
+    print(f"🧪 Mock OpenAI at http://{MOCK_HOST}:{openai_server.server_port}/v1")
+    try:
+        threading.Event().wait()
+    except KeyboardInterrupt:
+        pass
@@ -0,0 +1,240 @@
+import os
+import re
+import math
+import threading
+from html.parser import HTMLParser
+
+try:
+    import tiktoken
+except ImportError:  # Fall back to a character estimate
+    tiktoken = None
+
+# ⚙️ Prompt Budget Settings
+PROMPT_TICKET_TOKENS = int(os.getenv("PROMPT_TICKET_TOKENS", "1200"))  # Max tokens of summary + details per ticket
+PROMPT_SUMMARY_TOKENS = int(os.getenv("PROMPT_SUMMARY_TOKENS", "150"))  # Max tokens of the summary alone
+PROMPT_TOKENIZER_MODEL = os.getenv("PROMPT_TOKENIZER_MODEL", "gpt-4")
+CHARS_PER_TOKEN = 4  # Estimate used when tiktoken (or its encoding file) is unavailable
+TRUNCATION_MARK = " [...]"
+
+# Paragraph-level clutter that adds tokens but never helps triage
+HTML_TAG = re.compile(r"<[a-zA-Z/!][^>]*>")
+REPLY_HEADER = re.compile(r"^\s*(On .{5,200} wrote:|-{2,}\s*(Original|Forwarded) Message\s*-{2,}|From: .+)\s*$", re.I)
+SIGN_OFF = re.compile(r"^\s*((kind|best|warm|many)\s+)?(regards|thanks|thank you|cheers|sincerely)[,.!]?\s*$", re.I)
+MOBILE_FOOTER = re.compile(r"^\s*sent from my \w+", re.I)
+DISCLAIMER = re.compile(r"^\s*(this (e-?mail|message) (and any|is confidential|contains)|confidential(ity)? notice|disclaimer)", re.I)
+MAX_SIGNATURE_LINES = 8  # Most lines after a sign-off that can still be its signature block
+SIGNATURE_LINE_CHARS = 60  # Longer lines after a sign-off are message text, not a name/phone/footer line
+
+# Words that mark a paragraph as describing the actual problem
+RELEVANT_WORDS = re.compile(r"\b(error|fail\w*|cannot|can't|unable|not working|down|urgent|broken|crash\w*|"
+                            r"warning|denied|blocked|slow|outage|code|since|all users|affect\w*)\b", re.I)
+
+_encoding = None
+_encoding_lock = threading.Lock()
+
+
+def _get_encoding():
+    """Load the tokenizer once; None if tiktoken or its encoding file is not available offline."""
+    global _encoding
+    with _encoding_lock:
+        if _encoding is None:
+            _encoding = False
+            if tiktoken is not None:
+                try:
+                    _encoding = tiktoken.encoding_for_model(PROMPT_TOKENIZER_MODEL)
+                except Exception as e:
+                    print(f"⚠️ tiktoken encoding unavailable, estimating tokens from characters: {e}")
+        return _encoding or None
+
+
+# 🔹 FUNCTION: COUNT TOKENS
+def count_tokens(text):
+    """Count tokens with the model's tokenizer, or estimate them when it is unavailable."""
+    encoding = _get_encoding()
+    if encoding is not None:
+        return len(encoding.encode(text, disallowed_special=()))  # Ticket text is data, not control tokens
+    return math.ceil(len(text) / CHARS_PER_TOKEN)
+
+
+def truncate_to_tokens(text, max_tokens):
+    """Cut text to at most max_tokens tokens (including the truncation mark)."""
+    if count_tokens(text) <= max_tokens:
+        return text, False
+    keep = max(0, max_tokens - count_tokens(TRUNCATION_MARK))
+    encoding = _get_encoding()
+    if encoding is not None:
+        return encoding.decode(encoding.encode(text, disallowed_special=())[:keep]).rstrip() + TRUNCATION_MARK, True
+    return text[:keep * CHARS_PER_TOKEN].rstrip() + TRUNCATION_MARK, True
+
+
+class _TextExtractor(HTMLParser):
+    """Collect visible text from an HTML fragment, turning block elements into line breaks."""
+
+    BLOCK_TAGS = {"p", "div", "br", "li", "tr", "table", "h1", "h2", "h3", "h4", "h5", "h6", "blockquote", "hr"}
+    SKIP_TAGS = {"script", "style", "head", "title"}
+
+    def __init__(self):
+        super().__init__(convert_charrefs=True)
+        self.parts = []
+        self._skipping = 0
+
+    def handle_starttag(self, tag, attrs):
+        if tag in self.SKIP_TAGS:
+            self._skipping += 1
+        elif tag in self.BLOCK_TAGS:
+            self.parts.append("\n\n" if tag in ("p", "div", "table", "blockquote") else "\n")
+
+    def handle_endtag(self, tag):
+        if tag in self.SKIP_TAGS:
+            self._skipping = max(0, self._skipping - 1)
+        elif tag in self.BLOCK_TAGS:
+            self.parts.append("\n")
+
+    def handle_data(self, data):
+        if not self._skipping:
+            self.parts.append(data)
+
+
+# 🔹 FUNCTION: STRIP HTML
+def strip_html(text):
+    """Return the visible text of HTML (unchanged if text contains no tags)."""
+    if not HTML_TAG.search(text):
+        return text
+    extractor = _TextExtractor()
+    extractor.feed(text)
+    extractor.close()
+    return "".join(extractor.parts)
+
+
+def signature_length(lines):
+    """Number of lines (up to the end or a reply header) that form the signature after a sign-off, or 0.
+
+    They are a signature only if there are at most MAX_SIGNATURE_LINES of them and each looks like
+    a name, phone or footer line: short, and not describing the problem. Otherwise the sign-off
+    sits in the middle of the message ("Thanks!" followed by an update) and the text is kept.
+    """
+    block = 0
+    for end, line in enumerate(lines):
+        if REPLY_HEADER.match(line):
+            return end
+        if line:
+            block += 1
+            if block > MAX_SIGNATURE_LINES or len(line) > SIGNATURE_LINE_CHARS or RELEVANT_WORDS.search(line):
+                return 0
+    return len(lines)
+
+
+# 🔹 FUNCTION: SPLIT PARAGRAPHS
+def clean_paragraphs(text, stats):
+    """Split plain text into (paragraph, in_reply_thread) pairs without quotes, signatures or repeats.
+
+    Paragraphs after the first reply header belong to the older, quoted thread. Counts of removed
+    lines and paragraphs are added to stats.
+    """
+    paragraphs, current = [], []
+    in_thread = False
+    signature_left = 0
+
+    def close_paragraph():
+        if current:
+            paragraphs.append((" ".join(current), in_thread))
+            current.clear()
+
+    lines = [" ".join(line.split()) for line in text.replace("\r\n", "\n").split("\n")]
+    for index, stripped in enumerate(lines):
+        if signature_left:
+            signature_left -= 1
+            stats["signature_lines"] += bool(stripped)
+            continue
+        if stripped.startswith(">"):
+            stats["quoted_lines"] += 1
+            continue
+        if REPLY_HEADER.match(stripped):
+            close_paragraph()
+            in_thread = True
+            stats["quoted_lines"] += 1
+            continue
+        if stripped == "--" or SIGN_OFF.match(stripped) or MOBILE_FOOTER.match(stripped):
+            close_paragraph()
+            signature_left = signature_length(lines[index + 1:])
+            stats["signature_lines"] += 1
+            continue
+        if not stripped:
+            close_paragraph()
+            continue
+        current.append(stripped)
+    close_paragraph()
+
+    seen, unique = set(), []
+    for paragraph, thread in paragraphs:
+        key = re.sub(r"\W+", " ", paragraph).strip().lower()
+        if DISCLAIMER.match(paragraph) or (thread and paragraph.startswith(("To:", "Cc:", "Sent:", "Subject:", "Date:"))):
+            stats["signature_lines"] += 1
+            continue
+        if key in seen:
+            stats["duplicate_paragraphs"] += 1
+            continue
+        seen.add(key)
+        unique.append((paragraph, thread))
+    return unique
+
+
+def relevance(index, paragraph, in_thread):
+    """Higher for the opening paragraph, the newest message and paragraphs describing the problem."""
+    score = 10 if index == 0 else 0
+    score += 0 if in_thread else 3
+    score += len(RELEVANT_WORDS.findall(paragraph))
+    return score
+
+
+# 🔹 FUNCTION: PACK TICKET
+def pack_ticket(summary, details, budget=PROMPT_TICKET_TOKENS, summary_budget=PROMPT_SUMMARY_TOKENS):
+    """Clean a ticket's text and pack it into a token budget, most relevant paragraphs first.
+
+    Returns {"summary", "details", "tokens", "stats"}. Paragraphs that do not fit are dropped whole;
+    only the opening paragraph is ever cut mid-way. The kept paragraphs stay in their original order.
+    """
+    summary, details = summary or "", details or ""
+    stats = {"original_tokens": count_tokens(summary) + count_tokens(details), "html": False, "quoted_lines": 0,
+             "signature_lines": 0, "duplicate_paragraphs": 0, "dropped_paragraphs": 0, "truncated": False}
+
+    plain = strip_html(details)
+    stats["html"] = plain is not details
+    summary, summary_cut = truncate_to_tokens(" ".join(strip_html(summary).split()), summary_budget)
+    remaining = budget - count_tokens(summary)
+
+    paragraphs = clean_paragraphs(plain, stats)
+    ranked = sorted(range(len(paragraphs)), key=lambda i: -relevance(i, *paragraphs[i]))
+    kept = {}
+    for i in ranked:
+        text = paragraphs[i][0]
+        tokens = count_tokens(text) + 1  # Paragraph separator
+        if tokens <= remaining:
+            kept[i] = text
+            remaining -= tokens
+        elif i == 0 and remaining > 20:
+            kept[i], _ = truncate_to_tokens(text, remaining - 1)
+            remaining -= count_tokens(kept[i]) + 1
+            stats["truncated"] = True
+        else:
+            stats["dropped_paragraphs"] += 1
+
+    details = "\n".join(kept[i] for i in sorted(kept))
+    stats["truncated"] = stats["truncated"] or summary_cut or bool(stats["dropped_paragraphs"])
+    tokens = count_tokens(summary) + count_tokens(details)
+    stats["tokens"] = tokens
+    return {"summary": summary, "details": details, "tokens": tokens, "stats": stats}
+
+
+def describe(stats):
+    """One-line summary of what packing removed, for the per-ticket log."""
+    removed = [f"{stats[key]} {label}" for key, label in (("quoted_lines", "quoted line(s)"),
+                                                          ("signature_lines", "signature/footer line(s)"),
+                                                          ("duplicate_paragraphs", "repeated paragraph(s)"),
+                                                          ("dropped_paragraphs", "paragraph(s) over budget"))
+               if stats[key]]
+    if stats["html"]:
+        removed.insert(0, "HTML markup")
+    if stats["truncated"] and not stats["dropped_paragraphs"]:
+        removed.append("text over budget")
+    return f"{stats['original_tokens']} -> {stats['tokens']} tokens" + (f" (removed {', '.join(removed)})" if removed else "")
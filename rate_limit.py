@@ -0,0 +1,185 @@
+import os
+import time
+import random
+import threading
+import multiprocessing
+from email.utils import parsedate_to_datetime
+
+# ⚙️ Retry Settings
+MAX_RETRIES = int(os.getenv("MAX_RETRIES", "5"))  # Retries per call after the first attempt
+RETRY_BASE_DELAY = float(os.getenv("RETRY_BASE_DELAY", "0.5"))  # Seconds before the first retry
+RETRY_MAX_DELAY = float(os.getenv("RETRY_MAX_DELAY", "60"))  # Cap on any single back-off
+RETRYABLE_STATUS_CODES = {429, 500, 502, 503, 504}
+
+
+class TokenBucket:
+    """Thread-safe token bucket that can also be paused when an upstream asks us to back off."""
+
+    def __init__(self, rate, capacity):
+        self.rate = rate
+        self.capacity = capacity
+        self._tokens = capacity
+        self._updated = time.monotonic()
+        self._paused_until = 0.0
+        self._lock = threading.Lock()
+
+    def acquire(self):
+        """Take one token, sleeping as long as needed. Returns the seconds spent waiting."""
+        with self._lock:
+            now = time.monotonic()
+            self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+            self._updated = now
+            self._tokens -= 1  # Reserve now; a negative balance queues callers behind each other
+            wait = max(-self._tokens / self.rate if self._tokens < 0 else 0.0, self._paused_until - now)
+
+        if wait > 0:
+            time.sleep(wait)
+        return wait
+
+    def pause(self, seconds):
+        """Hold every caller of this bucket for at least the given number of seconds."""
+        with self._lock:
+            self._paused_until = max(self._paused_until, time.monotonic() + seconds)
+
+
+class SharedTokenBucket:
+    """TokenBucket whose balance lives in shared memory, so several worker processes draw on one budget.
+
+    Create it in the parent process and hand it to the workers when they are started.
+    """
+
+    def __init__(self, rate, capacity, context=multiprocessing):
+        self.rate = rate
+        self.capacity = capacity
+        self._state = context.Array("d", [capacity, time.monotonic(), 0.0])  # tokens, updated, paused_until
+
+    def acquire(self):
+        """Take one token, sleeping as long as needed. Returns the seconds spent waiting."""
+        with self._state.get_lock():
+            tokens, updated, paused_until = self._state[:]
+            now = time.monotonic()
+            tokens = min(self.capacity, tokens + (now - updated) * self.rate) - 1
+            self._state[0], self._state[1] = tokens, now
+            wait = max(-tokens / self.rate if tokens < 0 else 0.0, paused_until - now)
+
+        if wait > 0:
+            time.sleep(wait)
+        return wait
+
+    def pause(self, seconds):
+        """Hold every caller in every process for at least the given number of seconds."""
+        with self._state.get_lock():
+            self._state[2] = max(self._state[2], time.monotonic() + seconds)
+
+
+# 🔹 FUNCTION: PARSE RETRY-AFTER
+def parse_retry_after(value):
+    """Convert a Retry-After header (seconds or HTTP date) to seconds, or None if absent/invalid."""
+    if not value:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        return max(0.0, parsedate_to_datetime(value).timestamp() - time.time())
+    except (TypeError, ValueError):
+        return None
+
+
+class RequestScheduler:
+    """Shared scheduler that rate-limits, retries and counts calls to each upstream API.
+
+    Each upstream gets its own token bucket. Responses with a retryable status (or exceptions
+    carrying one, like the OpenAI SDK's) are retried with exponential back-off and full jitter,
+    honoring Retry-After. A 429 pauses the whole upstream, not just the caller that saw it.
+    Non-idempotent calls are only retried on 429, where the upstream rejected the request unprocessed.
+    """
+
+    def __init__(self, max_retries=MAX_RETRIES, base_delay=RETRY_BASE_DELAY, max_delay=RETRY_MAX_DELAY):
+        self.max_retries = max_retries
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self._upstreams = {}
+        self._stats = {}
+        self._lock = threading.Lock()
+
+    def add_upstream(self, name, rate, burst, transient_exceptions=()):
+        """Register an upstream with its request rate (per second), burst size and retryable exceptions."""
+        self._upstreams[name] = (TokenBucket(rate, burst), tuple(transient_exceptions))
+
+    def add_transient_exceptions(self, name, exceptions):
+        """Also retry these exceptions for an upstream, for SDKs that are only imported on first use."""
+        bucket, transient_exceptions = self._upstreams[name]
+        added = tuple(exception for exception in exceptions if exception not in transient_exceptions)
+        self._upstreams[name] = (bucket, transient_exceptions + added)
+
+    def use_bucket(self, name, bucket):
+        """Rate-limit an upstream with the given bucket instead, e.g. a SharedTokenBucket."""
+        self._upstreams[name] = (bucket, self._upstreams[name][1])
+
+    def _count(self, upstream, endpoint, key, amount=1):
+        with self._lock:
+            stats = self._stats.setdefault(f"{upstream} {endpoint}", {
+                "requests": 0, "throttled": 0, "retries": 0, "failures": 0, "wait_seconds": 0.0})
+            stats[key] += amount
+
+    def _backoff(self, attempt, retry_after):
+        if retry_after is not None:
+            return min(retry_after, self.max_delay)
+        return random.uniform(0, min(self.max_delay, self.base_delay * 2 ** attempt))
+
+    # 🔹 FUNCTION: CALL
+    def call(self, upstream, endpoint, send, idempotent=True):
+        """Run send() under the upstream's rate limit, retrying transient failures.
+
+        send() returns a response with status_code/headers, or raises. The final response is
+        returned (even if it is an error) and the final exception is re-raised, so callers keep
+        their existing error handling.
+        """
+        bucket, transient_exceptions = self._upstreams[upstream]
+        attempt = 0
+
+        while True:
+            self._count(upstream, endpoint, "wait_seconds", bucket.acquire())
+            self._count(upstream, endpoint, "requests")
+
+            error = None
+            try:
+                response = send()
+            except Exception as e:
+                error = e
+                response = getattr(e, "response", None)
+                if not isinstance(e, transient_exceptions) and getattr(response, "status_code", None) is None:
+                    raise
+
+            status = getattr(response, "status_code", None)
+            throttled = status == 429
+            if throttled:
+                self._count(upstream, endpoint, "throttled")
+
+            retryable = throttled or (idempotent and (status in RETRYABLE_STATUS_CODES or
+                                                       (status is None and error is not None)))
+            if not retryable or attempt >= self.max_retries:
+                if retryable or error is not None or (status is not None and status >= 400):
+                    self._count(upstream, endpoint, "failures")
+                if error is not None:
+                    raise error
+                return response
+
+            headers = getattr(response, "headers", None) or {}
+            delay = self._backoff(attempt, parse_retry_after(headers.get("Retry-After")))
+            if throttled:
+                bucket.pause(delay)
+
+            print(f"⏳ {upstream} {endpoint} returned {status or type(error).__name__}. "
+                  f"Retrying in {delay:.1f}s (attempt {attempt + 1}/{self.max_retries}).")
+            self._count(upstream, endpoint, "retries")
+            time.sleep(delay)
+            attempt += 1
+
+    # 🔹 FUNCTION: STATS
+    def stats(self):
+        """Return per-endpoint request, throttle, retry and failure counts."""
+        with self._lock:
+            return {endpoint: dict(counts) for endpoint, counts in self._stats.items()}
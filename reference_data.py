@@ -0,0 +1,137 @@
+import os
+import json
+import time
+import threading
+
+# ⚙️ Reference Data Settings
+REFERENCE_DATA_FILE = os.getenv("REFERENCE_DATA_FILE", "./halo_reference_data.json")  # Local copy of the lookup tables
+REFERENCE_DATA_TTL = float(os.getenv("REFERENCE_DATA_TTL", "86400"))  # Seconds before a table is revalidated
+REFERENCE_RETRY_SECONDS = 300  # After a failed refresh, wait this long before trying again
+
+# Table name -> (API path, field holding the numeric id)
+REFERENCE_TABLES = {
+    "statuses": ("/api/status?type=ticket", "id"),
+    "priorities": ("/api/priority", "priorityid"),  # Priority rows carry a GUID "id" (see output.txt)
+    "slas": ("/api/sla", "id"),
+    "agents": ("/api/agent", "id"),
+}
+
+
+def _normalize(name):
+    return " ".join(str(name).lower().split())
+
+
+class ReferenceData:
+    """In-process cache of HaloPSA lookup tables (statuses, priorities, SLAs, agents).
+
+    Each table is loaded once, indexed by id and by case-insensitive name, and kept in a local
+    JSON file so later runs start warm. A table older than ttl is revalidated with its ETag, and
+    a failed refresh keeps serving the last good copy.
+    """
+
+    def __init__(self, halo_client, path=REFERENCE_DATA_FILE, ttl=REFERENCE_DATA_TTL):
+        self.halo_client = halo_client
+        self.path = path
+        self.ttl = ttl
+        self._tables = self._load_file()
+        self._indexes = {}
+        self._lock = threading.Lock()
+
+    def _load_file(self):
+        try:
+            with open(self.path) as f:
+                return json.load(f)
+        except (FileNotFoundError, json.JSONDecodeError):
+            return {}
+
+    def _save_file(self):
+        tmp_path = f"{self.path}.tmp"
+        with open(tmp_path, "w") as f:
+            json.dump(self._tables, f)
+        os.replace(tmp_path, self.path)
+
+    # 🔹 FUNCTION: REFRESH TABLE
+    def _refresh(self, name):
+        """Fetch (or revalidate) one table. Caller holds self._lock."""
+        api_path, _ = REFERENCE_TABLES[name]
+        cached = self._tables.get(name)
+        try:
+            headers = {"Authorization": f"Bearer {self.halo_client.get_access_token()}"}
+            if cached and cached.get("etag"):
+                headers["If-None-Match"] = cached["etag"]
+            response = self.halo_client.get(f"{self.halo_client.base_url}{api_path}", headers=headers)
+        except Exception as e:
+            print(f"⚠️ Could not refresh HaloPSA {name}: {e}")
+            self._mark_failed(name)
+            return
+
+        if response.status_code == 304 and cached:
+            cached["fetched_at"] = time.time()
+        elif response.status_code == 200:
+            try:
+                rows = response.json()
+            except ValueError:  # A proxy or login page answered instead of the API
+                print(f"⚠️ Could not refresh HaloPSA {name}. API response was not JSON.")
+                self._mark_failed(name)
+                return
+            if isinstance(rows, dict):  # Some endpoints wrap the list, e.g. {"record_count": n, "agents": [...]}
+                rows = next((value for value in rows.values() if isinstance(value, list)), [])
+            self._tables[name] = {"rows": rows, "etag": response.headers.get("ETag"), "fetched_at": time.time()}
+            self._indexes.pop(name, None)
+            print(f"✅ Loaded {len(rows)} HaloPSA {name}")
+        else:
+            print(f"⚠️ Could not refresh HaloPSA {name}. Status Code: {response.status_code}, Response: {response.text}")
+            self._mark_failed(name)
+            return
+
+        self._save_file()
+
+    def _mark_failed(self, name):
+        """Keep serving the last good rows (if any) and retry after REFERENCE_RETRY_SECONDS."""
+        cached = self._tables.get(name) or {"rows": [], "etag": None}
+        cached["fetched_at"] = time.time() - self.ttl + REFERENCE_RETRY_SECONDS
+        self._tables[name] = cached
+
+    # 🔹 FUNCTION: GET TABLE INDEX
+    def _index(self, name):
+        """Return (by_id, by_name) for a table, refreshing it first if it is missing or stale."""
+        with self._lock:
+            cached = self._tables.get(name)
+            if not cached or time.time() - cached.get("fetched_at", 0) >= self.ttl:
+                self._refresh(name)
+
+            if name not in self._indexes:
+                _, id_field = REFERENCE_TABLES[name]
+                rows = self._tables.get(name, {}).get("rows", [])
+                by_id = {row[id_field]: row for row in rows if isinstance(row, dict) and id_field in row}
+                by_name = {_normalize(row["name"]): row for row in rows if isinstance(row, dict) and row.get("name")}
+                self._indexes[name] = (by_id, by_name)
+            return self._indexes[name]
+
+    def rows(self, name):
+        """Return every row of a table."""
+        return list(self._index(name)[0].values())
+
+    def by_id(self, name, row_id):
+        try:
+            return self._index(name)[0].get(int(row_id))
+        except (TypeError, ValueError):
+            return None
+
+    def by_name(self, name, row_name):
+        return self._index(name)[1].get(_normalize(row_name))
+
+    # 🔹 FUNCTION: RESOLVE ID
+    def resolve_id(self, name, value, aliases=None, default=None):
+        """Turn a numeric id or a free-text name (optionally via aliases) into a valid id for the table."""
+        _, id_field = REFERENCE_TABLES[name]
+        by_id, _ = self._index(name)
+        if self.by_id(name, value):
+            return int(value)
+        if not by_id and str(value).strip().isdigit():
+            return int(value)  # Table unavailable: trust a numeric id rather than discard it
+
+        text = _normalize(value) if value is not None else ""
+        target = (aliases or {}).get(text, value)
+        row = self.by_name(name, target) if target is not None else None
+        return row[id_field] if row else default
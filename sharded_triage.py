@@ -0,0 +1,367 @@
+import os
+import sys
+import json
+import time
+import zlib
+import queue
+import shutil
+import argparse
+import itertools
+import threading
+import contextlib
+import multiprocessing
+
+# ⚙️ Sharded Mode Settings
+TRIAGE_WORKERS = int(os.getenv("TRIAGE_WORKERS", str(os.cpu_count() or 1)))  # Worker processes
+SHARD_STATE_DIR = os.getenv("SHARD_STATE_DIR", "./shards")  # Per-shard ChromaDB, work queue and raw ticket store
+SHARD_QUEUE_SIZE = int(os.getenv("SHARD_QUEUE_SIZE", "200"))  # Tickets buffered per worker before dispatch blocks
+WORKER_METRICS_INTERVAL = float(os.getenv("WORKER_METRICS_INTERVAL", "5"))  # Seconds between metric pushes
+DISPATCH_TIMEOUT = float(os.getenv("DISPATCH_TIMEOUT", "1"))  # Seconds per put before re-checking the worker is alive
+SHARD_LLM_CONCURRENCY = int(os.getenv("SHARD_LLM_CONCURRENCY", "1"))  # LLM threads per worker; above 1 a client's tickets can finish out of order
+SHARD_MERGE_PAGE_SIZE = int(os.getenv("SHARD_MERGE_PAGE_SIZE", "500"))  # ChromaDB records copied per call when syncing or merging a shard
+
+
+# 🔹 FUNCTION: SHARD OF
+def shard_of(ticket, workers):
+    """Stable shard for a ticket's client, so one worker owns all of a client's tickets in arrival order."""
+    return zlib.crc32(str(ticket.get("client_id")).encode()) % workers
+
+
+def shard_environment(index, workers, state_dir=SHARD_STATE_DIR):
+    """Environment giving a worker its own local state, so no two processes write the same ChromaDB.
+
+    A shard's ChromaDB is kept between runs and brought up to date before each one (sync_shard_store).
+    Its work queue and raw ticket store only live for one run: they start with the main work queue's
+    part-written tickets (hand_over_resumable) and are folded back into the main state afterwards
+    (fold_shard_state).
+    """
+    shard_dir = os.path.abspath(os.path.join(state_dir, f"{index + 1}-of-{workers}"))
+    os.makedirs(shard_dir, exist_ok=True)
+    return {
+        "CHROMA_PATH": os.path.join(shard_dir, "chroma_db"),
+        "WORK_QUEUE_FILE": os.path.join(shard_dir, "triage_queue.db"),
+        "RAW_TICKET_STORE_FILE": os.path.join(shard_dir, "ticket_raw.db"),
+        "METRICS_SUMMARY_FILE": os.path.join(shard_dir, "triage_metrics.json"),
+        "METRICS_PORT": "0",
+    }
+
+
+def _sync_marker(environment):
+    """File holding when a shard's ChromaDB was last brought up to date with the main one."""
+    return os.path.join(os.path.dirname(environment["CHROMA_PATH"]), "synced_at")
+
+
+# 🔹 FUNCTION: COPY RECORDS
+def copy_records(source_path, target_path, ticket_ids, page_size=SHARD_MERGE_PAGE_SIZE):
+    """Upsert the records of the given tickets from every collection of one ChromaDB into another.
+
+    The tickets and triage_decisions collections are both keyed by ticket id, so this carries a
+    ticket's record, triage labels and cached decision. Embeddings are taken as stored, never
+    recomputed. Returns the records written.
+    """
+    ticket_ids = sorted({str(ticket_id) for ticket_id in ticket_ids})
+    if not ticket_ids or not os.path.isdir(source_path):
+        return 0
+    import chromadb
+
+    source_client = chromadb.PersistentClient(path=source_path)
+    target_client = chromadb.PersistentClient(path=target_path)
+    written = 0
+    try:
+        for source in source_client.list_collections():
+            target = target_client.get_or_create_collection(source.name, metadata=source.metadata,
+                                                            embedding_function=None)
+            for start in range(0, len(ticket_ids), page_size):
+                page = source.get(ids=ticket_ids[start:start + page_size],
+                                  include=["embeddings", "metadatas", "documents"])
+                if page["ids"]:
+                    target.upsert(ids=page["ids"], embeddings=page["embeddings"], metadatas=page["metadatas"],
+                                  documents=page["documents"])
+                    written += len(page["ids"])
+    finally:
+        # ChromaDB caches one client per path; drop them so a worker's writes are not hidden behind a stale one
+        source_client.clear_system_cache()
+    return written
+
+
+# 🔹 FUNCTION: SYNC SHARD STORE
+def sync_shard_store(environment, main_chroma_path, work_queue, started):
+    """Bring a shard's ChromaDB up to date with the main one before a run. Returns (seeded, records written).
+
+    A new shard store (or one with no sync marker) starts as a copy of the main store, since
+    precedents, the triage cache and the local classifier's labels all live there. An existing one
+    only takes the records of tickets the main work queue changed since its last sync: what the
+    other shards merged back, or what unsharded runs triaged. started is recorded as the new sync time.
+    """
+    shard_chroma_path, marker = environment["CHROMA_PATH"], _sync_marker(environment)
+    try:
+        with open(marker) as f:
+            synced_at = float(f.read())
+    except (FileNotFoundError, ValueError):
+        synced_at = None
+
+    if synced_at is None or not os.path.isdir(shard_chroma_path):
+        shutil.rmtree(shard_chroma_path, ignore_errors=True)
+        if os.path.isdir(main_chroma_path):
+            shutil.copytree(main_chroma_path, shard_chroma_path)
+        seeded, written = True, 0
+    else:
+        seeded = False
+        written = copy_records(main_chroma_path, shard_chroma_path, work_queue.changed_since(synced_at))
+
+    with open(marker, "w") as f:
+        f.write(repr(started))
+    return seeded, written
+
+
+def _remove_sqlite(path):
+    for suffix in ("", "-wal", "-shm"):
+        with contextlib.suppress(FileNotFoundError):
+            os.remove(path + suffix)
+
+
+# 🔹 FUNCTION: FOLD SHARD STATE
+def fold_shard_state(environment, triage):
+    """Merge one shard's run into the main ChromaDB, work queue and raw ticket store.
+
+    Only the ChromaDB records of tickets in the shard's work queue (the ones it stored, labelled or
+    cached a decision for this run) are copied; the shard's store itself is kept for the next run.
+    Its work queue and raw ticket store are deleted once merged, so the next run, sharded with any
+    worker count or not, starts from everything the shards learned. Returns the number of ChromaDB
+    records written.
+    """
+    from work_queue import WorkQueue
+
+    written = 0
+    if os.path.exists(environment["WORK_QUEUE_FILE"]):
+        shard_queue = WorkQueue(environment["WORK_QUEUE_FILE"])
+        rows = shard_queue.rows()
+        shard_queue.close()
+        written = copy_records(environment["CHROMA_PATH"], triage.CHROMA_PATH, [row[0] for row in rows])
+        triage.work_queue.merge(rows)
+        _remove_sqlite(environment["WORK_QUEUE_FILE"])
+    if os.path.exists(environment["RAW_TICKET_STORE_FILE"]):
+        if triage.raw_ticket_store is not None:
+            triage.raw_ticket_store.merge_from(environment["RAW_TICKET_STORE_FILE"])
+        _remove_sqlite(environment["RAW_TICKET_STORE_FILE"])
+    return written
+
+
+# 🔹 FUNCTION: HAND OVER RESUMABLE
+def hand_over_resumable(work_queue, workers, state_dir=SHARD_STATE_DIR):
+    """Copy tickets the main work queue left part-written into their shard's queue, so its worker resumes them.
+
+    Their status may already have left 'New', so the coordinator's listing would never find them again.
+    Returns how many were handed over.
+    """
+    from work_queue import WorkQueue
+
+    by_shard = {}
+    for row in work_queue.rows(("analyzed", "status_written")):
+        by_shard.setdefault(shard_of(json.loads(row[2]), workers), []).append(row)
+    for shard, rows in by_shard.items():
+        shard_queue = WorkQueue(shard_environment(shard, workers, state_dir)["WORK_QUEUE_FILE"])
+        shard_queue.merge(rows)
+        shard_queue.close()
+    return sum(len(rows) for rows in by_shard.values())
+
+
+# 🔹 FUNCTION: WORKER
+def _worker_main(index, workers, inbox, results, buckets, state_dir, quiet, setup):
+    """Worker process: triage the tickets dispatched to this shard, pushing metric snapshots as it goes."""
+    os.environ.update(shard_environment(index, workers, state_dir))
+    output = open(os.devnull, "w") if quiet else sys.stdout
+    with contextlib.redirect_stdout(output):
+        import Hectic_AI_Support as triage
+
+        for name, bucket in buckets.items():
+            triage.request_scheduler.use_bucket(name, bucket)
+        if setup is not None:
+            setup(triage)
+
+        finished = threading.Event()
+
+        def push_metrics():
+            while not finished.wait(WORKER_METRICS_INTERVAL):
+                results.put(("metrics", index, triage.metrics.snapshot()))
+        threading.Thread(target=push_metrics, name="metrics-push", daemon=True).start()
+
+        def incoming():
+            while True:
+                ticket = inbox.get()
+                if ticket is None:
+                    return
+                yield ticket
+
+        # One LLM thread by default keeps each client's tickets in arrival order; processes give the parallelism
+        stats = triage.process_tickets(itertools.chain(triage.resumable_tickets(),
+                                                       triage.fetch_tickets(source=incoming())),
+                                       llm_concurrency=SHARD_LLM_CONCURRENCY,
+                                       write_concurrency=1 if SHARD_LLM_CONCURRENCY == 1 else triage.HALO_WRITE_CONCURRENCY)
+        finished.set()
+        triage.metrics.write_summary()
+        results.put(("done", index, stats, triage.metrics.snapshot(), triage.request_scheduler.stats()))
+
+
+# 🔹 FUNCTION: RUN SHARDED
+def run_sharded(workers=TRIAGE_WORKERS, state_dir=SHARD_STATE_DIR, quiet=False, setup=None, since=None):
+    """Fetch 'New' tickets once here and triage them across worker processes sharded by client_id.
+
+    Each shard keeps its own ChromaDB between runs, seeded once from the main one (CHROMA_PATH) and
+    then only sent the records that changed, and starts with the tickets of its clients that the main
+    work queue left part-written. What each shard triaged is merged back into the main state at the end.
+    Every process uses the same HaloPSA token through the token cache file, and the same
+    shared-memory rate budget for each upstream. Worker metrics are merged into cluster_metrics
+    (served on the metrics port when one is set). setup(triage_module), if given, runs in each
+    worker after import; it must be a picklable module-level function.
+    Tickets for a worker that has died are skipped (never blocking the dispatcher) and listed in failed_ids.
+    Returns the summed process_tickets() stats plus per-worker stats under "workers".
+    """
+    import Hectic_AI_Support as triage
+    from metrics import MetricsRegistry, METRICS_PORT, METRICS_SUMMARY_FILE
+    from rate_limit import SharedTokenBucket
+
+    context = multiprocessing.get_context("spawn")  # No forking a process that already runs threads
+    buckets = {
+        "halopsa": SharedTokenBucket(triage.HALO_REQUESTS_PER_SECOND, triage.HALO_BURST, context),
+        "openai": SharedTokenBucket(triage.OPENAI_REQUESTS_PER_SECOND, triage.OPENAI_BURST, context),
+    }
+    triage.request_scheduler.use_bucket("halopsa", buckets["halopsa"])  # Listing shares the budget too
+
+    started = time.time()
+    triage.init_local_state()  # The main work queue and raw ticket store shard state is merged into
+    environments = [shard_environment(index, workers, state_dir) for index in range(workers)]
+    for environment in environments:
+        fold_shard_state(environment, triage)  # Left behind by an interrupted run
+    seeded, synced = [], 0
+    with triage.metrics.timer("shard_sync"):
+        for index, environment in enumerate(environments):
+            was_seeded, written = sync_shard_store(environment, triage.CHROMA_PATH, triage.work_queue, started)
+            if was_seeded:
+                seeded.append(index + 1)
+            synced += written
+    if seeded:
+        print(f"🌱 Seeded shard store(s) {', '.join(map(str, seeded))} from {triage.CHROMA_PATH}.")
+    if synced:
+        print(f"🔁 Synced {synced} changed ChromaDB record(s) from {triage.CHROMA_PATH} into the shard stores.")
+    handed_over = hand_over_resumable(triage.work_queue, workers, state_dir)
+    if handed_over:
+        print(f"♻️ Handed {handed_over} part-written ticket(s) from the main work queue to their shards.")
+
+    inboxes = [context.Queue(maxsize=SHARD_QUEUE_SIZE) for _ in range(workers)]
+    results = context.Queue()
+    processes = [context.Process(target=_worker_main, name=f"triage-worker-{index + 1}",
+                                 args=(index, workers, inboxes[index], results, buckets, state_dir, quiet, setup))
+                 for index in range(workers)]
+    for process in processes:
+        process.start()
+    print(f"🧩 Started {workers} triage worker(s), sharded by client_id.")
+
+    cluster_metrics = MetricsRegistry()
+    if METRICS_PORT:
+        cluster_metrics.serve(METRICS_PORT)
+    snapshots = {}
+    dispatched = [0] * workers
+    skipped = [[] for _ in range(workers)]  # Ticket ids not dispatched because their worker had died
+    finished = []  # Ticket ids the main work queue already finished or parked
+
+    def deliver(shard, item):
+        """Put item in a shard's inbox, giving up (False) once its worker is no longer alive."""
+        while processes[shard].is_alive():
+            try:
+                inboxes[shard].put(item, timeout=DISPATCH_TIMEOUT)
+                return True
+            except queue.Full:
+                continue
+        return False
+
+    def dispatch():
+        try:
+            for ticket in triage.iter_tickets(since=since):
+                if triage.work_queue.is_finished(ticket) or triage.work_queue.is_parked(ticket["id"]):
+                    finished.append(ticket["id"])  # Shard queues start empty, so they would not know
+                    continue
+                shard = shard_of(ticket, workers)
+                if skipped[shard] or not deliver(shard, ticket):
+                    skipped[shard].append(ticket["id"])
+                    continue
+                dispatched[shard] += 1
+        finally:
+            for shard in range(workers):
+                deliver(shard, None)
+    dispatcher = threading.Thread(target=dispatch, name="shard-dispatch", daemon=True)
+    dispatcher.start()
+
+    worker_stats, scheduler_stats = {}, {}
+    while len(worker_stats) < workers:
+        try:
+            message = results.get(timeout=1)
+        except queue.Empty:
+            crashed = [index for index, process in enumerate(processes)
+                       if process.exitcode is not None and index not in worker_stats]
+            for index in crashed:
+                print(f"❌ Triage worker {index + 1} exited with code {processes[index].exitcode}.")
+                worker_stats[index] = None
+            continue
+        kind, index = message[0], message[1]
+        if kind == "done":
+            worker_stats[index], snapshots[index], scheduler_stats[index] = message[2], message[3], message[4]
+        else:
+            snapshots[index] = message[2]
+        cluster_metrics.load([triage.metrics.snapshot(), *snapshots.values()])
+
+    dispatcher.join()
+    for index, process in enumerate(processes):
+        process.join()
+        if worker_stats.get(index) is None:
+            inboxes[index].cancel_join_thread()  # Nobody will read what is left; don't block exit flushing it
+    cluster_metrics.load([triage.metrics.snapshot(), *snapshots.values()])
+    cluster_metrics.write_summary(METRICS_SUMMARY_FILE)
+
+    with triage.metrics.timer("shard_merge"):
+        merged = sum(fold_shard_state(environment, triage) for environment in environments)
+    print(f"🔁 Merged shard state back into {triage.CHROMA_PATH} ({merged} ChromaDB record(s) written).")
+
+    totals = {"received": len(finished), "resumed": 0, "already_done": len(finished), "analyzed": 0, "analysis_failed": 0,
+              "updated": 0, "update_failed": 0, "failed_ids": [], "workers": {}}
+    for index in range(workers):
+        stats = worker_stats.get(index)
+        totals["workers"][index + 1] = {"dispatched": dispatched[index], "skipped": len(skipped[index]), "stats": stats}
+        totals["failed_ids"] += skipped[index]
+        if stats is None:
+            totals["analysis_failed"] += dispatched[index] + len(skipped[index])
+            continue
+        for key in totals:
+            if key in stats and key != "workers":
+                totals[key] += stats[key]
+    totals["metrics"] = cluster_metrics
+    return totals
+
+
+def print_sharded_report(totals):
+    for worker, details in totals["workers"].items():
+        stats = details["stats"]
+        if stats is None:
+            print(f"❌ Worker {worker}: {details['dispatched']} ticket(s) dispatched, worker crashed; "
+                  f"{details['skipped']} more skipped.")
+            continue
+        print(f"🧩 Worker {worker}: {details['dispatched']} dispatched, {stats['analyzed']} analyzed, "
+              f"{stats['updated']} updated, {stats['analysis_failed'] + stats['update_failed']} failed.")
+    print(f"📊 All workers: {totals['received']} received, {totals['analyzed']} analyzed, {totals['updated']} updated, "
+          f"{totals['analysis_failed'] + totals['update_failed']} failed.")
+    for stage, timing in sorted(totals["metrics"].summary()["stages"].items(), key=lambda item: -item[1]["total_seconds"]):
+        print(f"⏱️ {stage}: {timing['calls']} calls, {timing['total_seconds']:.2f}s total, "
+              f"p50 {timing['p50_seconds'] * 1000:.0f}ms, p95 {timing['p95_seconds'] * 1000:.0f}ms")
+
+
+# 🔹 MAIN EXECUTION
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="AI ticket triage for HaloPSA across worker processes sharded by client_id.")
+    parser.add_argument("--workers", type=int, default=TRIAGE_WORKERS, help="worker processes (default: one per core)")
+    parser.add_argument("--state-dir", default=SHARD_STATE_DIR, help="directory for each shard's local state")
+    parser.add_argument("--quiet", action="store_true", help="hide the workers' per-ticket output")
+    args = parser.parse_args()
+
+    print("\n🚀 Starting sharded AI Ticket Triage and Analysis\n")
+    print_sharded_report(run_sharded(args.workers, args.state_dir, quiet=args.quiet))
+    print("🚀 AI Triage workflow complete. Exiting.")
@@ -0,0 +1,275 @@
+import os
+import sys
+import json
+import time
+import argparse
+from datetime import datetime, timezone
+from metrics import metrics
+from ticket_store import halo_epoch
+from local_classifier import CLASSIFIED_FIELDS, TRAINING_SOURCES
+
+# ⚙️ Similar Ticket Settings
+SIMILAR_TICKETS_TOP_K = int(os.getenv("SIMILAR_TICKETS_TOP_K", "5"))  # Results returned by a search
+PROMPT_PRECEDENTS = int(os.getenv("PROMPT_PRECEDENTS", "0"))  # Past tickets shown to the AI per ticket (0 disables)
+PRECEDENT_MIN_SIMILARITY = float(os.getenv("PRECEDENT_MIN_SIMILARITY", "0.6"))  # Less similar tickets are not shown to the AI
+PRECEDENT_REASONING_CHARS = 200  # Past reasoning quoted per precedent in the prompt
+SIMILAR_TICKETS_CANDIDATES = int(os.getenv("SIMILAR_TICKETS_CANDIDATES", "100"))  # Unfiltered neighbours post-filtered first
+SIMILAR_TICKETS_OVERSAMPLE = 10  # Extra results requested when only part of the filter runs inside ChromaDB
+
+
+class SimilarTickets:
+    """"Similar past tickets" search over the ChromaDB tickets collection.
+
+    Searches take a ticket ID (its stored embedding is reused) or free text, narrowed by the compact
+    metadata filters: client_id, dateoccurred range and status_id. Each result carries the past
+    resolution recorded on the ticket by the triage pipeline (the decided status, assignment,
+    classification and reasoning), when it has one.
+
+    ChromaDB's filtered queries get slower the more records a filter matches (a range or $in over
+    half of 100k tickets takes 100-200ms), so broad filters are applied in Python to the nearest
+    unfiltered candidates instead. Only when too few candidates pass does the search fall back to a
+    filtered query, using just the selective client_id equality inside ChromaDB where possible.
+    """
+
+    def __init__(self, collection, embedder=None, candidates=SIMILAR_TICKETS_CANDIDATES):
+        self.collection = collection
+        self.embedder = embedder
+        self.candidates = candidates
+
+    # 🔹 FUNCTION: BUILD FILTER
+    @staticmethod
+    def build_filters(client_id=None, since=None, until=None, status_id=None, resolved_only=False):
+        """Normalise the metadata pre-filters into a dict of the ones that are set."""
+        filters = {"client_id": client_id, "status_id": status_id,
+                   "since": halo_epoch(since) if since is not None else None,
+                   "until": halo_epoch(until) if until is not None else None,
+                   "resolved_only": resolved_only or None}
+        return {name: value for name, value in filters.items() if value is not None}
+
+    @staticmethod
+    def build_where(filters):
+        """Express filters as a ChromaDB where clause (None if there are none)."""
+        clauses = []
+        if "client_id" in filters:
+            clauses.append({"client_id": int(filters["client_id"])})
+        if "status_id" in filters:
+            clauses.append({"status_id": int(filters["status_id"])})
+        if "since" in filters:
+            clauses.append({"dateoccurred": {"$gte": filters["since"]}})
+        if "until" in filters:
+            clauses.append({"dateoccurred": {"$lte": filters["until"]}})
+        if "resolved_only" in filters:
+            clauses.append({"triage_source": {"$in": list(TRAINING_SOURCES)}})
+        if not clauses:
+            return None
+        return clauses[0] if len(clauses) == 1 else {"$and": clauses}
+
+    @staticmethod
+    def matches(metadata, filters):
+        """Apply filters to one record's metadata in Python."""
+        if "client_id" in filters and metadata.get("client_id") != int(filters["client_id"]):
+            return False
+        if "status_id" in filters and metadata.get("status_id") != int(filters["status_id"]):
+            return False
+        dateoccurred = metadata.get("dateoccurred")
+        if "since" in filters and (dateoccurred is None or dateoccurred < filters["since"]):
+            return False
+        if "until" in filters and (dateoccurred is None or dateoccurred > filters["until"]):
+            return False
+        if "resolved_only" in filters and metadata.get("triage_source") not in TRAINING_SOURCES:
+            return False
+        return True
+
+    def _query(self, embedding, n_results, where, filters, exclude_id, min_similarity):
+        results = self.collection.query(query_embeddings=[embedding], n_results=n_results, where=where,
+                                        include=["metadatas", "documents", "distances"])
+        found = []
+        for match_id, metadata, document, distance in zip(results["ids"][0], results["metadatas"][0],
+                                                          results["documents"][0], results["distances"][0]):
+            similarity = 1 - distance / 2  # Squared L2 between unit vectors
+            if match_id == exclude_id or similarity < min_similarity or not self.matches(metadata or {}, filters):
+                continue
+            found.append(describe_match(match_id, metadata or {}, document, similarity))
+        return found, len(results["ids"][0]) < n_results
+
+    # 🔹 FUNCTION: SEARCH
+    def search(self, ticket_id=None, text=None, embedding=None, top_k=SIMILAR_TICKETS_TOP_K, client_id=None,
+               since=None, until=None, status_id=None, resolved_only=False, min_similarity=0.0):
+        """Return up to top_k similar tickets, most similar first, excluding the query ticket itself.
+
+        Give exactly one of ticket_id, text or embedding. since/until accept HaloPSA timestamps or
+        epoch seconds.
+        """
+        with metrics.timer("similar_tickets"):
+            if embedding is None and ticket_id is not None:
+                stored = self.collection.get(ids=[str(ticket_id)], include=["embeddings"])
+                if not stored["ids"]:
+                    raise KeyError(f"Ticket #{ticket_id} is not in the ticket store")
+                embedding = stored["embeddings"][0]
+            elif embedding is None:
+                if self.embedder is None:
+                    raise ValueError("A text search needs an embedding function")
+                embedding = self.embedder([text])[0]
+
+            filters = self.build_filters(client_id, since, until, status_id, resolved_only)
+            exclude_id = str(ticket_id) if ticket_id is not None else None
+            wanted = top_k + (exclude_id is not None)
+
+            # Nearest neighbours first; enough of them pass any broad filter. Without filters this is the answer.
+            found, exhausted = self._query(embedding, max(wanted, self.candidates) if filters else wanted, None,
+                                           filters, exclude_id, min_similarity)
+            if len(found) >= top_k or exhausted or not filters:
+                return found[:top_k]
+
+            # Selective filter: let ChromaDB apply the client_id equality, the rest in Python.
+            if "client_id" in filters and len(filters) > 1:
+                found, exhausted = self._query(embedding, wanted * SIMILAR_TICKETS_OVERSAMPLE,
+                                               {"client_id": int(filters["client_id"])}, filters, exclude_id,
+                                               min_similarity)
+                if len(found) >= top_k or exhausted:
+                    return found[:top_k]
+
+            found, _ = self._query(embedding, wanted, self.build_where(filters), filters, exclude_id, min_similarity)
+            return found[:top_k]
+
+
+def describe_match(ticket_id, metadata, document, similarity):
+    """Flatten one query result into a JSON-friendly dict."""
+    resolution = {}
+    for field in CLASSIFIED_FIELDS:
+        if f"triage_{field}" in metadata:
+            resolution[field] = json.loads(metadata[f"triage_{field}"])
+    if resolution:
+        resolution.update(reasoning=metadata.get("triage_reasoning", ""), source=metadata.get("triage_source"))
+
+    dateoccurred = metadata.get("dateoccurred")
+    return {
+        "ticket_id": ticket_id,
+        "similarity": round(similarity, 4),
+        "client_id": metadata.get("client_id"),
+        "status_id": metadata.get("status_id"),
+        "dateoccurred": datetime.fromtimestamp(dateoccurred, timezone.utc).isoformat() if dateoccurred else None,
+        "text": document,
+        "resolution": resolution or None,
+    }
+
+
+# 🔹 FUNCTION: FORMAT PRECEDENTS
+def format_precedents(matches):
+    """Render resolved matches as a short prompt block for the AI, or "" if there are none."""
+    lines = []
+    for match in matches:
+        resolution = match["resolution"]
+        if not resolution:
+            continue
+        summary = match["text"].split("\n", 1)[0].removeprefix("Summary: ")
+        reasoning = " ".join(resolution.get("reasoning", "").split())[:PRECEDENT_REASONING_CHARS]
+        lines.append(f"- #{match['ticket_id']} (similarity {match['similarity']:.2f}) \"{summary}\": "
+                     f"status_id {resolution.get('status_id')}, urgency {resolution.get('urgency')}, "
+                     f"impact {resolution.get('impact')}, type {resolution.get('ticket_type')}, "
+                     f"assigned to {resolution.get('assign_to')}. {reasoning}")
+    return "\n".join(lines)
+
+
+# 🔹 FUNCTION: BENCHMARK
+def benchmark(count, queries=200, top_k=SIMILAR_TICKETS_TOP_K, seed=0):
+    """Fill a scratch collection with count synthetic tickets and time filtered searches against it."""
+    import random
+    import tempfile
+    import chromadb
+    from benchmark import synthetic_tickets, HashingEmbedder, percentile
+    from ticket_store import ticket_metadata
+
+    rng = random.Random(seed)
+    embedder = HashingEmbedder()
+    collection = chromadb.PersistentClient(path=tempfile.mkdtemp(prefix="similar-tickets-")).create_collection(
+        "tickets", embedding_function=None)
+    tickets = synthetic_tickets(count, seed=seed)
+
+    print(f"🏗️ Loading {count} synthetic tickets...")
+    started = time.perf_counter()
+    for start in range(0, count, 5000):
+        chunk = tickets[start:start + 5000]
+        documents = [f"Summary: {ticket['summary']}\nDetails: {ticket['details']}" for ticket in chunk]
+        metadatas = [ticket_metadata(ticket) for ticket in chunk]
+        for metadata in metadatas:
+            if rng.random() < 0.5:
+                metadata.update(triage_source="ai", triage_status_id="2", triage_urgency='"Medium"',
+                                triage_reasoning="Resolved by restarting the affected service.")
+        collection.add(ids=[str(ticket["id"]) for ticket in chunk], embeddings=embedder(documents),
+                       metadatas=metadatas, documents=documents)
+    print(f"   Loaded in {time.perf_counter() - started:.1f}s")
+
+    search = SimilarTickets(collection, embedder)
+    oldest, newest = halo_epoch(tickets[0]["dateoccurred"]), halo_epoch(tickets[-1]["dateoccurred"])
+    scenarios = {
+        "text": lambda ticket: {},
+        "client": lambda ticket: {"client_id": ticket["client_id"]},
+        "client+date": lambda ticket: {"client_id": ticket["client_id"],
+                                       "since": oldest + (newest - oldest) / 2},
+        "last week": lambda ticket: {"since": newest - 7 * 86400},
+        "status": lambda ticket: {"status_id": 1},
+        "resolved": lambda ticket: {"resolved_only": True},
+        "client+resolved": lambda ticket: {"client_id": ticket["client_id"], "resolved_only": True},
+    }
+    report = {}
+    for name, filters in scenarios.items():
+        seconds = []
+        for _ in range(queries):
+            ticket = rng.choice(tickets)
+            started = time.perf_counter()
+            search.search(text=ticket["summary"], top_k=top_k, **filters(ticket))
+            seconds.append(time.perf_counter() - started)
+        report[name] = {"p50_ms": round(percentile(seconds, 0.5) * 1000, 2),
+                        "p99_ms": round(percentile(seconds, 0.99) * 1000, 2)}
+        print(f"🔎 {name}: p50 {report[name]['p50_ms']}ms, p99 {report[name]['p99_ms']}ms over {queries} searches")
+    return report
+
+
+# 🔹 MAIN EXECUTION
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Find similar past tickets in the ChromaDB ticket store.")
+    query = parser.add_mutually_exclusive_group(required=True)
+    query.add_argument("--ticket-id", help="find tickets similar to this stored ticket")
+    query.add_argument("--text", help="find tickets similar to this free text")
+    query.add_argument("--benchmark", type=int, metavar="TICKETS",
+                       help="time searches against a scratch collection of this many synthetic tickets")
+    parser.add_argument("--top-k", type=int, default=SIMILAR_TICKETS_TOP_K)
+    parser.add_argument("--client-id", type=int)
+    parser.add_argument("--status-id", type=int)
+    parser.add_argument("--since", help="earliest dateoccurred, e.g. 2025-03-01")
+    parser.add_argument("--until", help="latest dateoccurred")
+    parser.add_argument("--resolved-only", action="store_true", help="only tickets with a recorded triage decision")
+    parser.add_argument("--chroma-path", default="./chroma_db")
+    parser.add_argument("--json", action="store_true", help="print results as JSON")
+    args = parser.parse_args()
+
+    if args.benchmark:
+        report = benchmark(args.benchmark, top_k=args.top_k)
+        sys.exit(0 if all(result["p99_ms"] < 100 for result in report.values()) else 1)
+
+    import chromadb
+    from chromadb.utils import embedding_functions
+
+    collection = chromadb.PersistentClient(path=args.chroma_path).get_collection("tickets", embedding_function=None)
+    search = SimilarTickets(collection, embedding_functions.DefaultEmbeddingFunction() if args.text else None)
+    started = time.perf_counter()
+    matches = search.search(ticket_id=args.ticket_id, text=args.text, top_k=args.top_k, client_id=args.client_id,
+                            since=args.since, until=args.until, status_id=args.status_id,
+                            resolved_only=args.resolved_only)
+    elapsed = time.perf_counter() - started
+
+    if args.json:
+        print(json.dumps(matches, indent=2))
+        sys.exit(0)
+    print(f"🔎 {len(matches)} similar ticket(s) in {elapsed * 1000:.1f}ms")
+    for match in matches:
+        print(f"\n#{match['ticket_id']}  similarity {match['similarity']:.2f}  client {match['client_id']}  "
+              f"status {match['status_id']}  {match['dateoccurred']}")
+        print(f"   {match['text'].splitlines()[0]}")
+        resolution = match["resolution"]
+        if resolution:
+            print(f"   ✅ Past resolution ({resolution['source']}): status {resolution.get('status_id')}, "
+                  f"{resolution.get('urgency')} urgency, assigned to {resolution.get('assign_to')}")
+            if resolution.get("reasoning"):
+                print(f"   {resolution['reasoning'][:300]}")
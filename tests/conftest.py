@@ -0,0 +1,77 @@
+import os
+import sys
+import importlib
+import pytest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+import mock_servers  # noqa: E402
+
+
+@pytest.fixture(scope="session")
+def stubs(tmp_path_factory):
+    """HaloPSA and OpenAI stand-ins on free local ports, shared by every test in the session."""
+    tenant = mock_servers.MockHaloPSA()
+    model = mock_servers.MockOpenAI()
+    halo_server = mock_servers.serve(tenant.handler(), 0)
+    openai_server = mock_servers.serve(model.handler(), 0)
+    yield {"tenant": tenant, "model": model, "halo_url": f"http://{mock_servers.MOCK_HOST}:{halo_server.server_port}",
+           "openai_url": f"http://{mock_servers.MOCK_HOST}:{openai_server.server_port}/v1"}
+    halo_server.shutdown()
+    openai_server.shutdown()
+
+
+@pytest.fixture(scope="session")
+def triage_module(stubs, tmp_path_factory):
+    """Hectic_AI_Support imported against the stand-ins, with every local file in a scratch directory.
+
+    The environment is set before the import because the module reads its settings then; spawned
+    shard workers inherit it.
+    """
+    workdir = tmp_path_factory.mktemp("triage")
+    os.environ.update({
+        "HALO_PSA_BASE_URL": stubs["halo_url"], "HALO_PSA_CLIENT_ID": "test", "HALO_PSA_CLIENT_SECRET": "test",
+        "OPENAI_BASE_URL": stubs["openai_url"], "OPENAI_API_KEY": "test", "HALO_TOKEN_CACHE_FILE": "",
+        "HALO_REQUESTS_PER_SECOND": "10000", "HALO_BURST": "1000",
+        "OPENAI_REQUESTS_PER_SECOND": "10000", "OPENAI_BURST": "1000",
+        "TRIAGE_CACHE_ENABLED": "0", "LOCAL_CLASSIFIER_ENABLED": "0", "WRITE_FLUSH_SECONDS": "0.2",
+        "METRICS_PORT": "0", "CHROMA_PATH": str(workdir / "chroma_db"),
+        "WORK_QUEUE_FILE": str(workdir / "triage_queue.db"), "RAW_TICKET_STORE_FILE": str(workdir / "ticket_raw.db"),
+        "REFERENCE_DATA_FILE": str(workdir / "halo_reference_data.json"),
+        "METRICS_SUMMARY_FILE": str(workdir / "triage_metrics.json"),
+    })
+    return importlib.import_module("Hectic_AI_Support")
+
+
+@pytest.fixture
+def tenant(stubs):
+    """The HaloPSA stand-in, emptied before each test. Call tenant.add_tickets() to seed it."""
+    tenant = stubs["tenant"]
+    with tenant.stats["lock"]:
+        for records in (tenant.tickets, tenant.first_served, tenant.status_written, tenant.note_written, tenant.notes):
+            records.clear()
+        tenant.stats["requests"].clear()
+    return tenant
+
+
+@pytest.fixture
+def triage(triage_module, tenant, tmp_path):
+    """The triage module with a fresh work queue and raw ticket store for this test."""
+    from work_queue import WorkQueue
+    from ticket_store import RawTicketStore
+
+    if triage_module.chroma_client is None:
+        from benchmark import use_hash_embedder
+        use_hash_embedder(triage_module)  # Offline embeddings instead of the ONNX model
+    triage_module.work_queue = WorkQueue(str(tmp_path / "triage_queue.db"))
+    triage_module.raw_ticket_store = RawTicketStore(str(tmp_path / "ticket_raw.db"))
+    yield triage_module
+    triage_module.work_queue.close()
+
+
+def new_tickets(count, clients=3):
+    """count 'New' ticket bodies for MockHaloPSA.add_tickets(), spread over a few client_ids."""
+    topics = ["Printer offline", "VPN drops", "Email bounce", "Install request", "Security alert"]
+    return [{"summary": f"{topics[i % len(topics)]} #{i}", "details": f"{topics[i % len(topics)]} reported by user {i}.",
+             "client_id": i % clients + 1} for i in range(count)]
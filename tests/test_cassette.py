@@ -0,0 +1,70 @@
+import pytest
+from conftest import new_tickets
+
+pytest.importorskip("chromadb")
+pytest.importorskip("openai")
+
+from requests.adapters import HTTPAdapter  # noqa: E402
+from cassette import Cassette  # noqa: E402
+from work_queue import WorkQueue  # noqa: E402
+
+
+@pytest.fixture
+def use_cassette(triage):
+    """triage.use_cassette(), undone after the test so later tests talk to the stand-ins again."""
+    yield triage.use_cassette
+    client = triage.halo_client
+    client.mount(HTTPAdapter(pool_connections=1, pool_maxsize=client.pool_size, pool_block=True))
+    client.tokens.forget()
+    if triage.cassette is not None:
+        triage.cassette.close()
+    triage.cassette = None
+    triage._openai_client = None
+
+
+def request_counts(stubs):
+    with stubs["tenant"].stats["lock"], stubs["model"].stats["lock"]:
+        return sum(stubs["tenant"].stats["requests"].values()), stubs["model"].stats["tickets"]
+
+
+def test_recorded_run_replays_without_either_upstream(triage, tenant, stubs, use_cassette, tmp_path):
+    path = str(tmp_path / "run.jsonl.gz")
+    created = tenant.add_tickets(new_tickets(8))
+    ids = {ticket["id"] for ticket in created}
+
+    recording = Cassette(path, "record")
+    use_cassette(recording)
+    recorded = triage.process_tickets(triage.fetch_tickets())
+    recording.close()
+
+    assert recorded["updated"] == 8
+    assert recording.stats()["recorded"] > 0
+
+    triage.work_queue.close()
+    triage.work_queue = WorkQueue(str(tmp_path / "replay_queue.db"))
+    with tenant.stats["lock"]:
+        for ticket_id in ids:
+            tenant.tickets[ticket_id]["status_id"] = 1  # Untouched by replay either way
+        tenant.status_written.clear()
+        tenant.note_written.clear()
+    before = request_counts(stubs)
+
+    playback = Cassette(path, "replay", speed=0)
+    use_cassette(playback)
+    replayed = triage.process_tickets(triage.fetch_tickets())
+
+    assert replayed["updated"] == 8 and not replayed["failed_ids"]
+    assert all(triage.work_queue.state(ticket_id) == "note_written" for ticket_id in ids)
+    assert playback.stats()["missing"] == 0
+    assert request_counts(stubs) == before
+    assert not tenant.status_written and not tenant.note_written
+
+
+def test_replay_does_not_read_the_token_cache(triage, use_cassette, tmp_path, monkeypatch):
+    path = str(tmp_path / "empty.jsonl.gz")
+    Cassette(path, "record").close()
+    monkeypatch.setattr(triage.halo_client.tokens, "cache_path", str(tmp_path / "token.json"))
+
+    use_cassette(Cassette(path, "replay", speed=0))
+
+    assert triage.halo_client.tokens.cache_path is None
@@ -0,0 +1,35 @@
+from conftest import new_tickets
+
+
+def dated_tickets(count):
+    """New ticket bodies that occurred a day apart, oldest first."""
+    return [dict(ticket, dateoccurred=f"2025-03-{day + 1:02d}T09:00:00") for day, ticket in enumerate(new_tickets(count))]
+
+
+def test_cycle_moves_the_cursor_to_the_newest_ticket(triage, tenant):
+    created = tenant.add_tickets(dated_tickets(5))
+
+    received, cursor = triage.run_triage_cycle({})
+
+    assert received == 5
+    assert cursor == {"dateoccurred": created[-1]["dateoccurred"]}
+
+
+def test_idle_cycle_keeps_the_cursor(triage, tenant):
+    cursor = {"dateoccurred": "2025-03-01T00:00:00"}
+
+    assert triage.run_triage_cycle(cursor) == (0, cursor)
+
+
+def test_cursor_holds_at_the_oldest_failed_ticket(triage, tenant, monkeypatch):
+    created = tenant.add_tickets(dated_tickets(3))
+    process_tickets = triage.process_tickets
+
+    def failing_first(tickets, **kwargs):
+        stats = process_tickets(tickets, **kwargs)
+        stats["failed_ids"].append(created[1]["id"])
+        return stats
+
+    monkeypatch.setattr(triage, "process_tickets", failing_first)
+
+    assert triage.run_triage_cycle({})[1] == {"dateoccurred": created[1]["dateoccurred"]}
@@ -0,0 +1,129 @@
+from conftest import new_tickets
+
+
+def listing_requests(tenant):
+    return tenant.stats["requests"].get("GET /api/tickets", 0)
+
+
+def cursor_tenant(tenant):
+    """A _fetch_ticket_page() for a tenant whose listing honours an "ids above" filter."""
+    def fetch(status_id, page_size, page_no, since=None, after_id=None):
+        with tenant.stats["lock"]:
+            listed = sorted((dict(ticket) for ticket in tenant.tickets.values()
+                             if ticket["status_id"] == status_id and (after_id is None or ticket["id"] > after_id)),
+                            key=lambda ticket: ticket["id"])
+        return listed[(page_no - 1) * page_size:page_no * page_size]
+    return fetch
+
+
+def test_streams_each_page_as_it_arrives(triage_module, tenant):
+    created = tenant.add_tickets(new_tickets(25))
+    tickets = triage_module.iter_tickets(page_size=10)
+
+    assert next(tickets)["id"] == created[0]["id"]
+    assert listing_requests(tenant) == 1  # Later pages are not read ahead
+
+    ids = [created[0]["id"]] + [ticket["id"] for ticket in tickets]
+    assert ids == [ticket["id"] for ticket in created]
+    assert listing_requests(tenant) == 3
+
+
+def test_pages_on_page_no_unless_a_cursor_is_configured(triage_module, tenant, monkeypatch):
+    tenant.add_tickets(new_tickets(25))
+    fetch, requested = triage_module._fetch_ticket_page, []
+
+    def spy(status_id, page_size, page_no, since=None, after_id=None):
+        requested.append((page_no, after_id))
+        return fetch(status_id, page_size, page_no, since, after_id)
+
+    monkeypatch.setattr(triage_module, "_fetch_ticket_page", spy)
+    list(triage_module.iter_tickets(page_size=10))
+
+    assert requested == [(1, None), (2, None), (3, None)]
+
+
+def test_tickets_skipped_by_churn_are_found_by_the_next_walk(triage_module, tenant):
+    created = tenant.add_tickets(new_tickets(35))
+
+    walks = []
+    while len(walks) < 5:
+        ids = []
+        for ticket in triage_module.iter_tickets(page_size=10):
+            ids.append(ticket["id"])
+            tenant.tickets[ticket["id"]]["status_id"] = 2  # Triaged as soon as it is read
+        if not ids:
+            break
+        walks.append(ids)
+
+    assert len(walks) > 1  # Leaving 'New' shifted unread tickets onto pages already read
+    assert sorted(sum(walks, [])) == [ticket["id"] for ticket in created]
+
+
+def test_cursor_walk_misses_nothing_while_tickets_leave_new(triage_module, tenant, monkeypatch):
+    created = tenant.add_tickets(new_tickets(35))
+    monkeypatch.setattr(triage_module, "HALO_ID_CURSOR_PARAM", "id_after")
+    monkeypatch.setattr(triage_module, "_fetch_ticket_page", cursor_tenant(tenant))
+
+    ids = []
+    for ticket in triage_module.iter_tickets(page_size=10):
+        ids.append(ticket["id"])
+        tenant.tickets[ticket["id"]]["status_id"] = 2
+
+    assert ids == [ticket["id"] for ticket in created]
+
+
+def test_tickets_created_while_paging_are_picked_up(triage_module, tenant):
+    created = tenant.add_tickets(new_tickets(15))
+
+    ids = []
+    for ticket in triage_module.iter_tickets(page_size=10):
+        ids.append(ticket["id"])
+        if len(ids) == 1:
+            created += tenant.add_tickets(new_tickets(3))
+
+    assert ids == [ticket["id"] for ticket in created]
+
+
+def test_tenant_ignoring_a_configured_cursor_is_walked_by_page(triage_module, tenant, monkeypatch):
+    created = tenant.add_tickets(new_tickets(25))
+    monkeypatch.setattr(triage_module, "HALO_ID_CURSOR_PARAM", "not_supported")
+
+    ids = [ticket["id"] for ticket in triage_module.iter_tickets(page_size=10)]
+
+    assert ids == [ticket["id"] for ticket in created]
+    assert listing_requests(tenant) == 4  # Page 1, page 1 again (cursor ignored), pages 2 and 3
+
+
+def test_tenant_ignoring_paging_stops_after_one_repeated_page(triage_module, monkeypatch):
+    page = [{"id": ticket_id, "status_id": 1} for ticket_id in range(1, 11)]
+    calls = []
+
+    def same_page(status_id, page_size, page_no, since=None, after_id=None):
+        calls.append(page_no)
+        return page
+
+    monkeypatch.setattr(triage_module, "_fetch_ticket_page", same_page)
+
+    ids = [ticket["id"] for ticket in triage_module.iter_tickets(page_size=10)]
+
+    assert ids == list(range(1, 11))
+    assert calls == [1, 2]
+
+
+def test_failed_page_ends_the_walk_with_what_was_read(triage_module, monkeypatch):
+    first = [{"id": ticket_id, "status_id": 1} for ticket_id in range(1, 11)]
+    monkeypatch.setattr(triage_module, "_fetch_ticket_page",
+                        lambda status_id, page_size, page_no, since=None, after_id=None: first if page_no == 1 else None)
+
+    assert [ticket["id"] for ticket in triage_module.iter_tickets(page_size=10)] == list(range(1, 11))
+
+
+def test_listing_is_rechecked_for_status_and_date(triage_module, monkeypatch):
+    page = [{"id": 1, "status_id": 1, "dateoccurred": "2025-03-01T00:00:00"},
+            {"id": 2, "status_id": 2, "dateoccurred": "2025-03-02T00:00:00"},
+            {"id": 3, "status_id": 1, "dateoccurred": "2025-02-01T00:00:00"}]
+    monkeypatch.setattr(triage_module, "_fetch_ticket_page", lambda *args, **kwargs: page)
+
+    ids = [ticket["id"] for ticket in triage_module.iter_tickets(page_size=10, since="2025-02-15T00:00:00")]
+
+    assert ids == [1]
@@ -0,0 +1,118 @@
+import time
+import pytest
+from conftest import new_tickets
+
+pytest.importorskip("chromadb")
+pytest.importorskip("openai")
+
+RECOMMENDATION = {"status_id": 2, "urgency": "Medium", "requires_human": False, "impact": "Moderate",
+                  "ticket_type": "Incident", "assign_to": "AI bot", "reasoning": "Stored by an earlier run."}
+
+
+def llm_tickets(stubs):
+    with stubs["model"].stats["lock"]:
+        return stubs["model"].stats["tickets"]
+
+
+def checkpoint(work_queue, ticket, state):
+    """Leave ticket in the work queue as a run that stopped after state would have."""
+    work_queue.enqueue(ticket)
+    if state in ("analyzed", "status_written", "note_written"):
+        work_queue.mark_analyzed(ticket["id"], RECOMMENDATION)
+    if state in ("status_written", "note_written"):
+        work_queue.mark_status_written(ticket["id"])
+    if state == "note_written":
+        work_queue.mark_note_written(ticket["id"])
+
+
+def test_triages_every_new_ticket(triage, tenant, stubs):
+    created = tenant.add_tickets(new_tickets(12))
+
+    stats = triage.process_tickets(triage.fetch_tickets())
+
+    ids = {ticket["id"] for ticket in created}
+    assert stats["updated"] == 12 and not stats["failed_ids"]
+    assert set(tenant.status_written) == ids and set(tenant.note_written) == ids
+    assert all(triage.work_queue.state(ticket_id) == "note_written" for ticket_id in ids)
+
+
+@pytest.mark.parametrize("state, analyzes, writes_status, writes_note", [
+    ("fetched", True, True, True),
+    ("analyzed", False, True, True),
+    ("status_written", False, False, True),
+    ("note_written", False, False, False),
+])
+def test_resumes_from_each_work_queue_state(triage, tenant, stubs, state, analyzes, writes_status, writes_note):
+    ticket = tenant.add_tickets(new_tickets(1))[0]
+    checkpoint(triage.work_queue, ticket, state)
+    before = llm_tickets(stubs)
+
+    stats = triage.process_tickets([ticket])
+
+    assert (llm_tickets(stubs) > before) == analyzes
+    assert (ticket["id"] in tenant.status_written) == writes_status
+    assert (ticket["id"] in tenant.note_written) == writes_note
+    assert stats["already_done"] == (state == "note_written")
+    assert stats["resumed"] == (state in ("analyzed", "status_written"))
+    assert triage.work_queue.state(ticket["id"]) == "note_written"
+
+
+def test_resumable_tickets_are_found_after_leaving_new(triage, tenant):
+    ticket = tenant.add_tickets(new_tickets(1))[0]
+    checkpoint(triage.work_queue, ticket, "status_written")
+    tenant.tickets[ticket["id"]]["status_id"] = 2  # Its status write landed before the crash
+
+    stats = triage.process_tickets(triage.resumable_tickets())
+
+    assert stats["resumed"] == 1
+    assert tenant.notes[ticket["id"]]
+
+
+def test_parked_ticket_is_left_for_a_human(triage, tenant, stubs):
+    ticket = tenant.add_tickets(new_tickets(1))[0]
+    checkpoint(triage.work_queue, ticket, "fetched")
+    for _ in range(triage.work_queue.max_attempts):
+        triage.work_queue.mark_failed(ticket["id"], "earlier failure")
+    before = llm_tickets(stubs)
+
+    stats = triage.process_tickets([ticket])
+
+    assert stats["already_done"] == 1
+    assert llm_tickets(stubs) == before and ticket["id"] not in tenant.status_written
+
+
+def halo_time(offset):
+    """A HaloPSA last_update offset seconds from now."""
+    return time.strftime("%Y-%m-%dT%H:%M:%S", time.gmtime(time.time() + offset))
+
+
+def test_finished_ticket_moved_back_to_new_is_triaged_again(triage, tenant, stubs):
+    listed = tenant.add_tickets(new_tickets(1))[0]
+    assert triage.process_tickets([dict(listed)])["updated"] == 1
+    assert triage.process_tickets([dict(listed)])["already_done"] == 1  # A listing from before our writes
+
+    tenant.tickets[listed["id"]].update(status_id=1, last_update=halo_time(60))  # A human moves it back
+    before = llm_tickets(stubs)
+    stats = triage.process_tickets(triage.fetch_tickets())
+
+    assert stats["already_done"] == 0 and stats["updated"] == 1
+    assert llm_tickets(stubs) > before
+
+
+def test_halo_clock_ahead_of_ours_does_not_retriage(triage, tenant, stubs):
+    ticket = tenant.add_tickets(new_tickets(1))[0]
+    ticket = dict(ticket, last_update=halo_time(3600))  # HaloPSA's clock (or timezone) an hour ahead
+    assert triage.process_tickets([ticket])["updated"] == 1
+    before = llm_tickets(stubs)
+
+    assert triage.process_tickets([ticket])["already_done"] == 1
+    assert triage.work_queue.is_finished(ticket) and llm_tickets(stubs) == before
+
+
+def test_confirmed_status_is_stored_in_the_ticket_filter_fields(triage, tenant):
+    ticket = tenant.add_tickets(new_tickets(1))[0]
+
+    triage.process_tickets(triage.fetch_tickets())
+
+    stored = triage.ticket_collection.get(ids=[str(ticket["id"])], include=["metadatas"])["metadatas"][0]
+    assert stored["status_id"] == tenant.tickets[ticket["id"]]["status_id"] != 1
@@ -0,0 +1,61 @@
+from prompt_budget import pack_ticket, count_tokens, TRUNCATION_MARK
+
+
+def test_html_quotes_and_signature_are_stripped():
+    details = ("<div><p>The VPN is down for everyone since 9am.</p><p>Error 809 on connect.</p>"
+               "<p>Thanks,<br>Jane Doe<br>IT Coordinator<br>+1 555 0100</p>"
+               "<p>On Mon, Jan 6, 2025 at 9:00 AM Support wrote:</p><p>&gt; Is the VPN working?</p></div>")
+
+    packed = pack_ticket("VPN down", details)
+
+    assert packed["details"] == "The VPN is down for everyone since 9am.\nError 809 on connect."
+    assert packed["stats"]["html"] and packed["stats"]["quoted_lines"] == 2
+    assert packed["stats"]["signature_lines"] == 4
+
+
+def test_sign_off_in_the_middle_of_the_body_keeps_the_text_after_it():
+    details = ("VPN is down.\nThanks!\nUpdate: it also fails on the office wifi with error 809.\n"
+               "The whole sales team is affected.")
+
+    packed = pack_ticket("VPN down", details)
+
+    assert packed["details"] == ("VPN is down.\nUpdate: it also fails on the office wifi with error 809. "
+                                 "The whole sales team is affected.")
+
+
+def test_signature_ends_at_a_reply_header():
+    details = ("Printer offline again.\n\nRegards,\nSam\n"
+               "-----Original Message-----\nFrom: Support\nPrinter jams are failing the whole floor.")
+
+    packed = pack_ticket("Printer", details)
+
+    assert packed["details"] == "Printer offline again.\nPrinter jams are failing the whole floor."
+    assert packed["stats"]["signature_lines"] == 2
+
+
+def test_mobile_footer_disclaimer_and_repeats_are_dropped():
+    details = ("Outlook crashes on start.\n\nOutlook crashes on start!\n\nSent from my iPhone\n\n"
+               "This email and any attachments are confidential.")
+
+    packed = pack_ticket("Outlook", details)
+
+    assert packed["details"] == "Outlook crashes on start."
+    assert packed["stats"]["duplicate_paragraphs"] == 1
+
+
+def test_paragraphs_over_budget_are_dropped_by_relevance():
+    filler = "\n\n".join(f"Some background about the office move, part {i}." for i in range(40))
+    details = f"Laptop will not boot.\n\n{filler}\n\nBlue screen error CRITICAL_PROCESS_DIED since the update."
+
+    packed = pack_ticket("Laptop", details, budget=60)
+
+    assert packed["tokens"] <= 60 and packed["stats"]["truncated"]
+    assert packed["details"].startswith("Laptop will not boot.")
+    assert packed["details"].endswith("CRITICAL_PROCESS_DIED since the update.")
+
+
+def test_long_opening_paragraph_is_cut_to_fit():
+    packed = pack_ticket("Disk full", "word " * 2000, budget=100, summary_budget=10)
+
+    assert packed["details"].endswith(TRUNCATION_MARK)
+    assert count_tokens(packed["summary"]) + count_tokens(packed["details"]) <= 100
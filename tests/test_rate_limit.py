@@ -0,0 +1,103 @@
+import threading
+import time
+from email.utils import formatdate
+import pytest
+import requests
+import mock_servers
+from rate_limit import RequestScheduler, parse_retry_after
+
+
+class FirstRequestsFail(mock_servers.Faults):
+    """Answer the first count requests with status (429 carries Retry-After), then behave."""
+
+    def __init__(self, count, status=429, retry_after=0.3):
+        super().__init__(retry_after=retry_after)
+        self.remaining, self.status = count, status
+        self._lock = threading.Lock()
+
+    def injected_status(self):
+        with self._lock:
+            if self.remaining <= 0:
+                return None
+            self.remaining -= 1
+            return self.status
+
+
+@pytest.fixture
+def halo():
+    """A private MockHaloPSA on a free port; set halo.tenant.faults to inject failures."""
+    tenant = mock_servers.MockHaloPSA()
+    server = mock_servers.serve(tenant.handler(), 0)
+    yield type("Halo", (), {"tenant": tenant, "url": f"http://{mock_servers.MOCK_HOST}:{server.server_port}"})
+    server.shutdown()
+
+
+@pytest.fixture
+def scheduler():
+    scheduler = RequestScheduler(max_retries=3, base_delay=0.01, max_delay=5)
+    scheduler.add_upstream("halopsa", rate=1000, burst=100, transient_exceptions=(requests.ConnectionError,))
+    return scheduler
+
+
+def test_throttled_call_waits_for_retry_after(halo, scheduler):
+    halo.tenant.faults = FirstRequestsFail(1, retry_after=0.3)
+
+    started = time.monotonic()
+    response = scheduler.call("halopsa", "GET /api/status", lambda: requests.get(f"{halo.url}/api/status"))
+
+    assert response.status_code == 200
+    assert time.monotonic() - started >= 0.3
+    stats = scheduler.stats()["halopsa GET /api/status"]
+    assert (stats["requests"], stats["throttled"], stats["retries"], stats["failures"]) == (2, 1, 1, 0)
+
+
+def test_throttle_pauses_other_callers_of_the_upstream(halo, scheduler):
+    halo.tenant.faults = FirstRequestsFail(1, retry_after=0.5)
+    throttled = threading.Thread(target=scheduler.call, args=(
+        "halopsa", "GET /api/status", lambda: requests.get(f"{halo.url}/api/status")))
+    throttled.start()
+    time.sleep(0.1)
+
+    scheduler.call("halopsa", "GET /api/priority", lambda: requests.get(f"{halo.url}/api/priority"))
+    throttled.join()
+
+    assert scheduler.stats()["halopsa GET /api/priority"]["wait_seconds"] >= 0.3
+
+
+def test_writes_are_retried_on_429_only(halo, scheduler):
+    def post():
+        return requests.post(f"{halo.url}/api/actions", json=[{"ticket_id": 1, "note": "n"}])
+
+    halo.tenant.faults = FirstRequestsFail(1, retry_after=0)
+    assert scheduler.call("halopsa", "POST /api/actions", post, idempotent=False).status_code == 201
+
+    halo.tenant.faults = FirstRequestsFail(1, status=500)
+    assert scheduler.call("halopsa", "POST /api/actions", post, idempotent=False).status_code == 500
+    assert scheduler.stats()["halopsa POST /api/actions"]["requests"] == 3  # 429 retried, 500 not
+
+
+def test_final_error_response_is_returned_after_the_last_retry(halo, scheduler):
+    halo.tenant.faults = FirstRequestsFail(10, status=503)
+
+    response = scheduler.call("halopsa", "GET /api/status", lambda: requests.get(f"{halo.url}/api/status"))
+
+    assert response.status_code == 503
+    stats = scheduler.stats()["halopsa GET /api/status"]
+    assert (stats["requests"], stats["retries"], stats["failures"]) == (4, 3, 1)
+
+
+def test_transient_exception_is_retried_then_raised(scheduler):
+    with pytest.raises(requests.ConnectionError):
+        scheduler.call("halopsa", "GET /api/status", lambda: requests.get("http://127.0.0.1:9/api/status", timeout=1))
+
+    assert scheduler.stats()["halopsa GET /api/status"]["requests"] == 4
+
+
+@pytest.mark.parametrize("value, expected", [
+    ("2", 2.0), ("-1", 0.0), ("", None), ("soon", None), (None, None)])
+def test_parse_retry_after_seconds(value, expected):
+    assert parse_retry_after(value) == expected
+
+
+def test_parse_retry_after_http_date():
+    assert 25 <= parse_retry_after(formatdate(time.time() + 30, usegmt=True)) <= 30
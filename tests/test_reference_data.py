@@ -0,0 +1,45 @@
+import json
+import types
+from reference_data import ReferenceData
+
+
+def html_client():
+    """A HaloPSA client whose every request is answered 200 by a login page instead of the API."""
+    def get(url, headers=None):
+        client.requests += 1
+
+        def json_body():
+            raise ValueError("Expecting value: line 1 column 1 (char 0)")
+        return types.SimpleNamespace(status_code=200, headers={}, text="<html>Sign in</html>", json=json_body)
+    client = types.SimpleNamespace(base_url="http://halo.invalid", get_access_token=lambda: "token", get=get, requests=0)
+    return client
+
+
+def test_tables_are_loaded_once_and_kept_on_disk(triage_module, tenant, tmp_path):
+    path = str(tmp_path / "reference.json")
+    data = ReferenceData(triage_module.halo_client, path=path)
+
+    assert data.resolve_id("statuses", "in progress") == 2
+    assert data.resolve_id("priorities", "High") == 2  # Priorities are keyed by priorityid, not their GUID
+    assert data.resolve_id("agents", "nobody", default=42) == 42
+    assert ReferenceData(triage_module.halo_client, path=path).resolve_id("statuses", "Closed") == 9
+    assert tenant.stats["requests"]["GET /api/status"] == 1
+
+
+def test_non_json_answer_keeps_the_cached_rows(tmp_path):
+    path = tmp_path / "reference.json"
+    path.write_text(json.dumps({"agents": {"rows": [{"id": 42, "name": "AI Support Bot"}], "etag": None,
+                                           "fetched_at": 0}}))  # Stale, so it is refreshed on first use
+    client = html_client()
+    data = ReferenceData(client, path=str(path), ttl=3600)
+
+    assert data.resolve_id("agents", "AI Support Bot") == 42
+    assert data.resolve_id("agents", "ai support bot") == 42
+    assert client.requests == 1  # Retried after REFERENCE_RETRY_SECONDS, not on every lookup
+
+
+def test_non_json_answer_without_a_cache_trusts_numeric_ids(tmp_path):
+    data = ReferenceData(html_client(), path=str(tmp_path / "reference.json"))
+
+    assert data.resolve_id("statuses", "2") == 2
+    assert data.resolve_id("statuses", "In Progress") is None
@@ -0,0 +1,88 @@
+import os
+import time
+import pytest
+from conftest import new_tickets
+
+chromadb = pytest.importorskip("chromadb")
+pytest.importorskip("openai")
+
+from benchmark import use_hash_embedder  # noqa: E402
+import sharded_triage  # noqa: E402
+
+
+@pytest.fixture
+def main_store(triage, tmp_path, monkeypatch):
+    """Point the main ChromaDB at a scratch directory for a sharded run."""
+    monkeypatch.setattr(triage, "CHROMA_PATH", str(tmp_path / "chroma_db"))
+    yield triage.CHROMA_PATH
+    triage.chroma_client = None  # Merging drops ChromaDB's cached clients; reopen on next use
+
+
+def stored_ids(path, collection="tickets"):
+    client = chromadb.PersistentClient(path=path)
+    try:
+        return {int(ticket_id) for ticket_id in client.get_collection(collection).get(include=[])["ids"]}
+    finally:
+        client.clear_system_cache()
+
+
+def test_shard_runs_are_merged_into_the_main_state(triage, tenant, main_store, tmp_path, capsys):
+    state_dir = str(tmp_path / "shards")
+    created = tenant.add_tickets(new_tickets(9))
+
+    totals = sharded_triage.run_sharded(2, state_dir, quiet=True, setup=use_hash_embedder)
+
+    ids = {ticket["id"] for ticket in created}
+    assert totals["updated"] == 9 and not totals["failed_ids"]
+    assert set(tenant.note_written) == ids
+    assert all(triage.work_queue.state(ticket_id) == "note_written" for ticket_id in ids)
+    assert stored_ids(main_store) == ids
+    assert "Seeded shard store(s) 1, 2" in capsys.readouterr().out
+    for index in range(2):
+        environment = sharded_triage.shard_environment(index, 2, state_dir)
+        assert not os.path.exists(environment["WORK_QUEUE_FILE"])
+        assert not os.path.exists(environment["RAW_TICKET_STORE_FILE"])
+        assert os.path.isdir(environment["CHROMA_PATH"])  # Kept for the next run
+
+    more = tenant.add_tickets(new_tickets(4))
+    totals = sharded_triage.run_sharded(2, state_dir, quiet=True, setup=use_hash_embedder)
+
+    assert totals["updated"] == 4
+    assert "Seeded" not in capsys.readouterr().out
+    assert stored_ids(main_store) == ids | {ticket["id"] for ticket in more}
+
+
+def test_finished_tickets_are_not_dispatched_again(triage, tenant, main_store, tmp_path):
+    state_dir = str(tmp_path / "shards")
+    created = tenant.add_tickets(new_tickets(4))
+    sharded_triage.run_sharded(2, state_dir, quiet=True, setup=use_hash_embedder)
+    for ticket in created:
+        tenant.tickets[ticket["id"]]["status_id"] = 1  # Still listed as 'New', but unchanged since it was written
+        tenant.tickets[ticket["id"]]["last_update"] = ticket["dateoccurred"]
+
+    totals = sharded_triage.run_sharded(2, state_dir, quiet=True, setup=use_hash_embedder)
+
+    assert totals["already_done"] == 4 and totals["updated"] == 0
+
+    moved = tenant.tickets[created[0]["id"]]  # A human moves one back to 'New' after our writes
+    moved["last_update"] = time.strftime("%Y-%m-%dT%H:%M:%S", time.gmtime(time.time() + 60))
+    totals = sharded_triage.run_sharded(2, state_dir, quiet=True, setup=use_hash_embedder)
+
+    assert totals["already_done"] == 3 and totals["updated"] == 1
+
+
+def test_existing_shard_store_only_takes_changed_records(triage, main_store, tmp_path):
+    main_path, environment = str(tmp_path / "main"), sharded_triage.shard_environment(0, 1, str(tmp_path / "shards"))
+    main = chromadb.PersistentClient(path=main_path).get_or_create_collection("tickets", embedding_function=None)
+    main.add(ids=["1"], embeddings=[[0.1, 0.2]], documents=["first"], metadatas=[{"status_id": 1}])
+
+    assert sharded_triage.sync_shard_store(environment, main_path, triage.work_queue, 100.0) == (True, 0)
+    assert stored_ids(environment["CHROMA_PATH"]) == {1}
+
+    main = chromadb.PersistentClient(path=main_path).get_or_create_collection("tickets", embedding_function=None)
+    main.add(ids=["2", "3"], embeddings=[[0.3, 0.4], [0.5, 0.6]], documents=["second", "third"],
+             metadatas=[{"status_id": 1}, {"status_id": 1}])
+    triage.work_queue.enqueue({"id": 2, "status_id": 1})  # Only ticket 2 was triaged since the last sync
+
+    assert sharded_triage.sync_shard_store(environment, main_path, triage.work_queue, 200.0) == (False, 1)
+    assert stored_ids(environment["CHROMA_PATH"]) == {1, 2}
@@ -0,0 +1,68 @@
+import threading
+import time
+import pytest
+import requests
+from halo_client import TokenProvider, TOKEN_SAFETY_MARGIN
+
+
+def token_requests(tenant):
+    with tenant.stats["lock"]:
+        return tenant.stats["requests"].get("POST /auth/token", 0)
+
+
+@pytest.fixture
+def fetch_token(stubs, tenant):
+    """Fetch a token from the mock tenant, slowly enough that concurrent callers overlap. lifetime overrides expires_in."""
+    def fetch(lifetime=None):
+        time.sleep(0.2)
+        body = requests.post(f"{stubs['halo_url']}/auth/token", data={"grant_type": "client_credentials"}).json()
+        return body["access_token"], lifetime or body["expires_in"]
+    return fetch
+
+
+def test_concurrent_callers_share_one_token_request(fetch_token, tenant, tmp_path):
+    provider = TokenProvider(fetch_token, "tenant|client", cache_path=str(tmp_path / "token.json"))
+    tokens = []
+    threads = [threading.Thread(target=lambda: tokens.append(provider.get_token())) for _ in range(20)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert len(tokens) == 20 and len(set(tokens)) == 1
+    assert token_requests(tenant) == 1
+
+
+def test_new_process_reuses_the_cached_token(fetch_token, tenant, tmp_path):
+    cache = str(tmp_path / "token.json")
+    token = TokenProvider(fetch_token, "tenant|client", cache_path=cache).get_token()
+
+    assert TokenProvider(fetch_token, "tenant|client", cache_path=cache).get_token() == token
+    assert TokenProvider(fetch_token, "tenant|other", cache_path=cache).get_token() != token
+    assert token_requests(tenant) == 2
+
+
+def test_forgotten_token_is_read_back_from_the_cache(fetch_token, tenant, tmp_path):
+    provider = TokenProvider(fetch_token, "tenant|client", cache_path=str(tmp_path / "token.json"))
+    token = provider.get_token()
+
+    provider.forget()
+
+    assert provider.get_token() == token and token_requests(tenant) == 1
+
+
+def test_token_near_expiry_is_refreshed_in_the_background(fetch_token, tenant):
+    lifetime = TOKEN_SAFETY_MARGIN + 2  # Usable for 2s, refreshed after 1s
+    provider = TokenProvider(lambda: fetch_token(lifetime), "tenant|client", cache_path=None)
+    first = provider.get_token()
+    time.sleep(1.1)
+
+    started = time.monotonic()
+    assert all(provider.get_token() == first for _ in range(50))  # Nobody waits for the refresh
+    assert time.monotonic() - started < 0.1
+
+    deadline = time.monotonic() + 5
+    while provider.get_token() == first and time.monotonic() < deadline:
+        time.sleep(0.05)
+    assert provider.get_token() != first
+    assert token_requests(tenant) == 2
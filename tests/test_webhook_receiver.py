@@ -0,0 +1,58 @@
+import asyncio
+import types
+import pytest
+import webhook_receiver
+
+
+class NullMetrics:
+    def inc(self, *args, **kwargs):
+        pass
+
+
+@pytest.fixture
+def receiver():
+    triage = types.SimpleNamespace(metrics=NullMetrics(), NEW_STATUS_ID=1)
+    return webhook_receiver.WebhookReceiver(triage, "secret", host="127.0.0.1", port=0, read_timeout=0.3)
+
+
+def ticket(ticket_id):
+    return {"id": ticket_id, "status_id": 1, "last_update": "2025-03-01T09:00:00",
+            "summary": "VPN drops", "details": "Since this morning."}
+
+
+def test_reconcile_leaves_queued_tickets_alone_until_they_finish(receiver):
+    assert receiver.accept(ticket(7), "webhook") == "accepted"
+    assert receiver.accept(ticket(7), "webhook") == "duplicate"
+    assert receiver.accept(ticket(7), "reconcile") == "in_flight"
+
+    receiver._finished(7)
+
+    assert receiver.accept(ticket(7), "reconcile") == "requeued"
+    assert receiver.inbox.qsize() == 2
+
+
+def test_ticket_no_longer_new_is_ignored(receiver):
+    assert receiver.accept(dict(ticket(8), status_id=2), "reconcile") == "ignored"
+    assert receiver.inbox.empty()
+
+
+@pytest.mark.parametrize("request_bytes, status", [
+    (b"GET /healthz HTTP/1.1\r\nX-Long: " + b"a" * 70000 + b"\r\n\r\n", b"431"),
+    (b"GET /healthz HTTP/1.1\r\n", b"408"),  # Head never finished
+    (b"POST /halo/webhook HTTP/1.1\r\nContent-Length: 10\r\n\r\nab", b"408"),  # Body shorter than announced
+    (b"GET /healthz HTTP/1.1\r\n\r\n", b"200"),
+])
+def test_malformed_or_stalled_requests_are_answered(receiver, request_bytes, status):
+    async def exchange():
+        server = await asyncio.start_server(receiver._handle, "127.0.0.1", 0)
+        try:
+            reader, writer = await asyncio.open_connection("127.0.0.1", server.sockets[0].getsockname()[1])
+            writer.write(request_bytes)
+            await writer.drain()
+            line = await asyncio.wait_for(reader.readline(), 5)
+            writer.close()
+            return line
+        finally:
+            server.close()
+
+    assert asyncio.run(exchange()).split()[1] == status
@@ -0,0 +1,95 @@
+import threading
+import time
+import pytest
+import mock_servers
+from conftest import new_tickets
+from write_buffer import HaloWriteBuffer
+
+
+class FailRequests(mock_servers.Faults):
+    """Answer the given request numbers (1-based, counted from when it is set) with a 500."""
+
+    def __init__(self, failing):
+        super().__init__()
+        self.failing, self.seen = set(failing), 0
+        self._lock = threading.Lock()
+
+    def injected_status(self):
+        with self._lock:
+            self.seen += 1
+            return 500 if self.seen in self.failing else None
+
+
+@pytest.fixture
+def written(triage, tenant):
+    """Tickets on the tenant with their status and note items, and a buffer writing them through HaloPSA."""
+    tickets = tenant.add_tickets(new_tickets(4))
+    items = {ticket["id"]: (triage.build_status_payload(ticket["id"], 2),
+                            triage.build_note_payload(ticket["id"], "AI bot", "Looks like a VPN issue."))
+             for ticket in tickets}  # Built up front, so agent lookups are not among the requests counted below
+    results, statuses = {}, []
+    buffer = HaloWriteBuffer(triage.write_status_batch, triage.write_note_batch,
+                             lambda ticket_id, ok: results.setdefault(ticket_id, ok), max_items=100, max_wait=0.05,
+                             on_status_written=lambda ticket_id, status_item: statuses.append(ticket_id))
+    return type("Written", (), {"items": items, "results": results, "statuses": statuses, "buffer": buffer})
+
+
+def test_statuses_and_notes_go_out_as_one_post_each(written, tenant):
+    for ticket_id, (status_item, note_item) in written.items.items():
+        written.buffer.add(ticket_id, status_item, note_item)
+    written.buffer.close()
+
+    assert written.results == {ticket_id: True for ticket_id in written.items}
+    assert sorted(written.statuses) == sorted(written.items)
+    assert tenant.stats["requests"]["POST /api/tickets"] == 1
+    assert tenant.stats["requests"]["POST /api/actions"] == 1
+
+
+def test_failed_note_post_is_retried_on_the_next_flush(written, tenant, monkeypatch):
+    monkeypatch.setattr(tenant, "faults", FailRequests({2}))  # Status POST goes through, the note POST fails
+    for ticket_id, (status_item, note_item) in written.items.items():
+        written.buffer.add(ticket_id, status_item, note_item)
+    written.buffer.close()
+
+    assert written.results == {ticket_id: True for ticket_id in written.items}
+    assert written.buffer.stats()["retried_items"] == len(written.items)
+    assert tenant.stats["requests"]["POST /api/tickets"] == 1  # Confirmed statuses are not sent again
+    assert all(len(tenant.notes[ticket_id]) == 1 for ticket_id in written.items)
+
+
+def test_ticket_is_failed_after_max_attempts(written, tenant, monkeypatch):
+    monkeypatch.setattr(tenant, "faults", FailRequests(range(2, 100)))
+    ticket_id, (status_item, note_item) = next(iter(written.items.items()))
+    written.buffer.add(ticket_id, status_item, note_item)
+    written.buffer.close()
+
+    assert written.results == {ticket_id: False}
+    assert written.statuses == [ticket_id] and ticket_id not in tenant.notes
+    assert tenant.stats["requests"]["POST /api/actions"] == written.buffer.max_attempts
+
+
+def test_unconfirmed_items_fail_alone(written, tenant, triage):
+    written.buffer.max_attempts = 1
+    for ticket_id, (status_item, note_item) in written.items.items():
+        written.buffer.add(ticket_id, status_item, note_item)
+    written.buffer.add(999999, triage.build_status_payload(999999, 2), triage.build_note_payload(999999, "AI bot", "x"))
+    written.buffer.close()
+
+    assert written.results.pop(999999) is False  # HaloPSA never echoed it back
+    assert written.results == {ticket_id: True for ticket_id in written.items}
+
+
+def test_note_can_follow_its_status_or_be_abandoned(written, tenant):
+    (kept, (kept_status, kept_note)), (dropped, (dropped_status, _)) = list(written.items.items())[:2]
+    written.buffer.add(kept, kept_status, None)
+    written.buffer.add(dropped, dropped_status, None)
+    deadline = time.monotonic() + 5
+    while len(written.statuses) < 2 and time.monotonic() < deadline:
+        time.sleep(0.01)  # The timer flushes both statuses without waiting for the notes
+    written.buffer.add_note(kept, kept_note)
+    written.buffer.abandon(dropped)
+    written.buffer.close()
+
+    assert written.results == {kept: True, dropped: False}
+    assert set(written.statuses) == {kept, dropped}
+    assert kept in tenant.notes and dropped not in tenant.notes
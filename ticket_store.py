@@ -0,0 +1,237 @@
+import os
+import json
+import time
+import zlib
+import sqlite3
+import argparse
+import threading
+from datetime import datetime, timezone
+
+# ⚙️ Ticket Store Settings
+RAW_TICKET_STORE_ENABLED = os.getenv("RAW_TICKET_STORE_ENABLED", "1") == "1"  # Keep the full HaloPSA JSON beside ChromaDB
+RAW_TICKET_STORE_FILE = os.getenv("RAW_TICKET_STORE_FILE", "./ticket_raw.db")  # SQLite file of compressed raw tickets
+RAW_TICKET_COMPRESSION_LEVEL = int(os.getenv("RAW_TICKET_COMPRESSION_LEVEL", "6"))  # zlib level, 1 (fast) to 9 (small)
+MIGRATION_BATCH_SIZE = 500  # Records read and rewritten per ChromaDB call during migration
+
+# Flat scalar fields kept as ChromaDB metadata, for filtering only; dateoccurred is stored as epoch seconds
+TICKET_METADATA_FIELDS = ("client_id", "site_id", "status_id", "priority_id", "sla_id", "dateoccurred")
+TRIAGE_METADATA_PREFIX = "triage"  # triage_* labels and triaged_at, written by the local classifier
+
+
+# 🔹 FUNCTION: PARSE HALOPSA DATE
+def halo_epoch(value):
+    """Convert a HaloPSA timestamp ("2025-03-05T00:18:03.347", UTC) to epoch seconds, or None."""
+    if isinstance(value, (int, float)) and not isinstance(value, bool):
+        return float(value)
+    if not value:
+        return None
+    try:
+        parsed = datetime.fromisoformat(str(value).replace("Z", "+00:00"))
+    except ValueError:
+        return None
+    if parsed.tzinfo is None:
+        parsed = parsed.replace(tzinfo=timezone.utc)
+    return parsed.timestamp()
+
+
+# 🔹 FUNCTION: TICKET METADATA
+def ticket_metadata(ticket):
+    """Project a HaloPSA ticket onto the compact ChromaDB metadata schema, omitting missing fields."""
+    metadata = {}
+    for field in TICKET_METADATA_FIELDS:
+        value = ticket.get(field)
+        if field == "dateoccurred":
+            value = halo_epoch(value)
+        elif value is not None and not isinstance(value, bool):
+            try:
+                value = int(value)
+            except (TypeError, ValueError):
+                value = None
+        if value is not None:
+            metadata[field] = value
+    return metadata
+
+
+def is_compact(metadata):
+    """True if a stored metadata record already follows the compact schema."""
+    extra = [key for key in metadata if key not in TICKET_METADATA_FIELDS and not key.startswith(TRIAGE_METADATA_PREFIX)]
+    return not extra and not isinstance(metadata.get("dateoccurred"), str)
+
+
+class RawTicketStore:
+    """zlib-compressed HaloPSA ticket JSON in SQLite, keyed by ticket ID.
+
+    ChromaDB keeps only the compact filter fields; this holds everything else for debugging,
+    re-projection and later reprocessing.
+    """
+
+    def __init__(self, path=RAW_TICKET_STORE_FILE, level=RAW_TICKET_COMPRESSION_LEVEL):
+        self.level = level
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute("PRAGMA synchronous=NORMAL")
+        self._db.execute("""
+            CREATE TABLE IF NOT EXISTS raw_tickets (
+                ticket_id TEXT PRIMARY KEY,
+                data BLOB NOT NULL,
+                raw_bytes INTEGER NOT NULL,
+                stored_at REAL NOT NULL
+            )""")
+
+    # 🔹 FUNCTION: PUT MANY
+    def put_many(self, tickets):
+        """Store (or replace) the raw JSON of each ticket in one transaction."""
+        rows = []
+        for ticket in tickets:
+            raw = json.dumps(ticket, separators=(",", ":")).encode()
+            rows.append((str(ticket["id"]), zlib.compress(raw, self.level), len(raw), time.time()))
+        with self._lock:
+            self._db.execute("BEGIN")
+            self._db.executemany("INSERT OR REPLACE INTO raw_tickets (ticket_id, data, raw_bytes, stored_at) "
+                                 "VALUES (?, ?, ?, ?)", rows)
+            self._db.execute("COMMIT")
+
+    # 🔹 FUNCTION: GET
+    def get(self, ticket_id):
+        """Return the stored raw ticket, or None."""
+        with self._lock:
+            row = self._db.execute("SELECT data FROM raw_tickets WHERE ticket_id = ?", (str(ticket_id),)).fetchone()
+        return json.loads(zlib.decompress(row[0])) if row else None
+
+    def merge_from(self, path):
+        """Copy in the tickets of another raw store file (a shard's), keeping the newer copy of each."""
+        with self._lock:
+            self._db.execute("ATTACH DATABASE ? AS other", (path,))
+            try:
+                self._db.execute("""
+                    INSERT OR REPLACE INTO raw_tickets (ticket_id, data, raw_bytes, stored_at)
+                    SELECT ticket_id, data, raw_bytes, stored_at FROM other.raw_tickets AS theirs
+                    WHERE NOT EXISTS (SELECT 1 FROM main.raw_tickets AS ours
+                                      WHERE ours.ticket_id = theirs.ticket_id AND ours.stored_at >= theirs.stored_at)""")
+            finally:
+                self._db.execute("DETACH DATABASE other")
+
+    def stats(self):
+        with self._lock:
+            count, stored, raw = self._db.execute(
+                "SELECT COUNT(*), COALESCE(SUM(LENGTH(data)), 0), COALESCE(SUM(raw_bytes), 0) FROM raw_tickets").fetchone()
+        return {"tickets": count, "compressed_bytes": stored, "raw_bytes": raw,
+                "compression_ratio": round(raw / stored, 2) if stored else 0.0}
+
+
+# 🔹 FUNCTION: MIGRATE COLLECTION
+def migrate_collection(collection, raw_store=None, batch_size=MIGRATION_BATCH_SIZE):
+    """Rewrite full-ticket metadata in a ChromaDB collection to the compact schema, in place.
+
+    Embeddings and documents are untouched, and triage_* labels are kept. Dropped fields are
+    deleted by updating them to None. With raw_store, the old metadata is saved there first,
+    so nothing is lost. Safe to re-run: compact records are skipped. Returns counts.
+    """
+    counts = {"scanned": 0, "migrated": 0}
+    offset = 0
+    while True:
+        page = collection.get(include=["metadatas"], limit=batch_size, offset=offset)
+        if not page["ids"]:
+            break
+        offset += len(page["ids"])
+        counts["scanned"] += len(page["ids"])
+
+        ids, metadatas, raw_tickets = [], [], []
+        for ticket_id, metadata in zip(page["ids"], page["metadatas"]):
+            metadata = metadata or {}
+            if is_compact(metadata):
+                continue
+            raw = {key: value for key, value in metadata.items() if not key.startswith(TRIAGE_METADATA_PREFIX)}
+            raw.setdefault("id", ticket_id)
+            compact = ticket_metadata(raw)
+            ids.append(ticket_id)
+            metadatas.append({**{key: None for key in raw if key not in compact and key in metadata}, **compact})
+            raw_tickets.append(raw)
+
+        if ids:
+            if raw_store is not None:
+                raw_store.put_many(raw_tickets)
+            collection.update(ids=ids, metadatas=metadatas)
+            counts["migrated"] += len(ids)
+    return counts
+
+
+# 🔹 FUNCTION: MEASURE COLLECTION
+def measure_collection(collection, path=None, probes=20, batch_size=MIGRATION_BATCH_SIZE):
+    """Report metadata size, on-disk size and filtered read/query latency for a ChromaDB collection."""
+    report = {"records": 0, "metadata_bytes": 0, "metadata_keys": 0,
+              "disk_bytes": directory_size(path) if path else None}
+    client_ids = set()
+    offset = 0
+    while True:
+        page = collection.get(include=["metadatas"], limit=batch_size, offset=offset)
+        if not page["ids"]:
+            break
+        offset += len(page["ids"])
+        for metadata in page["metadatas"]:
+            metadata = metadata or {}
+            report["records"] += 1
+            report["metadata_bytes"] += len(json.dumps(metadata))
+            report["metadata_keys"] += len(metadata)
+            if isinstance(metadata.get("client_id"), int):
+                client_ids.add(metadata["client_id"])
+    report["metadata_bytes_per_record"] = round(report["metadata_bytes"] / report["records"], 1) if report["records"] else 0.0
+    if not client_ids:
+        return report
+
+    client_ids = sorted(client_ids)
+    embeddings = collection.get(include=["embeddings"], limit=probes)["embeddings"]
+    get_seconds, query_seconds = [], []
+    for probe in range(probes):
+        where = {"client_id": client_ids[probe % len(client_ids)]}
+        started = time.perf_counter()
+        collection.get(where=where, include=["metadatas"])
+        get_seconds.append(time.perf_counter() - started)
+
+        started = time.perf_counter()
+        collection.query(query_embeddings=[embeddings[probe % len(embeddings)]], n_results=10,
+                         where=where, include=["metadatas", "distances"])
+        query_seconds.append(time.perf_counter() - started)
+    report["filtered_get_ms"] = round(sorted(get_seconds)[len(get_seconds) // 2] * 1000, 2)
+    report["filtered_query_ms"] = round(sorted(query_seconds)[len(query_seconds) // 2] * 1000, 2)
+    return report
+
+
+def directory_size(path):
+    return sum(os.path.getsize(os.path.join(root, name)) for root, _, names in os.walk(path) for name in names)
+
+
+def print_migration_report(before, after, counts, raw_stats=None):
+    print(f"🗜️ Migrated {counts['migrated']}/{counts['scanned']} ticket record(s) to compact metadata.")
+    for key, label in (("metadata_bytes_per_record", "Metadata bytes per record"), ("metadata_keys", "Metadata keys"),
+                       ("disk_bytes", "ChromaDB directory bytes"), ("filtered_get_ms", "Filtered get p50 (ms)"),
+                       ("filtered_query_ms", "Filtered query p50 (ms)")):
+        if before.get(key) is not None and after.get(key) is not None:
+            change = f" ({after[key] / before[key] - 1:+.0%})" if before[key] else ""
+            print(f"   {label}: {before[key]} -> {after[key]}{change}")
+    if raw_stats:
+        print(f"📦 Raw ticket store: {raw_stats['tickets']} ticket(s), {raw_stats['raw_bytes']} bytes compressed to "
+              f"{raw_stats['compressed_bytes']} ({raw_stats['compression_ratio']}x).")
+    print("ℹ️ SQLite does not shrink files in place; run `chroma vacuum --path <chroma dir>` to reclaim disk space.")
+
+
+# 🔹 MAIN EXECUTION
+if __name__ == "__main__":
+    import chromadb
+
+    parser = argparse.ArgumentParser(description="Migrate the ChromaDB tickets collection to compact metadata.")
+    parser.add_argument("--chroma-path", default="./chroma_db", help="ChromaDB persistent directory")
+    parser.add_argument("--collection", default="tickets", help="collection to migrate")
+    parser.add_argument("--no-raw", action="store_true", help="drop the full ticket JSON instead of keeping it in the raw store")
+    parser.add_argument("--raw-store", default=RAW_TICKET_STORE_FILE, help="SQLite file for the compressed raw tickets")
+    parser.add_argument("--batch-size", type=int, default=MIGRATION_BATCH_SIZE)
+    args = parser.parse_args()
+
+    collection = chromadb.PersistentClient(path=args.chroma_path).get_collection(args.collection)
+    raw_store = None if args.no_raw else RawTicketStore(args.raw_store)
+
+    before = measure_collection(collection, args.chroma_path)
+    counts = migrate_collection(collection, raw_store, batch_size=args.batch_size)
+    after = measure_collection(collection, args.chroma_path)
+    print_migration_report(before, after, counts, raw_store.stats() if raw_store else None)
@@ -0,0 +1,85 @@
+import os
+import json
+import time
+import difflib
+import threading
+
+# ⚙️ Triage Cache Settings
+TRIAGE_CACHE_SIMILARITY = float(os.getenv("TRIAGE_CACHE_SIMILARITY", "0.95"))  # Minimum cosine similarity to reuse a decision
+TRIAGE_CACHE_MIN_TEXT_RATIO = float(os.getenv("TRIAGE_CACHE_MIN_TEXT_RATIO", "0.6"))  # Minimum difflib ratio between the two tickets' text
+TRIAGE_CACHE_NEIGHBOURS = int(os.getenv("TRIAGE_CACHE_NEIGHBOURS", "3"))  # Nearest neighbours inspected per lookup
+
+
+class TriageCache:
+    """Reuse AI triage decisions for near-duplicate tickets.
+
+    Each AI decision is stored as JSON metadata next to the ticket's embedding in a
+    dedicated ChromaDB collection. A new ticket reuses the nearest prior decision when
+    both its embedding similarity and its difflib text ratio pass the thresholds.
+    """
+
+    def __init__(self, chroma_client, collection_name="triage_decisions",
+                 similarity=TRIAGE_CACHE_SIMILARITY, min_text_ratio=TRIAGE_CACHE_MIN_TEXT_RATIO,
+                 neighbours=TRIAGE_CACHE_NEIGHBOURS):
+        self.collection = chroma_client.get_or_create_collection(
+            collection_name, embedding_function=None, metadata={"hnsw:space": "cosine"})
+        self.similarity = similarity
+        self.min_text_ratio = min_text_ratio
+        self.neighbours = neighbours
+        self._lock = threading.Lock()
+        self._stats = {"lookups": 0, "hits": 0, "lookup_seconds": 0.0}
+
+    # 🔹 FUNCTION: LOOKUP
+    def lookup(self, document, embedding):
+        """Return an adapted copy of the closest prior decision, or None on a miss."""
+        started = time.perf_counter()
+        decision = None
+
+        if self.collection.count():
+            results = self.collection.query(query_embeddings=[embedding], n_results=self.neighbours,
+                                            include=["metadatas", "documents", "distances"])
+            for metadata, cached_document, distance in zip(results["metadatas"][0], results["documents"][0],
+                                                           results["distances"][0]):
+                similarity = 1 - distance
+                if similarity < self.similarity:
+                    break
+                text_ratio = difflib.SequenceMatcher(None, document, cached_document).ratio()
+                if text_ratio < self.min_text_ratio:
+                    continue
+
+                decision = json.loads(metadata["decision"])
+                decision["reasoning"] = (f"Reused triage from Ticket #{metadata['ticket_id']} "
+                                         f"(similarity {similarity:.2f}).\n{decision.get('reasoning', '')}")
+                break
+
+        with self._lock:
+            self._stats["lookups"] += 1
+            self._stats["hits"] += decision is not None
+            self._stats["lookup_seconds"] += time.perf_counter() - started
+
+        return decision
+
+    # 🔹 FUNCTION: STORE
+    def store(self, ticket_id, document, embedding, decision):
+        """Remember a fresh AI decision for future lookups."""
+        self.collection.upsert(
+            ids=[str(ticket_id)],
+            embeddings=[embedding],
+            documents=[document],
+            metadatas=[{"ticket_id": str(ticket_id), "decision": json.dumps(decision), "stored_at": time.time()}]
+        )
+
+    # 🔹 FUNCTION: STATS
+    def stats(self, llm_calls=0, llm_seconds=0.0, llm_cost=0.0):
+        """Report hit rate plus the cost and latency saved, priced at the observed per-call LLM averages."""
+        with self._lock:
+            stats = dict(self._stats)
+
+        avg_seconds = llm_seconds / llm_calls if llm_calls else 0.0
+        avg_cost = llm_cost / llm_calls if llm_calls else 0.0
+        avg_lookup = stats["lookup_seconds"] / stats["lookups"] if stats["lookups"] else 0.0
+
+        stats["hit_rate"] = stats["hits"] / stats["lookups"] if stats["lookups"] else 0.0
+        stats["cost_saved"] = stats["hits"] * avg_cost
+        stats["seconds_saved"] = stats["hits"] * max(0.0, avg_seconds - avg_lookup)
+        return stats
@@ -0,0 +1,338 @@
+import os
+import sys
+import hmac
+import json
+import queue
+import base64
+import asyncio
+import functools
+import argparse
+import itertools
+import threading
+from collections import OrderedDict
+
+# ⚙️ Webhook Receiver Settings
+WEBHOOK_HOST = os.getenv("WEBHOOK_HOST", "0.0.0.0")  # Interface HaloPSA delivers webhooks to
+WEBHOOK_PORT = int(os.getenv("WEBHOOK_PORT", "8080"))
+WEBHOOK_PATH = os.getenv("WEBHOOK_PATH", "/halo/webhook")
+WEBHOOK_SECRET = os.getenv("WEBHOOK_SECRET")  # Shared secret configured on the HaloPSA webhook
+WEBHOOK_SECRET_HEADER = os.getenv("WEBHOOK_SECRET_HEADER", "X-Webhook-Secret")  # Or send it as the Basic auth password
+WEBHOOK_MAX_BODY = int(os.getenv("WEBHOOK_MAX_BODY", str(1024 * 1024)))  # Bytes; larger deliveries are rejected
+WEBHOOK_READ_TIMEOUT = float(os.getenv("WEBHOOK_READ_TIMEOUT", "10"))  # Seconds to send the headers, and again the body
+WEBHOOK_DEDUPE_SIZE = int(os.getenv("WEBHOOK_DEDUPE_SIZE", "50000"))  # (ticket id, timestamp) pairs remembered
+RECONCILE_INTERVAL = float(os.getenv("RECONCILE_INTERVAL", "900"))  # Seconds between catch-up polls for missed events
+
+
+class EventDeduplicator:
+    """Bounded memory of (ticket id, timestamp) pairs, so redelivered webhooks are accepted only once.
+
+    Events without a timestamp cannot be told apart from a later update of the same ticket, so
+    they are never treated as duplicates (thin deliveries are checked again once fetched).
+    """
+
+    def __init__(self, size=WEBHOOK_DEDUPE_SIZE):
+        self.size = size
+        self._seen = OrderedDict()
+        self._lock = threading.Lock()
+
+    def first_time(self, ticket):
+        """True the first time this version of the ticket is seen, or when it carries no timestamp."""
+        version = ticket.get("last_update") or ticket.get("dateoccurred")
+        if not version:
+            return True
+        key = (str(ticket["id"]), str(version))
+        with self._lock:
+            if key in self._seen:
+                self._seen.move_to_end(key)
+                return False
+            self._seen[key] = None
+            if len(self._seen) > self.size:
+                self._seen.popitem(last=False)
+            return True
+
+
+# 🔹 FUNCTION: VERIFY SECRET
+def is_authorized(headers, secret):
+    """Check the shared secret in the configured header or as the HTTP Basic auth password."""
+    supplied = headers.get(WEBHOOK_SECRET_HEADER.lower())
+    authorization = headers.get("authorization", "")
+    if supplied is None and authorization.lower().startswith("basic "):
+        try:
+            supplied = base64.b64decode(authorization[6:]).decode().partition(":")[2]
+        except ValueError:
+            return False
+    elif supplied is None and authorization.lower().startswith("bearer "):
+        supplied = authorization[7:]
+    return supplied is not None and hmac.compare_digest(supplied.encode(), secret.encode())
+
+
+def tickets_in(payload):
+    """Extract ticket records from a webhook body: one ticket, a list, or {"ticket(s)": ...}."""
+    if isinstance(payload, dict):
+        payload = payload.get("tickets", payload.get("ticket", payload))
+    records = payload if isinstance(payload, list) else [payload]
+    return [record for record in records if isinstance(record, dict) and record.get("id") is not None]
+
+
+class WebhookReceiver:
+    """Embedded asyncio HTTP receiver for HaloPSA ticket-created and ticket-updated webhooks.
+
+    Accepted tickets go straight into one long-running process_tickets() pipeline, stored in
+    ChromaDB in whatever burst has arrived rather than a full page. Events are acknowledged with
+    202 as soon as they are queued. A reconciliation poll of 'New' tickets every
+    reconcile_interval seconds catches events HaloPSA never delivered and retries tickets whose
+    triage failed. It leaves tickets already queued or in flight alone, so it never competes with
+    webhook-driven work; the work queue parks repeat failures.
+    """
+
+    def __init__(self, triage, secret, host=WEBHOOK_HOST, port=WEBHOOK_PORT, path=WEBHOOK_PATH,
+                 reconcile_interval=RECONCILE_INTERVAL, read_timeout=WEBHOOK_READ_TIMEOUT):
+        if not secret:
+            raise ValueError("WEBHOOK_SECRET must be set so deliveries can be verified")
+        self.triage = triage
+        self.secret = secret
+        self.host = host
+        self.port = port
+        self.path = path
+        self.reconcile_interval = reconcile_interval
+        self.read_timeout = read_timeout
+        self.deduplicator = EventDeduplicator()
+        self.inbox = queue.Queue()
+        self._queued = set()  # Ids queued or in the pipeline, until process_tickets() finishes them
+        self._queued_lock = threading.Lock()
+        self.stats = {"pipeline": None}
+        self._server = None
+
+    # 🔹 FUNCTION: ACCEPT
+    def accept(self, ticket, source):
+        """Queue a ticket for triage unless it is a redelivered webhook or no longer 'New'. Returns the outcome.
+
+        Reconciliation is not deduplicated: a ticket it finds still 'New' after an earlier attempt
+        failed is "requeued". One still queued or in flight is left alone ("in_flight").
+        """
+        if not self._is_new(ticket):
+            result = "ignored"
+        elif self.deduplicator.first_time(ticket):
+            result = "accepted"
+        else:
+            result = "duplicate" if source == "webhook" else "requeued"
+        if result in ("accepted", "requeued"):
+            with self._queued_lock:
+                if source != "webhook" and str(ticket["id"]) in self._queued:
+                    result = "in_flight"
+                else:
+                    self._queued.add(str(ticket["id"]))
+        if result in ("accepted", "requeued"):
+            self.inbox.put(self._complete(ticket) if source == "webhook" else ticket)
+        self.triage.metrics.inc("webhook_events_total", source=source, result=result)
+        return result
+
+    def _is_new(self, ticket):
+        """False once a ticket has left 'New'; a payload without a status is checked again after fetching."""
+        return ticket.get("status_id", self.triage.NEW_STATUS_ID) == self.triage.NEW_STATUS_ID
+
+    def _complete(self, ticket):
+        """Return the full ticket, fetching it when the webhook payload only carried a few fields."""
+        if "summary" in ticket and "details" in ticket:
+            return ticket
+        return functools.partial(self.triage.fetch_ticket, ticket["id"])  # Fetched on the pipeline thread
+
+    def _ingest(self):
+        """Yield queued tickets, storing each burst in ChromaDB with one call before it is triaged."""
+        while True:
+            batch = [self.inbox.get()]
+            while len(batch) < self.triage.CHROMA_INGEST_BATCH_SIZE:
+                try:
+                    batch.append(self.inbox.get_nowait())
+                except queue.Empty:
+                    break
+            stop = None in batch
+            tickets = []
+            for item in batch:
+                ticket = self._resolve(item)
+                if ticket:
+                    tickets.append(ticket)
+                elif item is not None:
+                    self._finished(item.args[0] if callable(item) else item["id"])
+            if tickets:
+                try:
+                    self.triage.store_tickets(tickets)
+                except Exception as e:  # Triage still works; embeddings are computed when missing
+                    print(f"❌ Could not store {len(tickets)} webhook ticket(s) in ChromaDB: {e}")
+                    self.triage.metrics.inc("triage_errors_total", stage="webhook_store")
+                yield from tickets
+            if stop:
+                return
+
+    def _resolve(self, item):
+        """The ticket for a queued item (fetching thin deliveries), or None if it should not be triaged.
+
+        A fetched ticket goes through the same checks as a full delivery: it is dropped when it is
+        no longer 'New' (a human may already have set its status) or this version was already accepted.
+        """
+        if not callable(item):
+            return item
+        try:
+            ticket = item()
+        except Exception as e:  # Reconciliation picks the ticket up again while it is still 'New'
+            print(f"❌ Could not fetch webhook Ticket #{item.args[0]}: {e}")
+            self.triage.metrics.inc("triage_errors_total", stage="webhook_fetch")
+            return None
+        if ticket is None:
+            return None
+        if not self._is_new(ticket):
+            result = "ignored"
+        elif not self.deduplicator.first_time(ticket):
+            result = "duplicate"
+        else:
+            return ticket
+        print(f"⏭️ Skipping webhook Ticket #{ticket.get('id', item.args[0])}: {result} once fetched.")
+        self.triage.metrics.inc("webhook_events_total", source="webhook_fetch", result=result)
+        return None
+
+    def _finished(self, ticket_id):
+        with self._queued_lock:
+            self._queued.discard(str(ticket_id))
+
+    def _run_pipeline(self):
+        self.stats["pipeline"] = self.triage.process_tickets(itertools.chain(self.triage.resumable_tickets(),
+                                                                              self._ingest()),
+                                                             on_finished=self._finished)
+
+    # 🔹 FUNCTION: RECONCILE
+    def reconcile(self):
+        """Poll 'New' tickets once, accepting any that no webhook delivered and requeueing the rest.
+
+        Returns how many were new.
+        """
+        results = []
+        with self.triage.metrics.timer("webhook_reconcile"):
+            for ticket in self.triage.iter_tickets():
+                results.append(self.accept(ticket, "reconcile"))
+        accepted = results.count("accepted")
+        if accepted:
+            print(f"🔄 Reconciliation found {accepted} ticket(s) without a webhook delivery.")
+        if results.count("requeued"):
+            print(f"🔄 Reconciliation requeued {results.count('requeued')} ticket(s) still 'New' after an earlier attempt.")
+        return accepted
+
+    async def _reconcile_forever(self):
+        while True:
+            try:
+                await asyncio.to_thread(self.reconcile)
+            except Exception as e:
+                print(f"❌ Reconciliation poll failed: {e}")
+            await asyncio.sleep(self.reconcile_interval)
+
+    # 🔹 FUNCTION: HANDLE REQUEST
+    async def _handle(self, reader, writer):
+        try:
+            status, body = await self._respond(reader)
+        except asyncio.TimeoutError:
+            status, body = 408, {"error": "request not received in time"}
+        except asyncio.LimitOverrunError:
+            status, body = 431, {"error": "header line too long"}
+        except (asyncio.IncompleteReadError, ConnectionError, ValueError):
+            status, body = 400, {"error": "malformed request"}
+        payload = json.dumps(body).encode()
+        reason = {200: "OK", 202: "Accepted", 400: "Bad Request", 401: "Unauthorized", 404: "Not Found",
+                  408: "Request Timeout", 413: "Payload Too Large", 431: "Request Header Fields Too Large"}[status]
+        try:
+            writer.write(f"HTTP/1.1 {status} {reason}\r\nContent-Type: application/json\r\n"
+                         f"Content-Length: {len(payload)}\r\nConnection: close\r\n\r\n".encode() + payload)
+            await writer.drain()
+        except ConnectionError:
+            pass
+        finally:
+            writer.close()
+
+    async def _read_head(self, reader):
+        """Read the request line and headers. Returns (method, target, headers)."""
+        method, target, _ = (await reader.readuntil(b"\r\n")).decode("latin-1").split(" ", 2)
+        headers = {}
+        while True:
+            line = (await reader.readuntil(b"\r\n")).decode("latin-1")
+            if line == "\r\n":
+                break
+            name, _, value = line.partition(":")
+            headers[name.strip().lower()] = value.strip()
+        return method, target, headers
+
+    async def _respond(self, reader):
+        """Parse one HTTP request and return (status, JSON body).
+
+        The headers and the body each have read_timeout seconds to arrive, so a slow or stalled
+        client cannot hold a connection open.
+        """
+        method, target, headers = await asyncio.wait_for(self._read_head(reader), self.read_timeout)
+
+        length = int(headers.get("content-length", "0"))
+        if length > WEBHOOK_MAX_BODY:
+            return 413, {"error": "payload too large"}
+        body = await asyncio.wait_for(reader.readexactly(length), self.read_timeout) if length else b""
+
+        path = target.split("?", 1)[0]
+        if method == "GET" and path == "/healthz":
+            return 200, {"status": "ok", "queued": self.inbox.qsize()}
+        if method != "POST" or path != self.path:
+            return 404, {"error": "not found"}
+        if not is_authorized(headers, self.secret):
+            self.triage.metrics.inc("webhook_events_total", source="webhook", result="unauthorized")
+            return 401, {"error": "invalid secret"}
+
+        try:
+            tickets = tickets_in(json.loads(body or b"null"))
+        except ValueError:
+            tickets = []
+        if not tickets:
+            self.triage.metrics.inc("webhook_events_total", source="webhook", result="invalid")
+            return 400, {"error": "no ticket in payload"}
+        results = [self.accept(ticket, "webhook") for ticket in tickets]
+        return 202, {"accepted": results.count("accepted"), "duplicate": results.count("duplicate"),
+                     "ignored": results.count("ignored")}
+
+    # 🔹 FUNCTION: SERVE
+    async def serve(self, ready=None):
+        """Run the receiver, pipeline and reconciliation poll until cancelled, then drain the pipeline."""
+        pipeline = threading.Thread(target=self._run_pipeline, name="webhook-pipeline", daemon=True)
+        pipeline.start()
+        self._server = await asyncio.start_server(self._handle, self.host, self.port)
+        self.port = self._server.sockets[0].getsockname()[1]
+        print(f"📬 Listening for HaloPSA webhooks on http://{self.host}:{self.port}{self.path} "
+              f"(reconciling every {self.reconcile_interval:.0f}s).")
+        if ready is not None:
+            ready.set()
+
+        reconciler = asyncio.create_task(self._reconcile_forever())
+        try:
+            async with self._server:
+                await self._server.serve_forever()
+        finally:
+            reconciler.cancel()
+            self.inbox.put(None)
+            await asyncio.to_thread(pipeline.join)
+
+
+# 🔹 MAIN EXECUTION
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Triage HaloPSA tickets as webhooks arrive instead of polling.")
+    parser.add_argument("--host", default=WEBHOOK_HOST)
+    parser.add_argument("--port", type=int, default=WEBHOOK_PORT)
+    parser.add_argument("--path", default=WEBHOOK_PATH)
+    parser.add_argument("--reconcile-interval", type=float, default=RECONCILE_INTERVAL,
+                        help="seconds between catch-up polls for missed events")
+    parser.add_argument("--read-timeout", type=float, default=WEBHOOK_READ_TIMEOUT,
+                        help="seconds a client has to send its headers, and again its body")
+    args = parser.parse_args()
+
+    import Hectic_AI_Support as triage
+
+    print("\n🚀 Starting event-driven AI Ticket Triage\n")
+    receiver = WebhookReceiver(triage, WEBHOOK_SECRET, args.host, args.port, args.path, args.reconcile_interval,
+                               args.read_timeout)
+    try:
+        asyncio.run(receiver.serve())
+    except KeyboardInterrupt:
+        pass
+    triage.print_run_report()
+    sys.exit(0)
@@ -0,0 +1,171 @@
+import os
+import json
+import time
+import sqlite3
+import threading
+from ticket_store import halo_epoch
+
+# ⚙️ Work Queue Settings
+WORK_QUEUE_FILE = os.getenv("WORK_QUEUE_FILE", "./triage_queue.db")  # SQLite file holding per-ticket progress
+WORK_QUEUE_MAX_ATTEMPTS = int(os.getenv("WORK_QUEUE_MAX_ATTEMPTS", "5"))  # Failed runs before a ticket is parked
+
+# Pipeline stages in order; a ticket's state is the last stage it completed
+STATES = ("fetched", "analyzed", "status_written", "note_written")
+_STATE_RANK = "CASE {} " + " ".join(f"WHEN '{state}' THEN {rank}" for rank, state in enumerate(STATES)) + " END"  # Ranks a state column by pipeline stage
+
+
+class WorkQueue:
+    """Durable, crash-safe record of how far each ticket got through the triage pipeline.
+
+    Backed by SQLite in WAL mode. The pipeline checkpoints after every stage, so a restart resumes
+    each ticket from its last completed stage: analyzed tickets are never sent to the LLM again,
+    and tickets whose status was written only need their note.
+    """
+
+    def __init__(self, path=WORK_QUEUE_FILE, max_attempts=WORK_QUEUE_MAX_ATTEMPTS):
+        self.max_attempts = max_attempts
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute("PRAGMA synchronous=NORMAL")
+        self._db.execute("""
+            CREATE TABLE IF NOT EXISTS tickets (
+                ticket_id INTEGER PRIMARY KEY,
+                state TEXT NOT NULL,
+                ticket TEXT NOT NULL,
+                recommendation TEXT,
+                attempts INTEGER NOT NULL DEFAULT 0,
+                last_error TEXT,
+                halo_updated REAL,
+                updated_at REAL NOT NULL
+            )""")
+        if "halo_updated" not in [column[1] for column in self._db.execute("PRAGMA table_info(tickets)")]:
+            self._db.execute("ALTER TABLE tickets ADD COLUMN halo_updated REAL")  # Queue files from before it existed
+        self._db.execute("CREATE INDEX IF NOT EXISTS tickets_state ON tickets (state)")
+
+    def _execute(self, sql, params=()):
+        with self._lock:
+            return self._db.execute(sql, params).fetchall()
+
+    # 🔹 FUNCTION: ENQUEUE
+    def enqueue(self, ticket):
+        """Record a fetched ticket and return (state, recommendation) for where it should resume.
+
+        halo_updated keeps the latest HaloPSA last_update seen for the ticket, so both sides of the
+        comparison below come from HaloPSA's clock. A finished ticket listed with a later last_update
+        was changed since (moved back to 'New', say), so it starts over from 'fetched' with a fresh
+        attempt count. Our own writes move the ticket out of 'New', so they never show up this way.
+        """
+        self._execute("INSERT OR IGNORE INTO tickets (ticket_id, state, ticket, updated_at) VALUES (?, ?, ?, ?)",
+                      (ticket["id"], "fetched", json.dumps(ticket), time.time()))
+        modified = halo_epoch(ticket.get("last_update"))
+        if modified is not None:
+            self._execute("""
+                UPDATE tickets SET state = 'fetched', ticket = ?, recommendation = NULL, attempts = 0,
+                                   last_error = NULL, updated_at = ?
+                WHERE ticket_id = ? AND state = 'note_written' AND halo_updated < ?""",
+                          (json.dumps(ticket), time.time(), ticket["id"], modified))
+            self._execute("UPDATE tickets SET halo_updated = MAX(COALESCE(halo_updated, ?), ?) WHERE ticket_id = ?",
+                          (modified, modified, ticket["id"]))
+        state, recommendation = self._execute("SELECT state, recommendation FROM tickets WHERE ticket_id = ?",
+                                              (ticket["id"],))[0]
+        return state, json.loads(recommendation) if recommendation else None
+
+    # 🔹 FUNCTION: CHECKPOINTS
+    def mark_analyzed(self, ticket_id, recommendation):
+        self._advance(ticket_id, "analyzed", recommendation=json.dumps(recommendation))
+
+    def mark_status_written(self, ticket_id):
+        self._advance(ticket_id, "status_written")
+
+    def mark_note_written(self, ticket_id):
+        self._advance(ticket_id, "note_written")
+
+    def _advance(self, ticket_id, state, recommendation=None):
+        """Move a ticket forward to state (never backwards), committing immediately.
+
+        A recommendation is always stored: with streamed analysis the status can be written before
+        the full recommendation arrives.
+        """
+        earlier = STATES[:STATES.index(state)]
+        self._execute(f"""
+            UPDATE tickets SET state = CASE WHEN state IN ({", ".join("?" * len(earlier))}) THEN ? ELSE state END,
+                               recommendation = COALESCE(?, recommendation), last_error = NULL, updated_at = ?
+            WHERE ticket_id = ?""",
+                      (*earlier, state, recommendation, time.time(), ticket_id))
+
+    def mark_failed(self, ticket_id, error):
+        """Count a failed attempt; the ticket keeps its last completed stage."""
+        self._execute("UPDATE tickets SET attempts = attempts + 1, last_error = ?, updated_at = ? WHERE ticket_id = ?",
+                      (str(error), time.time(), ticket_id))
+
+    def mark_resumed(self, ticket_id):
+        """Count a resume as an attempt, so a ticket whose writes never finish is eventually parked."""
+        self._execute("UPDATE tickets SET attempts = attempts + 1, updated_at = ? WHERE ticket_id = ?",
+                      (time.time(), ticket_id))
+
+    # 🔹 FUNCTION: RESUMABLE TICKETS
+    def resumable(self):
+        """Yield (ticket, state, recommendation) for tickets that were analyzed but not fully written.
+
+        recommendation is None for a streamed ticket whose status was written before its analysis finished.
+        """
+        rows = self._execute("""
+            SELECT ticket, state, recommendation FROM tickets
+            WHERE state IN ('analyzed', 'status_written') AND attempts < ?
+            ORDER BY ticket_id""", (self.max_attempts,))
+        for ticket, state, recommendation in rows:
+            yield json.loads(ticket), state, json.loads(recommendation) if recommendation else None
+
+    # 🔹 FUNCTION: ROWS / MERGE
+    def rows(self, states=STATES):
+        """Return the raw rows of tickets in the given states, for merge() into another work queue."""
+        return self._execute(f"""
+            SELECT ticket_id, state, ticket, recommendation, attempts, last_error, halo_updated, updated_at FROM tickets
+            WHERE state IN ({", ".join("?" * len(states))}) ORDER BY ticket_id""", tuple(states))
+
+    def merge(self, rows):
+        """Take in rows() from another work queue (a shard's), keeping whichever copy of a ticket got further."""
+        with self._lock:
+            self._db.execute("BEGIN")
+            self._db.executemany(f"""
+                INSERT INTO tickets (ticket_id, state, ticket, recommendation, attempts, last_error, halo_updated, updated_at)
+                VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+                ON CONFLICT (ticket_id) DO UPDATE SET
+                    state = CASE WHEN {_STATE_RANK.format("excluded.state")} > {_STATE_RANK.format("tickets.state")} THEN excluded.state ELSE tickets.state END,
+                    recommendation = COALESCE(excluded.recommendation, tickets.recommendation),
+                    attempts = MAX(tickets.attempts, excluded.attempts),
+                    last_error = CASE WHEN excluded.updated_at > tickets.updated_at THEN excluded.last_error ELSE tickets.last_error END,
+                    halo_updated = MAX(COALESCE(tickets.halo_updated, excluded.halo_updated), COALESCE(excluded.halo_updated, tickets.halo_updated)),
+                    updated_at = MAX(tickets.updated_at, excluded.updated_at)""", rows)
+            self._db.execute("COMMIT")
+
+    def changed_since(self, timestamp):
+        """Ids of tickets whose progress changed after timestamp (epoch seconds)."""
+        return [row[0] for row in self._execute("SELECT ticket_id FROM tickets WHERE updated_at > ?", (timestamp,))]
+
+    def state(self, ticket_id):
+        """The last stage a ticket completed, or None if it was never queued."""
+        rows = self._execute("SELECT state FROM tickets WHERE ticket_id = ?", (ticket_id,))
+        return rows[0][0] if rows else None
+
+    def is_finished(self, ticket):
+        """True if the ticket was fully written and HaloPSA shows no change to it since (see enqueue())."""
+        rows = self._execute("SELECT state, halo_updated FROM tickets WHERE ticket_id = ?", (ticket["id"],))
+        if not rows or rows[0][0] != "note_written":
+            return False
+        modified = halo_epoch(ticket.get("last_update"))
+        return modified is None or rows[0][1] is None or modified <= rows[0][1]
+
+    def is_parked(self, ticket_id):
+        """True once a ticket has failed max_attempts times and should be left for a human."""
+        rows = self._execute("SELECT attempts FROM tickets WHERE ticket_id = ?", (ticket_id,))
+        return bool(rows) and rows[0][0] >= self.max_attempts
+
+    def stats(self):
+        """Return the number of tickets in each state."""
+        return dict(self._execute("SELECT state, COUNT(*) FROM tickets GROUP BY state"))
+
+    def close(self):
+        with self._lock:
+            self._db.close()
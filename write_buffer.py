@@ -0,0 +1,176 @@
+import os
+import time
+import threading
+
+# ⚙️ Write Buffer Settings
+WRITE_BATCH_SIZE = int(os.getenv("WRITE_BATCH_SIZE", "50"))  # Tickets per array POST
+WRITE_FLUSH_SECONDS = float(os.getenv("WRITE_FLUSH_SECONDS", "2"))  # Max age of a buffered write
+WRITE_MAX_ATTEMPTS = int(os.getenv("WRITE_MAX_ATTEMPTS", "3"))  # Flushes an item may take part in before it is failed
+
+_ABANDONED = object()  # Note placeholder for a ticket whose analysis failed after its status was handed over
+
+
+class HaloWriteBuffer:
+    """Collects status changes and private notes from many tickets and writes them as array POSTs.
+
+    write_statuses(items) and write_notes(items) each send one array POST and return the set of
+    ticket ids the response confirmed. A ticket's note is only written once its status is confirmed.
+    Items that were not confirmed stay buffered for the next flush, so only failed items are retried.
+    on_status_written(ticket_id, status_item) is called as each status is confirmed, and
+    on_result(ticket_id, ok) exactly once per ticket.
+
+    Flushes happen when max_items tickets are buffered (on the adding thread) or when the oldest
+    buffered ticket is max_wait seconds old (on a background thread).
+
+    With streamed analysis a ticket's status can be added before its note exists: add it with
+    note_item=None and follow up with add_note() (or abandon() if the note will never come). Its
+    status is written straight away and it waits in the buffer, without using up attempts, for the note.
+    """
+
+    def __init__(self, write_statuses, write_notes, on_result, max_items=WRITE_BATCH_SIZE,
+                 max_wait=WRITE_FLUSH_SECONDS, max_attempts=WRITE_MAX_ATTEMPTS, on_status_written=None):
+        self.write_statuses = write_statuses
+        self.write_notes = write_notes
+        self.on_result = on_result
+        self.on_status_written = on_status_written
+        self.max_items = max_items
+        self.max_wait = max_wait
+        self.max_attempts = max_attempts
+
+        self._pending = []
+        self._entries = {}  # ticket_id -> buffered entry, for add_note()/abandon()
+        self._early_notes = {}  # Notes that arrived before their ticket's status was added
+        self._oldest = None
+        self._lock = threading.Lock()
+        self._closed = threading.Event()
+        self._stats = {"flushes": 0, "status_posts": 0, "note_posts": 0, "retried_items": 0}
+        self._timer = threading.Thread(target=self._flush_when_stale, name="halo-write-timer", daemon=True)
+        self._timer.start()
+
+    # 🔹 FUNCTION: ADD
+    def add(self, ticket_id, status_item, note_item, status_done=False):
+        """Buffer one ticket's status change and note, flushing if the buffer is full.
+
+        Pass status_done=True when the status was already written (e.g. on resume) to only send the note,
+        or note_item=None when the note will follow via add_note().
+        """
+        entry = {"ticket_id": ticket_id, "status_item": status_item, "note_item": note_item,
+                 "status_done": status_done, "attempts": 0}
+        with self._lock:
+            if entry["note_item"] is None:
+                entry["note_item"] = self._early_notes.pop(ticket_id, None)
+            self._entries[ticket_id] = entry
+            self._pending.append(entry)
+            if self._oldest is None:
+                self._oldest = time.monotonic()
+            batch = self._take() if len(self._pending) >= self.max_items else None
+
+        if batch:
+            self._flush(batch)
+
+    # 🔹 FUNCTION: ADD NOTE
+    def add_note(self, ticket_id, note_item):
+        """Attach the note for a ticket added with note_item=None. It is written once the status is confirmed."""
+        with self._lock:
+            entry = self._entries.get(ticket_id)
+            if entry is None:
+                self._early_notes[ticket_id] = note_item  # Another writer thread has not added the status yet
+            else:
+                entry["note_item"] = note_item
+
+    def abandon(self, ticket_id):
+        """Give up on a ticket waiting for its note; it is reported as failed and nothing more is written."""
+        self.add_note(ticket_id, _ABANDONED)
+
+    def _take(self):
+        """Remove up to max_items entries from the buffer. Caller holds the lock."""
+        batch, self._pending = self._pending[:self.max_items], self._pending[self.max_items:]
+        self._oldest = time.monotonic() if self._pending else None
+        return batch
+
+    def _flush_when_stale(self):
+        while not self._closed.wait(self.max_wait / 2):
+            with self._lock:
+                stale = self._oldest is not None and time.monotonic() - self._oldest >= self.max_wait
+                batch = self._take() if stale else None
+            if batch:
+                self._flush(batch)
+
+    # 🔹 FUNCTION: FLUSH
+    def _flush(self, batch):
+        """Write one batch: statuses first, then notes for the tickets whose status was confirmed."""
+        for entry in [entry for entry in batch if entry["note_item"] is _ABANDONED]:
+            batch.remove(entry)
+            self._finish(entry, False)
+
+        pending_status = [entry for entry in batch if not entry["status_done"]]
+        if pending_status:
+            confirmed = self._safe_write(self.write_statuses, [entry["status_item"] for entry in pending_status])
+            for entry in pending_status:
+                entry["status_done"] = entry["ticket_id"] in confirmed
+                if entry["status_done"] and self.on_status_written:
+                    self.on_status_written(entry["ticket_id"], entry["status_item"])
+
+        ready = [entry for entry in batch if entry["status_done"] and entry["note_item"] is not None]
+        confirmed_notes = self._safe_write(self.write_notes, [entry["note_item"] for entry in ready]) if ready else set()
+
+        retry, waiting = [], []
+        for entry in batch:
+            if entry in ready and entry["ticket_id"] in confirmed_notes:
+                self._finish(entry, True)
+                continue
+            if entry["status_done"] and entry["note_item"] is None and not self._closed.is_set():
+                waiting.append(entry)  # Waiting for its note, not a failed attempt
+                continue
+            entry["attempts"] += 1
+            if entry["attempts"] >= self.max_attempts:
+                print(f"❌ Giving up on writing Ticket #{entry['ticket_id']} after {entry['attempts']} attempts.")
+                self._finish(entry, False)
+            else:
+                retry.append(entry)
+
+        with self._lock:
+            self._stats["flushes"] += bool(pending_status or ready)
+            self._stats["status_posts"] += bool(pending_status)
+            self._stats["note_posts"] += bool(ready)
+            self._stats["retried_items"] += len(retry)
+            retry += waiting
+            if retry:
+                self._pending[:0] = retry
+                if self._oldest is None:
+                    self._oldest = time.monotonic()
+
+    def _finish(self, entry, ok):
+        with self._lock:
+            self._entries.pop(entry["ticket_id"], None)
+        self.on_result(entry["ticket_id"], ok)
+
+    def _safe_write(self, write, items):
+        try:
+            return write(items)
+        except Exception as e:
+            print(f"❌ Batch write of {len(items)} item(s) failed: {e}")
+            return set()
+
+    # 🔹 FUNCTION: CLOSE
+    def close(self):
+        """Stop the timer and flush everything still buffered, including retries.
+
+        Tickets still waiting for a note by now count a failed attempt per flush instead of waiting forever.
+        A batch holding retries waits max_wait seconds first, so a transient 429 or 5xx at shutdown
+        does not use up every attempt within milliseconds.
+        """
+        self._closed.set()
+        self._timer.join()
+        while True:
+            with self._lock:
+                batch = self._take()
+            if not batch:
+                return
+            if any(entry["attempts"] for entry in batch):
+                time.sleep(self.max_wait)
+            self._flush(batch)
+
+    def stats(self):
+        with self._lock:
+            return dict(self._stats)